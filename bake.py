@@ -0,0 +1,66 @@
+"""
+Bake frames of dungeon level into frame atlas, streamed by the game instead of rendering them.
+
+Usage:
+    pypy3 bake.py [--size N] [--workers N] [--seed N] [--output PATH]
+
+Frames of all walk and turn animations reachable from start of the level (see DungeonActivity.reachable_states)
+are rendered by ScanlineRenderer in pool of worker processes. Random choices of scene (e.g. wall textures) are made
+with given seed, which is stored in atlas, so game builds the same scene. Atlas has to be baked again whenever
+LEVEL, render distance or fog change (see dungeon.level_digest), otherwise game ignores it.
+"""
+import argparse
+import multiprocessing
+import time
+
+import dungeon
+from dungeon import DungeonActivity
+from engine.rt.atlas import FrameAtlas
+from engine.rt.image import Image
+from engine.rt.integrators import RayTracingIntegrator
+from engine.rt.rasterizer import ScanlineRenderer
+from engine.rt.renderer import camera_key
+from engine.rt.world import World
+
+_integrator = None  # integrator of worker process
+
+
+def _init(integrator):
+    global _integrator
+    _integrator = integrator
+
+
+def _render(job):
+    camera, size = job
+    image = Image(width=size, height=size)
+    ScanlineRenderer(camera, _integrator).render(image)
+    return camera_key(camera), FrameAtlas.encode(image)
+
+
+def bake(output: str, size: int = 63, workers: int = None, seed: int = 0) -> int:
+    """Bake atlas of frames of given size into output, returns number of frames."""
+    scene = dungeon.build_scene(dungeon.load_tileset(), seed=seed)
+    integrator = RayTracingIntegrator(World(scene, None), tmax=DungeonActivity.DOF, fog=DungeonActivity.FOG)
+
+    cameras = {}
+    for state in DungeonActivity.reachable_states():
+        camera = DungeonActivity.camera(state)
+        cameras.setdefault(camera_key(camera), camera)
+
+    with multiprocessing.Pool(workers, initializer=_init, initargs=(integrator, )) as pool:
+        frames = pool.imap_unordered(_render, [(camera, size) for camera in cameras.values()], chunksize=8)
+        FrameAtlas.write(output, size, size, frames, meta={'seed': seed, 'level': dungeon.level_digest()})
+    return len(cameras)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Bake frames of dungeon level into frame atlas.")
+    parser.add_argument('--size', type=int, default=63, help="width and height of frames (default: %(default)s)")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--seed', type=int, default=0, help="seed of random choices of scene (default: %(default)s)")
+    parser.add_argument('-o', '--output', default=dungeon.ATLAS, help="atlas file (default: %(default)s)")
+    args = parser.parse_args()
+
+    start = time.time()
+    count = bake(args.output, args.size, args.workers, args.seed)
+    print(f"{count} frames of {args.size}x{args.size} baked into {args.output} in {time.time() - start:.1f}s")
@@ -0,0 +1,123 @@
+"""
+Scene intersection benchmark on procedurally generated mazes.
+
+Usage:
+    pypy3 benchmark.py [--seeded] [maze sizes...]
+
+With --seeded, every ray first tests solid hit by previous ray of its row and scene is searched only up to that hit
+(per-scanline last-hit cache). Ordered traversals of hierarchies find the closest hit first anyway, so measured
+times don't improve and renderers don't use it.
+
+Mazes use the same text format as dungeon.LEVEL: walls between cells are stored on even rows/columns.
+"""
+import math
+import random
+import sys
+import time
+
+from engine.rt.scene import LinearScene, Scene
+from engine.rt.grid import GridScene
+from engine.rt.frozen import FrozenScene
+from engine.rt.intersection import INF
+from engine.rt.solids import Quad
+from engine.rt.cameras import PerspectiveCamera
+from engine.rt.utils import Point3f, Vector3f
+
+
+def generate_maze(width: int, height: int, seed: int = 0) -> list:
+    """Generate perfect maze of width x height cells with randomized depth-first search."""
+    rnd = random.Random(seed)
+    level = [['#'] * (2*width+1) for _ in range(2*height+1)]
+    for y in range(height):
+        for x in range(width):
+            level[2*y+1][2*x+1] = ' '
+
+    visited = {(0, 0)}
+    stack = [(0, 0)]
+    while stack:
+        x, y = stack[-1]
+        neighbours = [
+            (x+dx, y+dy) for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1))
+            if 0 <= x+dx < width and 0 <= y+dy < height and (x+dx, y+dy) not in visited
+        ]
+        if not neighbours:
+            stack.pop()
+            continue
+        nx, ny = rnd.choice(neighbours)
+        level[y+ny+1][x+nx+1] = ' '
+        visited.add((nx, ny))
+        stack.append((nx, ny))
+
+    return [''.join(row) for row in level]
+
+
+def build_maze_scene(level: list, scene):
+    """Add walls, floor and ceiling of given level to scene (same geometry as dungeon.build_scene)."""
+    width, height = len(level[0])//2, len(level)//2
+
+    scene.add(Quad(Point3f(-100, 0, -100), Vector3f(200+width, 0, 0), Vector3f(0, 0, 200+height)))
+    scene.add(Quad(Point3f(0, -1, 0), Vector3f(width, 0, 0), Vector3f(0, 0, height)))
+
+    for y in range(height+1):
+        for x in range(width):
+            if level[2*y][2*x+1] != ' ':
+                scene.add(Quad(Point3f(x, -1, y), Vector3f(0, 1, 0), Vector3f(1, 0, 0)))
+    for y in range(height):
+        for x in range(width+1):
+            if level[2*y+1][2*x] != ' ':
+                scene.add(Quad(Point3f(x, -1, y), Vector3f(0, 1, 0), Vector3f(0, 0, 1)))
+    return scene
+
+
+def random_cameras(level: list, count: int, seed: int = 0) -> list:
+    rnd = random.Random(seed)
+    width, height = len(level[0])//2, len(level)//2
+    view_angle = 0.5 * math.pi
+    cameras = []
+    for _ in range(count):
+        ang = rnd.randrange(4) * 0.5 * math.pi
+        forward = Vector3f(math.sin(ang), 0, math.cos(ang))
+        center = Point3f(rnd.randrange(width) + 0.5, -0.5, rnd.randrange(height) + 0.5)
+        cameras.append(PerspectiveCamera(center, forward, Vector3f(0, 1, 0), view_angle, view_angle))
+    return cameras
+
+
+def benchmark(scene, cameras: list, resolution: int = 16, seeded: bool = False) -> float:
+    """Return mean time (in microseconds) of single primary ray intersection."""
+    rows = [
+        [camera.get_primary_ray(2.0 * x / (resolution-1) - 1.0, 2.0 * y / (resolution-1) - 1.0) for x in range(resolution)]
+        for camera in cameras
+        for y in range(resolution)
+    ]
+    scene.intersect(rows[0][0])  # build acceleration structure
+
+    t0 = time.perf_counter()
+    for row in rows:
+        last = None
+        for ray in row:
+            seed = last.intersect(ray) if seeded and last is not None else None
+            if seed is None:
+                intersection = scene.intersect(ray)
+            else:
+                # bound includes seed, so equally distant solids are resolved like without it
+                intersection = scene.intersect(ray, tmax=math.nextafter(seed.distance, INF)) or seed
+            if intersection is not None:
+                last = intersection.solid
+    return 1e6 * (time.perf_counter() - t0) / (len(rows) * resolution)
+
+
+if __name__ == '__main__':
+    seeded = '--seeded' in sys.argv
+    sizes = [int(arg) for arg in sys.argv[1:] if arg != '--seeded'] or [8, 16, 32, 64]
+
+    print(f"{'maze':>8} {'solids':>8} {'linear':>10} {'bvh':>10} {'grid':>10} {'frozen':>10}   [us/ray]")
+    for size in sizes:
+        level = generate_maze(size, size)
+        cameras = random_cameras(level, 8)
+
+        results = [
+            benchmark(build_maze_scene(level, klass()), cameras, seeded=seeded)
+            for klass in (LinearScene, Scene, GridScene, FrozenScene)
+        ]
+        solids = len(build_maze_scene(level, LinearScene()).objects)
+        print(f"{size:>4}x{size:<3} {solids:>8} " + ' '.join(f"{r:>10.1f}" for r in results))
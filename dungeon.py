@@ -36,13 +36,26 @@ Like wizardry / HOMM:
 """
 
 import random, math, time
+import hashlib
+import logging
+import os
 from datetime import datetime
+from itertools import zip_longest
+from typing import List, Optional, Tuple
 
-from engine.rt.solids import Triangle, Quad
+from engine.rt.solids import Triangle, Quad, Sprite
 from engine.rt.utils import Point3f, Ray, Vector3f
-from engine.rt.scene import Scene
+from engine.rt.frozen import FrozenScene
+from engine.rt.pvs import PotentiallyVisibleSets
 from engine.rt.cameras import PerspectiveCamera
-from engine.rt.renderer import Renderer
+from engine.rt.renderer import Renderer, TiledRenderer, CachingRenderer
+from engine.rt.atlas import AtlasRenderer, FrameAtlas
+from engine.rt.raycaster import ColumnRenderer
+from engine.rt.rasterizer import ScanlineRenderer
+from engine.rt.adaptive import AdaptiveRenderer
+from engine.rt.scaling import ScalingRenderer
+from engine.rt.parallel import ParallelRenderer, ThreadedRenderer
+from engine.rt.vectorized import NumpyRenderer
 from engine.rt.image import Image, Color4f
 from engine.rt.integrators import RayTracingIntegrator
 from engine.rt.materials import DummyMaterial, FlatMaterial, PhongMaterial
@@ -65,6 +78,19 @@ FONT = Font('media/fonts/default.pnm')
 
 DEBUG = False
 
+# Renderer of 3D view: 'raytracer' (generic), 'parallel' (raytracer on all CPU cores),
+# 'threaded' (raytracer on all CPU cores, requires free-threaded python),
+# 'numpy' (vectorised raytracer, falls back to 'raytracer' without NumPy),
+# 'tiled' (raytracer testing pixels only against solids projected onto their screen tile),
+# 'scanline' (rasteriser of quads, renders the same frames as 'raytracer'),
+# 'adaptive' (raytracer tracing about third of pixels through scene, others only against quad seen around them)
+# or 'raycaster' (column renderer, much faster on grid levels)
+RENDERER = 'scanline'
+
+# Scale of 3D view resolution: fixed 1 (63x63), 2 (32x32) or 3 (21x21), or None for dynamic (lowered during
+# animations when frames take longer than DungeonActivity.FRAME_BUDGET), changed in settings menu
+RESOLUTION = None
+
 LEVEL = """\
 #################
 D               #
@@ -93,9 +119,16 @@ D               #
 ######\
 #""".split("\n")
 
+# Frames baked by bake.py, used when they match LEVEL (see level_digest)
+ATLAS = 'media/level.atlas'
+
 TEXTURES = {}
 DRAGON = None
 
+
+def load_tileset():
+    return Image.load('media/gfx/tileset.pnm', transparency=(0,255,255)).as_tileset(32,32)
+
 def create_sprite(texture, width, height, pos_x, pos_y, pos_z, angle=0.0):
     mapper = TriangleMapper(Point3f(1.0,0.0,0.0), Point3f(1.0, 1.0, 0.0), Point3f(0.0, 0.0, 0.0))
     material = FlatMaterial(ImageTexture(texture))
@@ -106,8 +139,25 @@ def create_sprite(texture, width, height, pos_x, pos_y, pos_z, angle=0.0):
     return Quad(Point3f(pos_x - 0.5*x, pos_y - height, pos_z - 0.5*z), Vector3f(0, height, 0), Vector3f(x, 0, z), material=material, coord_mapper=mapper)
 
 
-def build_scene(tileset):
+def create_billboard(texture, width, height, pos_x, pos_y, pos_z):
+    mapper = TriangleMapper(Point3f(1.0,0.0,0.0), Point3f(1.0, 1.0, 0.0), Point3f(0.0, 0.0, 0.0))
+    material = FlatMaterial(ImageTexture(texture))
+
+    return Sprite(Point3f(pos_x, pos_y - height, pos_z), Vector3f(0, height, 0), width, material=material, coord_mapper=mapper)
+
+
+def is_opaque(material) -> bool:
+    texture = getattr(material, 'texture', None)
+    if not isinstance(texture, ImageTexture):
+        return False
+    image = texture.image
+    return all(image[x, y].a >= 1.0 for y in range(image.height) for x in range(image.width))
+
+
+def build_scene(tileset, seed=None):
+    """Build scene of LEVEL, random choices (e.g. wall textures) are repeatable with given seed."""
     global TEXTURES, DRAGON
+    rnd = random.Random(seed) if seed is not None else random
     width, height = len(LEVEL[0])//2, len(LEVEL)//2
 
     mapper = TriangleMapper(Point3f(1.0,0.0,0.0), Point3f(1.0, 1.0, 0.0), Point3f(0.0, 0.0, 0.0))
@@ -134,7 +184,7 @@ def build_scene(tileset):
     if DEBUG:
         sky = wall = floor = dummy
 
-    s = Scene()
+    s = FrozenScene()
     # add sky
     s.add(Quad(Point3f(-1000,-20, -1000), Vector3f(2000+width, 0, 0), Vector3f(0, 0, 2000+height), material=sky, coord_mapper=sky_mapper))
 
@@ -171,10 +221,8 @@ def build_scene(tileset):
     tex = Image.load('media/gfx/tree.pam')
     for i in range(5):
         for j in (0-0.3, 1+0.3):
-            r = 0.001*random.random()
-            tree = create_sprite(tex, 2, 3, -0.5 - i + r, 0.3 + r, j+r)
-            s.add(tree)
-            tree = create_sprite(tex, 2, 3, -0.5 - i + r, 0.3 + r, j+r, 0.5*math.pi)
+            r = 0.001*rnd.random()
+            tree = create_billboard(tex, 2, 3, -0.5 - i + r, 0.3 + r, j+r)
             s.add(tree)
 
     queen = Quad(Point3f(-1, -0.75, 1.25), Vector3f(0, 0.75, 0), Vector3f(0.75, 0, 0), material=TEXTURES['q'], coord_mapper=mapper)
@@ -187,21 +235,32 @@ def build_scene(tileset):
     squll = Quad(Point3f(2.1, -0.8, 1.75), Vector3f(0.0, 0.8, 0.0), Vector3f(0.8, 0, 0), material=TEXTURES['s'], coord_mapper=mapper)
     s.add(squll)
 
+    # walls which never let sight through (doors open, grates and magic walls are see-through or passable)
+    occluders = []
+
     for y in range(height+1):
         for x in range(width):
             c = LEVEL[2*y][2*x+1]
             if c != ' ':
-                t = TEXTURES[c] if c != '#' else FlatMaterial(ImageTexture(tileset[random.randint(19*64-24, 19*64-18)]))
+                t = TEXTURES[c] if c != '#' else FlatMaterial(ImageTexture(tileset[rnd.randint(19*64-24, 19*64-18)]))
                 q = Quad(Point3f(x, -1, y), Vector3f(0, 1, 0), Vector3f(1, 0, 0), material=t, coord_mapper=mapper)
                 s.add(q)
+                if c in '#S' and is_opaque(t):
+                    occluders.append(q)
     # vertical walls
     for y in range(height):
         for x in range(width+1):
             c = LEVEL[2*y+1][2*x]
             if c != ' ':
-                t = TEXTURES[c] if c != '#' else FlatMaterial(ImageTexture(tileset[random.randint(19*64-24, 19*64-18)]))
+                t = TEXTURES[c] if c != '#' else FlatMaterial(ImageTexture(tileset[rnd.randint(19*64-24, 19*64-18)]))
                 q = Quad(Point3f(x, -1, y), Vector3f(0, 1, 0), Vector3f(0, 0, 1), material=t, coord_mapper=mapper)
                 s.add(q)
+                if c in '#S' and is_opaque(t):
+                    occluders.append(q)
+
+    # walls can't be looked over only if floor and ceiling close the level
+    if is_opaque(floor) and is_opaque(ceil):
+        s.visibility = PotentiallyVisibleSets(s.objects, occluders)
     return s
 
 
@@ -229,18 +288,47 @@ class Inventory:
 class DungeonActivity:
     MAIN_SOUND = "media/sound/Memoraphile - Spooky Dungeon.ogg"
     STEP_LENGTH = 1.0
-    DOF = 100
+    DOF = 100  # render distance
+    FOG = None  # distance fog hiding the cutoff, e.g. Fog(Color4f(183/255, 225/255, 243/255), start=DOF/2)
     FPT = 5  # frames per turn
+    FRAME_CACHE = 64  # rendered frames kept for reuse
+    FRAME_BUDGET = 0.1  # seconds of rendering per frame of animations (see RESOLUTION)
+    START = (0.5, -0.5, 0.5, -math.pi, 0)  # x, y, z, angle and position of item in hand
 
     def __init__(self):
         self.sound = Sound()
         self.sound.play(self.MAIN_SOUND, loop=True)
         self.sound_effects = Sound()
 
-        self.tileset = Image.load('media/gfx/tileset.pnm', transparency=(0,255,255)).as_tileset(32,32)
-
-        self.scene = build_scene(self.tileset)
-        self.integrator = RayTracingIntegrator(World(self.scene, None))
+        self.tileset = load_tileset()
+
+        atlas = self._load_atlas()
+        self.scene = build_scene(self.tileset, seed=atlas and atlas.meta['seed'])
+        self.integrator = RayTracingIntegrator(World(self.scene, None), tmax=self.DOF, fog=self.FOG)
+        if RENDERER == 'parallel':
+            renderer = ParallelRenderer(None, self.integrator)
+        elif RENDERER == 'threaded':
+            renderer = ThreadedRenderer(None, self.integrator)
+        elif RENDERER == 'numpy':
+            renderer = NumpyRenderer(None, self.integrator)
+        elif RENDERER == 'tiled':
+            renderer = TiledRenderer(None, self.integrator)
+        elif RENDERER == 'scanline':
+            renderer = ScanlineRenderer(None, self.integrator)
+        elif RENDERER == 'adaptive':
+            renderer = AdaptiveRenderer(None, self.integrator)
+        elif RENDERER == 'raycaster':
+            renderer = ColumnRenderer(None, self.integrator)
+        else:
+            renderer = Renderer(None, self.integrator)
+        # views seen again (e.g. after turning back, or redrawn after interaction) aren't rendered twice
+        self.renderer = CachingRenderer(renderer, capacity=self.FRAME_CACHE)
+        # frames baked by bake.py are streamed from disk, unless they show something changed since
+        self.atlas_renderer = None
+        if atlas is not None:
+            self.atlas_renderer = self.renderer = AtlasRenderer(self.renderer, atlas)
+        # frames of animations are rendered at lower resolution when they take too long
+        self.scaling = self.renderer = ScalingRenderer(self.renderer, self.FRAME_BUDGET, scale=RESOLUTION)
 
         self.inventory = Inventory(['shovel', 'compass'])
 
@@ -252,7 +340,7 @@ class DungeonActivity:
             tresure_pos = (3.5, 2.5),
         )
 
-        self.states = [(0.5, -0.5, 0.5, -math.pi, 0)]
+        self.states = [self.START]
 
         self.swords = Image.load('media/gfx/swords2.pnm', transparency=(0,255,255)).as_tileset(32, 32)
         self.compass = Image.load('media/gfx/compass.pnm', transparency=(0, 255, 255)).as_tileset(32, 32)
@@ -264,6 +352,7 @@ class DungeonActivity:
     def on_exit(self):
         self.sound.close()
         self.sound_effects.close()
+        self.renderer.close()
 
     def render(self, timestamp, canvas) -> bool:
         if self.overlay_count > 0:
@@ -278,12 +367,12 @@ class DungeonActivity:
         self.states = self.states[1:]
         # torch.position = Point3f(pos_x, pos_y, pos_z)
 
-        view_angle = 90 / 180 * math.pi
-        forward = Vector3f(math.sin(ang), 0, math.cos(ang))
-        camera = PerspectiveCamera(Point3f(pos_x, pos_y, pos_z) + (-0.25*forward), forward, Vector3f(0, 1, 0), view_angle, view_angle)
-
-        r = Renderer(camera, self.integrator)
-        r.render(canvas)
+        self.renderer.camera = self.camera(self.prev_state)
+        self.scaling.dynamic = bool(self.states)  # the last frame of animation is kept on screen, in full resolution
+        self.renderer.render(canvas)
+        if not self.states:
+            # while waiting for input, frames of possible next moves are rendered in background
+            self.renderer.prefetch([self.camera(state) for state in self._likely_states()], canvas.width, canvas.height)
 
         if item_pos > 0:
             if self.inventory.current == 'compass':
@@ -311,7 +400,103 @@ class DungeonActivity:
         
         return True
         
+    @staticmethod
+    def _load_atlas() -> Optional[FrameAtlas]:
+        """Frames baked by bake.py, if they were baked for this level."""
+        if not os.path.exists(ATLAS):
+            return None
+        atlas = FrameAtlas(ATLAS)
+        if atlas.meta.get('level') != level_digest():
+            logging.warning('Ignoring frame atlas %s baked for other level', ATLAS)
+            atlas.close()
+            return None
+        return atlas
+
+    def _update_stale(self):
+        """Mark solids looking differently than in baked frames (door, chest and dragon)."""
+        if self.atlas_renderer is None:
+            return
+        stale = set()
+        if self.env.door_open:
+            stale.update(obj for obj in self.scene.objects if obj.material is TEXTURES['D'])
+        if self.env.has_key:
+            stale.update(obj for obj in self.scene.objects if obj.material is TEXTURES['c'])
+        if self.env.dragon_hp is None:
+            stale.add(DRAGON)
+        self.atlas_renderer.stale = frozenset(stale)
+
+    @classmethod
+    def reachable_states(cls) -> list:
+        """
+        States of walk and turn animations reachable from START, with door open or closed, dragon alive or dead and
+        with or without item in hand (so not all of them are reachable in single game). States may repeat.
+        """
+        variants = [SimpleNamespace(door_open=door_open, dragon_hp=dragon_hp) for door_open in (False, True) for dragon_hp in (5, None)]
+        start = cls.START[:4] + (0, )
+        states, queue, visited = [start], [start], set()
+        while queue:
+            state = queue.pop()
+            pos_x, pos_y, pos_z, ang, item_pos = state
+            cell = (round(2 * pos_x), round(2 * pos_z), round(2 * ang / math.pi) % 4)
+            if cell in visited or not (0 < cell[0] < len(LEVEL[0]) and 0 < cell[1] < len(LEVEL)):
+                continue  # search stops at the door, behind it is outside of the level
+            visited.add(cell)
+
+            for mult in (1, -1):
+                for env in variants:
+                    for item_pos in (0, 1):
+                        f, possible = cls.walk(state[:4] + (item_pos, ), mult, env)
+                        frames = cls.walk_states(state, mult, f)
+                        states.extend(frames)
+                        if possible:
+                            queue.append(frames[-1])
+                frames = cls.turn_states(state, mult)
+                states.extend(frames)
+                queue.append(frames[-1])
+        return states
+
+    @staticmethod
+    def camera(state) -> PerspectiveCamera:
+        pos_x, pos_y, pos_z, ang, item_pos = state
+        view_angle = 90 / 180 * math.pi
+        forward = Vector3f(math.sin(ang), 0, math.cos(ang))
+        return PerspectiveCamera(Point3f(pos_x, pos_y, pos_z) + (-0.25*forward), forward, Vector3f(0, 1, 0), view_angle, view_angle)
+
+    @classmethod
+    def walk(cls, state, mult: int, env) -> Tuple[List[float], bool]:
+        """Parts of step made in frames of walk forward (mult=1) or back (mult=-1) from state, and whether walk is possible."""
+        pos_x, pos_y, pos_z, ang, item_pos = state
+        new_pos_x = round(2 * pos_x + mult * math.sin(ang) * cls.STEP_LENGTH)
+        new_pos_z = round(2 * pos_z + mult * math.cos(ang) * cls.STEP_LENGTH)
+        cell = LEVEL[new_pos_z][new_pos_x]
+
+        if (cell in (' ', 'd') or (cell == 'X' and not item_pos > 0) or (cell == 'D' and env.door_open)) and (env.dragon_hp is None or new_pos_x!=1 or new_pos_z !=6):
+            return [(i+1)/cls.FPT for i in range(cls.FPT)], True
+
+        f = [0.1, 0.25, 0.35, 0.20, 0.1, 0.0]
+        if mult == -1:
+            f = [0.5*i for i in f]
+        return f, False
+
+    @classmethod
+    def walk_states(cls, state, mult: int, f: List[float]) -> list:
+        pos_x, pos_y, pos_z, ang, item_pos = state
+        return [(pos_x + mult * math.sin(ang)*cls.STEP_LENGTH * m, pos_y, pos_z + mult * math.cos(ang)*cls.STEP_LENGTH * m, ang, item_pos) for m in f]
+
+    @classmethod
+    def turn_states(cls, state, mult: int) -> list:
+        pos_x, pos_y, pos_z, ang, item_pos = state
+        return [(pos_x, pos_y, pos_z, (ang + mult * math.pi/2 * (i+1) / cls.FPT) % (2*math.pi), item_pos) for i in range(cls.FPT)]
+
+    def _likely_states(self) -> list:
+        """States of animations started by walk and turn keys, interleaved frame by frame (the first frames go first)."""
+        state = self.prev_state
+        moves = [self.walk_states(state, mult, self.walk(state, mult, self.env)[0]) for mult in (1, -1)]
+        moves += [self.turn_states(state, mult) for mult in (1, -1)]
+        return [state for frames in zip_longest(*moves) for state in frames if state is not None]
+
     def interact(self, event) -> bool:
+        self.renderer.cancel()  # speculative frames never delay handling of input
         if self.states:
             return False
         key = event.key
@@ -322,10 +507,6 @@ class DungeonActivity:
                 return True
             mult = -1 if key == Keys.DOWN else 1
 
-            new_pos_x = round(2 * pos_x + mult * math.sin(ang) * self.STEP_LENGTH)
-            new_pos_z = round(2 * pos_z + mult * math.cos(ang) * self.STEP_LENGTH)
-            cell = LEVEL[new_pos_z][new_pos_x]
-
             if key == 'x':
                 if self.inventory.current == 'sword':
                     f = [0.1, 0.2, 0.25, 0.2, 0.1, 0.0]
@@ -333,28 +514,20 @@ class DungeonActivity:
                     self.sound_effects.play('media/sound/sword-unsheathe.ogg')
                 else:
                     return True
-            elif (cell in (' ', 'd') or (cell == 'X' and not show_item) or (cell == 'D' and self.env.door_open)) and (self.env.dragon_hp is None or new_pos_x!=1 or new_pos_z !=6):
-                f = [(i+1)/self.FPT for i in range(self.FPT)]
-                self.sound_effects.play('media/sound/interface2.ogg')
             else:
-                f = [0.1, 0.25, 0.35, 0.20, 0.1, 0.0]
-                if mult == -1:
-                    f = [0.5*i for i in f]
-                self.sound_effects.play('media/sound/interface1.ogg')
+                f, possible = self.walk(self.prev_state, mult, self.env)
+                self.sound_effects.play('media/sound/interface2.ogg' if possible else 'media/sound/interface1.ogg')
 
-            for m in f:
-                self.states.append((pos_x + mult * math.sin(ang)*self.STEP_LENGTH * m, pos_y, pos_z + mult * math.cos(ang)*self.STEP_LENGTH * m, ang, item_pos))
+            self.states.extend(self.walk_states(self.prev_state, mult, f))
             
             if self.env.dragon_hp is not None and self.env.dragon_hp <= 0:
-                self.scene._objects.remove(DRAGON)
+                self.scene.remove(DRAGON)
                 self.env.dragon_hp = None
                 self.sound_effects.play('media/sound/random1.ogg')
 
 
         if key in (Keys.LEFT, Keys.RIGHT):  # Turn left / right
-            mult = 1 if key == Keys.LEFT else -1
-            for i in range(self.FPT):
-                self.states.append((pos_x, pos_y, pos_z, (ang + mult * math.pi/2 * (i+1) / self.FPT) % (2*math.pi), item_pos))
+            self.states.extend(self.turn_states(self.prev_state, 1 if key == Keys.LEFT else -1))
 
         if key == Keys.SPACE:  # Jumping 
             for j in [-0.2, -0.3, -0.35, -0.3, -0.2, 0.0]:
@@ -388,6 +561,7 @@ class DungeonActivity:
                     self.overlay_count = 50
                 if round(2*pos_x) == 3 and round(2*pos_z) == 9 and not self.env.has_key:
                     TEXTURES['c'].texture = ImageTexture(self.tileset[45*64+45])
+                    self.scene.touch()
                     self.env.has_key = True
                     clear(self.overlay, Color4f(0,0,0,0))
                     puttextblock(self.overlay, 6, 10, 63, "You found", font_color=(255,255,255), font=FONT, shadow_color=(0,0,0))
@@ -400,6 +574,7 @@ class DungeonActivity:
                         TEXTURES['D'].texture = ImageTexture(self.tileset[11*64+32-5-4])
                     else:
                         TEXTURES['D'].texture = ImageTexture(self.tileset[11*64+32-5])
+                    self.scene.touch()
                     self.env.door_open = not self.env.door_open
                     self.sound_effects.play('media/sound/door.ogg')
                         
@@ -420,11 +595,17 @@ class DungeonActivity:
 
         if key == Keys.ESC:
             self.loop.exit()
-    
+
+        self._update_stale()
         return True
 
 
 
+def level_digest() -> str:
+    """Digest of level and settings which frames baked by bake.py depend on (besides media files)."""
+    return hashlib.sha1(repr((LEVEL, DungeonActivity.DOF, DungeonActivity.FOG)).encode('utf-8')).hexdigest()
+
+
 ################
 class GenericMenuActivity:
     def __init__(self):
@@ -497,13 +678,25 @@ class MainMenuActivity(GenericMenuActivity):
 @GameLoop.register('SettingMenu')
 class SettingMenuActivity(GenericMenuActivity):
     TITLE = '- Settings -'
-    OPTIONS = ['Music: ON', 'Sound: OFF', 'Res: 63x63', 'Key: ?', 'Back']
+    OPTIONS = ['Music: ON', 'Sound: OFF', 'Res: auto', 'Key: ?', 'Back']
+    RESOLUTIONS = [None, 1, 2, 3]  # choices of RESOLUTION
 
     def interact_0(self, event):
         if event.key in {Keys.LEFT, Keys.RIGHT, Keys.ENTER}:
             self.OPTIONS[0] = 'Music: OFF' if self.OPTIONS[0] == 'Music: ON' else 'Music: ON'
         # self.loop.exit()
 
+    def interact_2(self, event):
+        global RESOLUTION
+        if event.key in {Keys.LEFT, Keys.RIGHT, Keys.ENTER}:
+            index = self.RESOLUTIONS.index(RESOLUTION) + (-1 if event.key == Keys.LEFT else 1)
+            RESOLUTION = self.RESOLUTIONS[index % len(self.RESOLUTIONS)]
+            if RESOLUTION is None:
+                self.OPTIONS[2] = 'Res: auto'
+            else:
+                width, height = ScalingRenderer.scaled_size(63, 63, RESOLUTION)
+                self.OPTIONS[2] = f'Res: {width}x{height}'
+
     def interact_3(self, event):
         self.OPTIONS[3] = f"Key: {event.key}"
 
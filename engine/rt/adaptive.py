@@ -0,0 +1,147 @@
+from typing import List, Optional, Sequence, Tuple
+
+from .cameras import PerspectiveCamera
+from .image import Image, Color4f
+from .intersection import Hits
+from .renderer import Renderer
+from .solids import Quad
+from .utils import Ray, Vector3f
+
+Block = Tuple[int, int, int, int]  # first and last column, first and last row (corner pixels)
+
+
+class AdaptiveRenderer(Renderer):
+    """
+    Renderer tracing primary rays of coarse lattice of pixels (every STEP-th column and row) and refining
+    blocks between them only where needed.
+
+    Block whose traced pixels (corners and ones traced for neighbouring blocks, so thin solids found next to block
+    are noticed at its edges) hit the same quad, with colours differing by less than threshold in every channel, is
+    filled by intersecting rays of its remaining pixels with that quad alone: their directions lie between corner ones,
+    so they hit the same plane inside of the quad, and texture coordinates are exact (perspective correct). Pixels
+    at holes of quad (transparent texels) are traced as usual. Block whose traced pixels hit nothing is filled with
+    their colour. Other blocks are halved along sides longer than single pixel and their new corners are traced, down
+    to single pixels.
+
+    Solids smaller than a block may still be missed if no traced pixel hits them (e.g. distant sprites, or parts
+    of solids closer than render distance only between traced pixels), so STEP should be small compared to frame
+    size. Other cameras and integrators fall back to tracing every pixel.
+    """
+    STEP = 4
+
+    def __init__(self, camera, integrator, *, packets: bool = True, threshold: float = 0.5):
+        super().__init__(camera, integrator, packets=packets)
+        self.threshold = threshold
+        self.traced = 0  # primary rays traced through whole scene in the last frame
+
+    def render(self, texture: Image) -> None:
+        integrator = self.prepare()
+        if not (self.packets and hasattr(integrator, 'get_hit_radiance') and isinstance(self.camera, PerspectiveCamera)):
+            self.traced = texture.width * texture.height
+            return super().render(texture)
+
+        width, height = texture.width, texture.height
+        # colours of pixels and solids hit by their rays, filled in as pixels are traced
+        colors: List[Optional[Color4f]] = [None] * (width * height)
+        solids = [None] * (width * height)
+        self.traced = 0
+
+        xs, ys = self._lattice(width), self._lattice(height)
+        self._trace(integrator, [(x, y) for y in ys for x in xs], width, height, colors, solids)
+        blocks = [(x0, x1, y0, y1) for y0, y1 in zip(ys, ys[1:]) for x0, x1 in zip(xs, xs[1:])]
+
+        agreed = []
+        while blocks:
+            # pixels traced at edges of neighbouring blocks may show that agreed block isn't uniform after all,
+            # so blocks agreed in previous passes are checked again (once per pass, together with new blocks)
+            checked, agreed, refined = agreed + blocks, [], []
+            for block in checked:
+                (agreed if self._agrees(block, width, colors, solids) else refined).append(block)
+            split, pending = [], set()
+            for block in refined:
+                x0, x1, y0, y1 = block
+                xs = [x0, (x0 + x1) // 2, x1] if x1 - x0 > 1 else [x0, x1]
+                ys = [y0, (y0 + y1) // 2, y1] if y1 - y0 > 1 else [y0, y1]
+                if len(xs) == len(ys) == 2:
+                    continue  # all pixels are corners
+                pending.update((x, y) for y in ys for x in xs if colors[y * width + x] is None)
+                split.extend((a, b, c, d) for c, d in zip(ys, ys[1:]) for a, b in zip(xs, xs[1:]))
+            self._trace(integrator, sorted(pending, key=lambda p: (p[1], p[0])), width, height, colors, solids)
+            blocks = split
+
+        for block in agreed:
+            self._fill(integrator, block, width, height, colors, solids)
+
+        for y in range(height):
+            for x in range(width):
+                texture[x, y] = colors[y * width + x]
+
+    def _lattice(self, size: int) -> List[int]:
+        return list(range(0, size - 1, self.STEP)) + [size - 1]
+
+    def _agrees(self, block: Block, width: int, colors: List[Optional[Color4f]], solids: list) -> bool:
+        """
+        Check if all traced pixels of block (corners and ones traced for neighbouring blocks) see similar texels
+        of the same quad, or all of them hit nothing.
+        """
+        x0, x1, y0, y1 = block
+        traced = [i for y in range(y0, y1 + 1) for i in range(y * width + x0, y * width + x1 + 1) if colors[i] is not None]
+        solid = solids[traced[0]]
+        if any(solids[i] is not solid for i in traced):
+            return False
+        if solid is None:
+            return True  # every ray hitting nothing has the same (background) colour
+        if type(solid) is not Quad:
+            return False
+        threshold = self.threshold
+        return all(max(channel) - min(channel) < threshold for channel in zip(*((colors[i].r, colors[i].g, colors[i].b) for i in traced)))
+
+    def _rays(self, pixels: Sequence[Tuple[int, int]], width: int, height: int) -> List[Ray]:
+        # directions computed exactly like in PerspectiveCamera.get_primary_rays
+        camera = self.camera
+        forward, fx, fy, center = camera.forward, camera.fx, camera.fy, camera.center
+        rays = []
+        for x, y in pixels:
+            rx, ry = 2.0 * x / (width-1) - 1.0, 2.0 * y / (height-1) - 1.0
+            rays.append(Ray(center, Vector3f(
+                forward.x + (rx * fx.x + ry * fy.x), forward.y + (rx * fx.y + ry * fy.y), forward.z + (rx * fx.z + ry * fy.z)
+            )))
+        return rays
+
+    def _trace(self, integrator, pixels: Sequence[Tuple[int, int]], width: int, height: int, colors: List[Optional[Color4f]], solids: list):
+        """Trace primary rays of given pixels through whole scene, as single packet."""
+        if not pixels:
+            return
+        rays = self._rays(pixels, width, height)
+        directions = [c for ray in rays for c in ray.d]
+        hits = integrator.world.scene.intersect_many(list(self.camera.center) * len(rays), directions, tmax=integrator.tmax)
+
+        for k, ((x, y), ray) in enumerate(zip(pixels, rays)):
+            i = y * width + x
+            solids[i] = hits.solids[k]
+            colors[i] = integrator.get_hit_radiance(ray, hits.intersection(k, ray)).trim()
+        self.traced += len(pixels)
+
+    def _fill(self, integrator, block: Block, width: int, height: int, colors: List[Optional[Color4f]], solids: list):
+        """Shade remaining pixels of block with hits of quad seen by its corners (or background, if they hit nothing)."""
+        x0, x1, y0, y1 = block
+        quad = solids[y0 * width + x0]
+        pixels = [(x, y) for y in range(y0, y1 + 1) for x in range(x0, x1 + 1) if colors[y * width + x] is None]
+        if quad is None:
+            background = colors[y0 * width + x0]
+            for x, y in pixels:
+                colors[y * width + x] = background
+            return
+        rays = self._rays(pixels, width, height)
+        hits = Hits.empty(len(rays), integrator.tmax)
+        quad.intersect_many(list(self.camera.center) * len(rays), [c for ray in rays for c in ray.d], range(len(rays)), hits)
+
+        for k, ((x, y), ray) in enumerate(zip(pixels, rays)):
+            i = y * width + x
+            if hits.solids[k] is None:
+                # hole of quad, solid seen through it stays unknown
+                colors[i] = integrator.get_radiance(ray).trim()
+                self.traced += 1
+            else:
+                solids[i] = quad
+                colors[i] = integrator.get_hit_radiance(ray, hits.intersection(k, ray)).trim()
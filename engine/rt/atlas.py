@@ -0,0 +1,153 @@
+import json
+import struct
+import zlib
+from typing import AbstractSet, BinaryIO, Dict, Iterable, Optional, Sequence, Tuple
+
+from .cameras import Camera, PerspectiveCamera
+from .frustum import Frustum
+from .image import Image, Color4f
+from .renderer import camera_key
+from .solids.solid import Solid
+
+# File layout: header, JSON metadata, index entries (camera key, offset and length of frame) and frames
+# (8-bit RGB pixels, row major, compressed with zlib)
+MAGIC = b'FRAT'
+HEADER = struct.Struct('<4sHHHII')  # magic, version, width, height, frames count, metadata length
+KEY_SIZE = 18  # floats of camera_key
+ENTRY = struct.Struct(f'<{KEY_SIZE}dQI')
+VERSION = 1
+
+
+class FrameAtlas:
+    """
+    Frames of fixed size rendered ahead of time (e.g. by bake.py), indexed by camera.
+
+    Only index is loaded, frames are read from file when requested. Pixels are stored with 8 bits per channel,
+    which is exactly what screen shows (see Color4f.as_3i). Like in CachingRenderer, cameras differing only by rounding
+    errors share frames.
+    """
+
+    def __init__(self, path: str):
+        self._file: BinaryIO = open(path, 'rb')
+        magic, version, self.width, self.height, count, meta_length = HEADER.unpack(self._file.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            self._file.close()
+            raise ValueError(f"{path} is not frame atlas (version {VERSION})")
+
+        self.meta = json.loads(self._file.read(meta_length).decode('utf-8'))
+        self._index: Dict[tuple, Tuple[int, int]] = {}
+        for _ in range(count):
+            *key, offset, length = ENTRY.unpack(self._file.read(ENTRY.size))
+            self._index[tuple(key)] = (offset, length)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key: tuple) -> bool:
+        return key in self._index
+
+    def close(self):
+        self._file.close()
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return (self.width, self.height)
+
+    def get(self, camera: Camera) -> Optional[Image]:
+        """Frame of given camera, None if it wasn't baked."""
+        entry = self._index.get(camera_key(camera))
+        if entry is None:
+            return None
+        offset, length = entry
+        self._file.seek(offset)
+        pixels = zlib.decompress(self._file.read(length))
+
+        image = Image(width=self.width, height=self.height)
+        image._data = [Color4f(pixels[i] / 255, pixels[i+1] / 255, pixels[i+2] / 255, 1.0) for i in range(0, len(pixels), 3)]
+        return image
+
+    @staticmethod
+    def encode(image: Image) -> bytes:
+        """Compressed pixels of frame, as stored in atlas."""
+        return zlib.compress(bytes(c for color in image._data for c in color.as_3i), 9)
+
+    @staticmethod
+    def write(path: str, width: int, height: int, frames: Iterable[Tuple[tuple, bytes]], meta: Optional[dict] = None):
+        """Write atlas of frames given as camera keys (see camera_key) and encoded pixels (see encode)."""
+        frames = dict(frames)
+        meta = json.dumps(meta or {}).encode('utf-8')
+        offset = HEADER.size + len(meta) + ENTRY.size * len(frames)
+
+        with open(path, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, VERSION, width, height, len(frames), len(meta)))
+            file.write(meta)
+            for key, data in frames.items():
+                file.write(ENTRY.pack(*key, offset, len(data)))
+                offset += len(data)
+            for data in frames.values():
+                file.write(data)
+
+
+class AtlasRenderer:
+    """
+    Wrapper of other renderer streaming frames from FrameAtlas instead of tracing them.
+
+    Solids which look differently than when atlas was baked (moved, removed or with swapped texture) should be
+    marked as stale. Frames whose view may contain any of them (stale solid overlaps view frustum and isn't hidden
+    according to precomputed visibility of scene) are rendered by wrapped renderer, as well as frames missing in atlas.
+
+    Wrapped renderer may be CachingRenderer, prefetch is passed to it for frames atlas can't serve.
+    """
+
+    def __init__(self, renderer, atlas: FrameAtlas):
+        self.renderer = renderer
+        self.atlas = atlas
+        self.stale: AbstractSet[Solid] = frozenset()
+
+    @property
+    def camera(self) -> Camera:
+        return self.renderer.camera
+
+    @camera.setter
+    def camera(self, camera: Camera):
+        self.renderer.camera = camera
+
+    def close(self):
+        self.atlas.close()
+        close = getattr(self.renderer, 'close', None)
+        if close is not None:
+            close()
+
+    def prefetch(self, cameras: Sequence[Camera], width: int, height: int):
+        prefetch = getattr(self.renderer, 'prefetch', None)
+        if prefetch is not None:
+            prefetch([camera for camera in cameras if not self._serves(camera, (width, height))], width, height)
+
+    def cancel(self):
+        cancel = getattr(self.renderer, 'cancel', None)
+        if cancel is not None:
+            cancel()
+
+    def _serves(self, camera: Camera, size: Tuple[int, int]) -> bool:
+        return size == self.atlas.size and camera_key(camera) in self.atlas and not self._shows_stale(camera)
+
+    def _shows_stale(self, camera: Camera) -> bool:
+        if not self.stale:
+            return False
+        if not isinstance(camera, PerspectiveCamera):
+            return True
+
+        renderer = self.renderer
+        scene = renderer.scene if hasattr(renderer, 'scene') else renderer.integrator.world.scene
+        hidden = scene.visibility.hidden_from(camera.center) if scene.visibility is not None else ()
+        frustum = Frustum(camera.center, [camera.get_primary_ray(x, y).d for x, y in [(-1.0, -1.0), (1.0, -1.0), (1.0, 1.0), (-1.0, 1.0)]])
+        return any(solid not in hidden and frustum.overlaps(solid.bounds()) for solid in self.stale)
+
+    def render(self, texture: Image) -> None:
+        camera = self.renderer.camera
+        if texture.size == self.atlas.size and not self._shows_stale(camera):
+            frame = self.atlas.get(camera)
+            if frame is not None:
+                texture._data[:] = frame._data
+                return
+        self.renderer.render(texture)
@@ -0,0 +1,59 @@
+from typing import NamedTuple, Optional, Tuple
+from .utils import Point3f, Ray
+
+INF = float('inf')
+
+
+class BBox(NamedTuple):
+    min: Point3f
+    max: Point3f
+
+    @classmethod
+    def from_points(cls, *points: Point3f) -> 'BBox':
+        return BBox(
+            Point3f(min(p.x for p in points), min(p.y for p in points), min(p.z for p in points)),
+            Point3f(max(p.x for p in points), max(p.y for p in points), max(p.z for p in points)),
+        )
+
+    @property
+    def centroid(self) -> Point3f:
+        return Point3f(
+            0.5 * (self.min.x + self.max.x),
+            0.5 * (self.min.y + self.max.y),
+            0.5 * (self.min.z + self.max.z),
+        )
+
+    @property
+    def surface_area(self) -> float:
+        dx, dy, dz = self.max.x - self.min.x, self.max.y - self.min.y, self.max.z - self.min.z
+        return 2.0 * (dx * dy + dy * dz + dz * dx)
+
+    def extend(self, other: 'BBox') -> 'BBox':
+        return BBox(
+            Point3f(min(self.min.x, other.min.x), min(self.min.y, other.min.y), min(self.min.z, other.min.z)),
+            Point3f(max(self.max.x, other.max.x), max(self.max.y, other.max.y), max(self.max.z, other.max.z)),
+        )
+
+    def padded(self, eps: float) -> 'BBox':
+        return BBox(
+            Point3f(self.min.x - eps, self.min.y - eps, self.min.z - eps),
+            Point3f(self.max.x + eps, self.max.y + eps, self.max.z + eps),
+        )
+
+    def intersect(self, ray: Ray, tmin: float = 0.0, tmax: float = INF) -> Optional[Tuple[float, float]]:
+        """Return (t_enter, t_exit) range of ray inside box (clipped to [tmin, tmax]) or None if ray misses it."""
+        for o, d, lo, hi in zip(ray.o, ray.d, self.min, self.max):
+            if d == 0.0:
+                if o < lo or o > hi:
+                    return None
+                continue
+            t0, t1 = (lo - o) / d, (hi - o) / d
+            if t0 > t1:
+                t0, t1 = t1, t0
+            if t0 > tmin:
+                tmin = t0
+            if t1 < tmax:
+                tmax = t1
+            if tmin > tmax:
+                return None
+        return tmin, tmax
@@ -0,0 +1,293 @@
+import heapq
+from array import array
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from .bbox import BBox, INF
+from .solids.solid import Solid
+from .utils import Ray
+from .intersection import Intersection, Hits, distinct_hits
+
+# Inverse of zero ray direction component, finite to avoid 0*inf=nan in slab tests
+BIG = 1e30
+
+# Boxes are padded so flat solids (e.g. axis aligned quads) are never missed due to rounding
+EPS = 1e-6
+
+
+def slab_test(box: Sequence[float], ox: float, oy: float, oz: float, ix: float, iy: float, iz: float, t_lower: float, t_best: float) -> Optional[float]:
+    """
+    Distance at which ray with origin o and inverse direction i enters box (x0, y0, z0, x1, y1, z1), zero if it starts
+    inside. None if ray misses box, enters it farther than t_best or leaves it before t_lower.
+    """
+    x0, y0, z0, x1, y1, z1 = box
+
+    t0, t1 = (x0 - ox) * ix, (x1 - ox) * ix
+    if t0 > t1:
+        t0, t1 = t1, t0
+    s0, s1 = (y0 - oy) * iy, (y1 - oy) * iy
+    if s0 > s1:
+        s0, s1 = s1, s0
+    if s0 > t0:
+        t0 = s0
+    if s1 < t1:
+        t1 = s1
+    s0, s1 = (z0 - oz) * iz, (z1 - oz) * iz
+    if s0 > s1:
+        s0, s1 = s1, s0
+    if s0 > t0:
+        t0 = s0
+    if s1 < t1:
+        t1 = s1
+
+    if t0 < 0.0:
+        t0 = 0.0
+    if t0 <= t1 and t0 <= t_best and t1 >= t_lower:
+        return t0
+    return None
+
+
+class BVHNode:
+    __slots__ = ('box', 'left', 'right', 'objects')
+
+    def __init__(self, bbox: BBox, left: Optional['BVHNode'] = None, right: Optional['BVHNode'] = None, objects: Optional[List[Solid]] = None):
+        padded = bbox.padded(EPS)
+        self.box = (*padded.min, *padded.max)
+        self.left = left
+        self.right = right
+        self.objects = objects
+
+
+class BVH:
+    """
+    Bounding volume hierarchy over scene solids, build with binned SAH (surface area heuristic).
+
+    Children of each node are visited front to back and subtrees further than the best hit found so far are skipped.
+    """
+    BINS = 12
+    MAX_LEAF_SIZE = 4
+    TRAVERSAL_COST = 1.0
+    INTERSECTION_COST = 1.0
+
+    def __init__(self, objects: Sequence[Solid]):
+        items = []
+        for obj in objects:
+            bbox = obj.bounds()
+            items.append((obj, bbox, bbox.centroid))
+
+        self.root = self._build(items) if items else None
+
+    def _build(self, items: List[Tuple[Solid, BBox, tuple]]) -> BVHNode:
+        bbox = items[0][1]
+        for _, b, _ in items[1:]:
+            bbox = bbox.extend(b)
+
+        if len(items) <= 2:
+            return BVHNode(bbox, objects=[obj for obj, _, _ in items])
+
+        split = self._find_split(items, bbox)
+        if split is None:
+            if len(items) <= self.MAX_LEAF_SIZE:
+                return BVHNode(bbox, objects=[obj for obj, _, _ in items])
+
+            # No profitable split, fallback to median split along the widest centroids axis
+            lo = [min(c[axis] for _, _, c in items) for axis in range(3)]
+            hi = [max(c[axis] for _, _, c in items) for axis in range(3)]
+            axis = max(range(3), key=lambda a: hi[a] - lo[a])
+            items = sorted(items, key=lambda item: item[2][axis])
+            left, right = items[:len(items) // 2], items[len(items) // 2:]
+        else:
+            left, right = split
+
+        return BVHNode(bbox, left=self._build(left), right=self._build(right))
+
+    def _find_split(self, items, bbox: BBox):
+        parent_area = bbox.surface_area
+        best_cost = len(items) * self.INTERSECTION_COST
+        best = None
+
+        for axis in range(3):
+            lo = min(c[axis] for _, _, c in items)
+            hi = max(c[axis] for _, _, c in items)
+            if hi - lo <= 1e-12:
+                continue
+
+            scale = self.BINS / (hi - lo)
+            bins = [[] for _ in range(self.BINS)]
+            for item in items:
+                bins[min(int((item[2][axis] - lo) * scale), self.BINS - 1)].append(item)
+
+            # sweep from right to collect areas of suffixes
+            right_areas = [0.0] * self.BINS
+            acc = None
+            for i in range(self.BINS - 1, 0, -1):
+                for _, b, _ in bins[i]:
+                    acc = b if acc is None else acc.extend(b)
+                right_areas[i] = acc.surface_area if acc is not None else 0.0
+
+            acc, count = None, 0
+            for i in range(self.BINS - 1):
+                for _, b, _ in bins[i]:
+                    acc = b if acc is None else acc.extend(b)
+                count += len(bins[i])
+                if count == 0 or count == len(items):
+                    continue
+
+                if parent_area > 0.0:
+                    cost = self.TRAVERSAL_COST + self.INTERSECTION_COST * (
+                        acc.surface_area * count + right_areas[i+1] * (len(items) - count)) / parent_area
+                else:
+                    cost = self.TRAVERSAL_COST + self.INTERSECTION_COST * 0.5 * len(items)
+
+                if cost < best_cost:
+                    best_cost = cost
+                    best = (axis, i)
+
+        if best is None:
+            return None
+
+        axis, i = best
+        left, right = [], []
+        lo = min(c[axis] for _, _, c in items)
+        hi = max(c[axis] for _, _, c in items)
+        scale = self.BINS / (hi - lo)
+        for item in items:
+            (left if min(int((item[2][axis] - lo) * scale), self.BINS - 1) <= i else right).append(item)
+        return left, right
+
+    def intersect(self, ray: Ray, previous_best: Optional[Intersection] = None, lower_bound: Optional[Intersection] = None, tmax: float = INF) -> Optional[Intersection]:
+        if self.root is None:
+            return previous_best
+
+        best = previous_best
+        t_best = best.distance if best is not None else tmax
+        t_lower = lower_bound.distance if lower_bound is not None else -INF
+
+        ox, oy, oz = ray.o
+        dx, dy, dz = ray.d
+        ix = 1.0 / dx if dx != 0.0 else BIG
+        iy = 1.0 / dy if dy != 0.0 else BIG
+        iz = 1.0 / dz if dz != 0.0 else BIG
+
+        stack = [(0.0, self.root)]
+        while stack:
+            t_near, node = stack.pop()
+            if t_near > t_best:
+                continue
+
+            objects = node.objects
+            if objects is not None:
+                for obj in objects:
+                    intersection = obj.intersect(ray, best)
+                    if intersection is not None and t_lower < intersection.distance < t_best:
+                        best = intersection
+                        t_best = intersection.distance
+                continue
+
+            hits = []
+            for child in (node.left, node.right):
+                t0 = slab_test(child.box, ox, oy, oz, ix, iy, iz, t_lower, t_best)
+                if t0 is not None:
+                    hits.append((t0, child))
+
+            if len(hits) == 2 and hits[0][0] < hits[1][0]:
+                stack.append(hits[1])
+                stack.append(hits[0])
+            else:
+                stack.extend(hits)
+
+        return best
+
+    def iter_hits(self, ray: Ray, lower_bound: Optional[Intersection] = None, tmax: float = INF) -> Iterator[Intersection]:
+        """
+        Intersections farther than lower_bound and closer than tmax, front to back, found lazily in single traversal.
+
+        Nodes and hits are visited in order of distance. Equal distances are ordered by position in depth-first
+        traversal of intersect, so every hit is the one intersect would find with previous hit as lower bound.
+        """
+        return distinct_hits(self._iter_hits(ray, lower_bound, tmax))
+
+    def _iter_hits(self, ray: Ray, lower_bound: Optional[Intersection], tmax: float) -> Iterator[Intersection]:
+        if self.root is None:
+            return
+        t_lower = lower_bound.distance if lower_bound is not None else -INF
+
+        ox, oy, oz = ray.o
+        dx, dy, dz = ray.d
+        ix = 1.0 / dx if dx != 0.0 else BIG
+        iy = 1.0 / dy if dy != 0.0 else BIG
+        iz = 1.0 / dz if dz != 0.0 else BIG
+
+        # entries are (distance, path in depth-first traversal, node or hit)
+        heap = [(0.0, (), self.root)]
+        while heap:
+            t_near, path, item = heapq.heappop(heap)
+            if isinstance(item, Intersection):
+                yield item
+                continue
+
+            objects = item.objects
+            if objects is not None:
+                for k, obj in enumerate(objects):
+                    intersection = obj.intersect(ray)
+                    if intersection is not None and t_lower < intersection.distance < tmax:
+                        heapq.heappush(heap, (intersection.distance, path + (k, ), intersection))
+                continue
+
+            hits = []
+            for child in (item.left, item.right):
+                t0 = slab_test(child.box, ox, oy, oz, ix, iy, iz, t_lower, tmax)
+                if t0 is not None:
+                    hits.append((t0, child))
+
+            # intersect visits left child first only if it is strictly closer
+            if len(hits) == 2 and hits[0][0] >= hits[1][0]:
+                hits.reverse()
+            for rank, (t0, child) in enumerate(hits):
+                heapq.heappush(heap, (t0, path + (rank, ), child))
+
+    def intersect_many(self, origins: Sequence[float], directions: Sequence[float], lower: Optional[Sequence[float]] = None, tmax: float = INF) -> Hits:
+        """Find closest hits of packet of coherent rays, rejecting whole packet against node bounds at once."""
+        count = len(directions) // 3
+        hits = Hits.empty(count, tmax)
+        if self.root is None or count == 0:
+            return hits
+
+        inverse = array('d', (1.0 / d if d != 0.0 else BIG for d in directions))
+        distances = hits.distances
+
+        stack = [(0.0, self.root, range(count))]
+        while stack:
+            t_near, node, active = stack.pop()
+
+            objects = node.objects
+            if objects is not None:
+                for obj in objects:
+                    obj.intersect_many(origins, directions, active, hits, lower)
+                continue
+
+            children = []
+            for child in (node.left, node.right):
+                box = child.box
+                child_active = []
+                child_near = INF
+
+                for i in active:
+                    j = 3 * i
+                    t0 = slab_test(box, origins[j], origins[j+1], origins[j+2], inverse[j], inverse[j+1], inverse[j+2],
+                                   lower[i] if lower is not None else -INF, distances[i])
+                    if t0 is not None:
+                        child_active.append(i)
+                        if t0 < child_near:
+                            child_near = t0
+
+                if child_active:
+                    children.append((child_near, child, child_active))
+
+            # visit child closer to the packet first
+            if len(children) == 2 and children[0][0] < children[1][0]:
+                stack.append(children[1])
+                stack.append(children[0])
+            else:
+                stack.extend(children)
+
+        return hits
@@ -1,8 +1,24 @@
 from abc import ABC, abstractmethod
+from array import array
+from typing import Iterable, Optional, Tuple
 from ..utils import Ray
 
 
 class Camera(ABC):
     @abstractmethod
     def get_primary_ray(self, x: float, y: float) -> Ray:
-        pass
\ No newline at end of file
+        pass
+
+    def get_primary_rays(self, width: int, height: int, rows: Optional[Iterable[int]] = None) -> Tuple[array, array]:
+        """
+        Generate primary rays of (selected rows of) width x height frame, as flat xyz arrays of origins and directions.
+
+        Rays are ordered row by row, and pixel coordinates are mapped to [-1, 1] range like in Renderer.
+        """
+        origins, directions = array('d'), array('d')
+        for y in (range(height) if rows is None else rows):
+            for x in range(width):
+                ray = self.get_primary_ray(2.0 * x / (width-1) - 1.0, 2.0 * y / (height-1) - 1.0)
+                origins.extend(ray.o)
+                directions.extend(ray.d)
+        return origins, directions
@@ -1,6 +1,8 @@
 from .camera import Camera
 from ..utils import Point3f, Vector3f, Ray
 import math
+from array import array
+from typing import Iterable, Optional, Tuple
 
 
 class PerspectiveCamera(Camera):
@@ -14,4 +16,20 @@ class PerspectiveCamera(Camera):
 
     def get_primary_ray(self, x: float, y: float) -> Ray:
         vxy = (x * self.fx) + (y * self.fy)
-        return Ray(self.center, self.forward + vxy)
\ No newline at end of file
+        return Ray(self.center, self.forward + vxy)
+
+    def get_primary_rays(self, width: int, height: int, rows: Optional[Iterable[int]] = None) -> Tuple[array, array]:
+        # all rays share origin, directions computed exactly like in get_primary_ray
+        forward, fx, fy = self.forward, self.fx, self.fy
+        xs = [2.0 * x / (width-1) - 1.0 for x in range(width)]
+
+        directions = array('d')
+        count = 0
+        for y in (range(height) if rows is None else rows):
+            ry = 2.0 * y / (height-1) - 1.0
+            yx, yy, yz = ry * fy.x, ry * fy.y, ry * fy.z
+            for rx in xs:
+                directions.extend((forward.x + (rx * fx.x + yx), forward.y + (rx * fx.y + yy), forward.z + (rx * fx.z + yz)))
+            count += width
+
+        return array('d', self.center) * count, directions
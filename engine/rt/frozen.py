@@ -0,0 +1,384 @@
+import copy
+import heapq
+from array import array
+from typing import AbstractSet, Iterator, List, Optional, Sequence, Tuple
+
+from .bbox import BBox, INF
+from .bvh import BVH, BVHNode, BIG, slab_test
+from .scene import LinearScene, Scene
+from .frustum import Frustum
+from .solids import Quad
+from .solids.solid import Solid
+from .utils import Ray, Point3f, Vector3f
+from .intersection import Intersection, Hits
+
+# Packed quad layout: p0, v0, v1, normal and barycentric invariants uu, uv, vv, uv*uv-uu*vv
+QUAD_STRIDE = 16
+
+# Margin of plane side test in FrozenBVH.seen_from, covers rounding of ray directions
+SIDE_EPS = 1e-9
+
+
+def pack_quad(quad: Quad) -> tuple:
+    return (*quad.p0, *quad.v0, *quad.v1, *quad.normal, quad.uu, quad.uv, quad.vv, quad.denom)
+
+
+class FrozenBVH(BVH):
+    """
+    BVH compiled into flat arrays: node boxes, child indices and packed quads of leaves (see QUAD_STRIDE).
+
+    Traversal visits nodes and solids in exactly the same order as BVH, but quads are tested on packed buffers
+    (see _hit_quad) instead of through Quad objects. Other solids are stored in leaves as they are and intersected
+    normally.
+    """
+
+    def __init__(self, objects: Sequence[Solid]):
+        super().__init__(objects)
+
+        self.boxes = array('d')
+        self.children = array('l')  # left and right child index, -1 for leaves
+        self.ranges = array('l')  # first solid and solids count of leaves
+        self.quads = array('d')  # QUAD_STRIDE values per solid, zeros for non-quads
+        self.solids: List[Solid] = []
+        self.bounds: List[BBox] = []
+
+        if self.root is not None:
+            self._flatten(self.root)
+
+        # Set in hierarchies specialised for shared rays origin (see seen_from)
+        self.origin: Optional[Point3f] = None
+        self.numerators: Optional[array] = None
+        self.visible: Optional[array] = None
+        self.live: Optional[array] = None  # nodes containing any visible solid
+
+    def _flatten(self, node: BVHNode) -> int:
+        index = len(self.boxes) // 6
+        self.boxes.extend(node.box)
+        self.children.extend((-1, -1))
+        self.ranges.extend((len(self.solids), 0))
+
+        if node.objects is not None:
+            for obj in node.objects:
+                self.quads.extend(pack_quad(obj) if isinstance(obj, Quad) else (0.0, ) * QUAD_STRIDE)
+                self.solids.append(obj)
+                self.bounds.append(obj.bounds())
+            self.ranges[2*index + 1] = len(node.objects)
+        else:
+            self.children[2*index] = self._flatten(node.left)
+            self.children[2*index + 1] = self._flatten(node.right)
+        return index
+
+    def seen_from(self, origin: Point3f, corners: Sequence[Vector3f], hidden: AbstractSet[Solid] = frozenset()) -> 'FrozenBVH':
+        """
+        Copy of hierarchy specialised for rays starting at origin, with directions inside pyramid spanned by corners
+        (e.g. primary rays of PerspectiveCamera and their transparency continuations).
+
+        Solids outside of view frustum or hidden from origin are skipped, as well as quads whose planes can be hit
+        only behind origin.
+        Numerators of ray-plane distances, dot(normal, p0 - origin), are computed once per quad.
+        Rays starting elsewhere are traced as usual.
+        """
+        view = copy.copy(self)
+        view.origin = origin
+        view.numerators = array('d', [0.0]) * len(self.solids)
+        view.visible = array('b', [1]) * len(self.solids)
+
+        frustum = Frustum(origin, corners)
+        ox, oy, oz = origin
+        quads = self.quads
+        for k, solid in enumerate(self.solids):
+            if solid in hidden or not frustum.overlaps(self.bounds[k]):
+                view.visible[k] = 0
+                continue
+            if type(solid) is not Quad:
+                continue
+
+            j = QUAD_STRIDE * k
+            px, py, pz = quads[j:j+3]
+            nx, ny, nz = quads[j+9:j+12]
+            num = nx*(px - ox) + ny*(py - oy) + nz*(pz - oz)
+            view.numerators[k] = num
+
+            # distance num / dot(d, normal) is positive only if denominator has sign of numerator for some direction d
+            dots = [d.x*nx + d.y*ny + d.z*nz for d in corners]
+            if (num > 0.0 and max(dots) < -SIDE_EPS) or (num < 0.0 and min(dots) > SIDE_EPS):
+                view.visible[k] = 0
+
+        view.live = view._live_nodes()
+        return view
+
+    def _live_nodes(self) -> array:
+        # children are flattened after their parents
+        live = array('b', [0]) * (len(self.ranges) // 2)
+        children, ranges, visible = self.children, self.ranges, self.visible
+        for node in reversed(range(len(live))):
+            left = children[2*node]
+            if left < 0:
+                first = ranges[2*node]
+                live[node] = any(visible[first:first + ranges[2*node + 1]])
+            else:
+                live[node] = live[left] or live[children[2*node + 1]]
+        return live
+
+    def intersect(self, ray: Ray, previous_best: Optional[Intersection] = None, lower_bound: Optional[Intersection] = None, tmax: float = INF) -> Optional[Intersection]:
+        if self.root is None:
+            return previous_best
+
+        best = previous_best
+        t_best = best.distance if best is not None else tmax
+        t_lower = lower_bound.distance if lower_bound is not None else -INF
+
+        ox, oy, oz = ray.o
+        dx, dy, dz = ray.d
+        ix = 1.0 / dx if dx != 0.0 else BIG
+        iy = 1.0 / dy if dy != 0.0 else BIG
+        iz = 1.0 / dz if dz != 0.0 else BIG
+
+        boxes, children, ranges, solids = self.boxes, self.children, self.ranges, self.solids
+        numerators, visible, live = (self.numerators, self.visible, self.live) if ray.o == self.origin else (None, None, None)
+
+        stack = [(0.0, 0)]
+        while stack:
+            t_near, node = stack.pop()
+            if t_near > t_best:
+                continue
+
+            left = children[2*node]
+            if left < 0:
+                first = ranges[2*node]
+                for k in range(first, first + ranges[2*node + 1]):
+                    solid = solids[k]
+                    if visible is not None and not visible[k]:
+                        continue
+                    if type(solid) is not Quad:
+                        intersection = solid.intersect(ray, best)
+                        if intersection is not None and t_lower < intersection.distance < t_best:
+                            best = intersection
+                            t_best = intersection.distance
+                        continue
+
+                    hit = self._hit_quad(k, ox, oy, oz, dx, dy, dz, t_lower, t_best, numerators[k] if numerators is not None else None)
+                    if hit is not None:
+                        t_best, s, t = hit
+                        best = Intersection(solid, ray, t_best, solid.normal, Point3f(1 - s - t, s, t))
+                continue
+
+            hits = []
+            for child in (left, children[2*node + 1]):
+                if live is not None and not live[child]:
+                    continue
+                t0 = slab_test(boxes[6*child:6*child + 6], ox, oy, oz, ix, iy, iz, t_lower, t_best)
+                if t0 is not None:
+                    hits.append((t0, child))
+
+            if len(hits) == 2 and hits[0][0] < hits[1][0]:
+                stack.append(hits[1])
+                stack.append(hits[0])
+            else:
+                stack.extend(hits)
+
+        return best
+
+    def _iter_hits(self, ray: Ray, lower_bound: Optional[Intersection], tmax: float) -> Iterator[Intersection]:
+        if self.root is None:
+            return
+        t_lower = lower_bound.distance if lower_bound is not None else -INF
+
+        ox, oy, oz = ray.o
+        dx, dy, dz = ray.d
+        ix = 1.0 / dx if dx != 0.0 else BIG
+        iy = 1.0 / dy if dy != 0.0 else BIG
+        iz = 1.0 / dz if dz != 0.0 else BIG
+
+        boxes, children, ranges, solids = self.boxes, self.children, self.ranges, self.solids
+        numerators, visible, live = (self.numerators, self.visible, self.live) if ray.o == self.origin else (None, None, None)
+
+        # entries are (distance, path in depth-first traversal, node index or hit), see BVH.iter_hits
+        heap = [(0.0, (), 0)]
+        while heap:
+            t_near, path, item = heapq.heappop(heap)
+            if type(item) is not int:
+                yield item
+                continue
+
+            node = item
+            left = children[2*node]
+            if left < 0:
+                first = ranges[2*node]
+                for k in range(first, first + ranges[2*node + 1]):
+                    solid = solids[k]
+                    if visible is not None and not visible[k]:
+                        continue
+                    if type(solid) is not Quad:
+                        intersection = solid.intersect(ray)
+                        if intersection is not None and t_lower < intersection.distance < tmax:
+                            heapq.heappush(heap, (intersection.distance, path + (k, ), intersection))
+                        continue
+
+                    hit = self._hit_quad(k, ox, oy, oz, dx, dy, dz, t_lower, tmax, numerators[k] if numerators is not None else None)
+                    if hit is not None:
+                        ti, s, t = hit
+                        heapq.heappush(heap, (ti, path + (k, ), Intersection(solid, ray, ti, solid.normal, Point3f(1 - s - t, s, t))))
+                continue
+
+            hits = []
+            for child in (left, children[2*node + 1]):
+                if live is not None and not live[child]:
+                    continue
+                t0 = slab_test(boxes[6*child:6*child + 6], ox, oy, oz, ix, iy, iz, t_lower, tmax)
+                if t0 is not None:
+                    hits.append((t0, child))
+
+            if len(hits) == 2 and hits[0][0] >= hits[1][0]:
+                hits.reverse()
+            for rank, (t0, child) in enumerate(hits):
+                heapq.heappush(heap, (t0, path + (rank, ), child))
+
+    def intersect_many(self, origins: Sequence[float], directions: Sequence[float], lower: Optional[Sequence[float]] = None, tmax: float = INF) -> Hits:
+        count = len(directions) // 3
+        hits = Hits.empty(count, tmax)
+        if self.root is None or count == 0:
+            return hits
+
+        inverse = array('d', (1.0 / d if d != 0.0 else BIG for d in directions))
+        boxes, children, ranges, solids = self.boxes, self.children, self.ranges, self.solids
+        hit_solids, distances, hit_u, hit_v = hits
+        visible = self.visible
+        shared = self.origin is not None and origins == array('d', self.origin) * count
+        live = self.live if shared else None
+
+        stack = [(0, range(count))]
+        while stack:
+            node, active = stack.pop()
+
+            left = children[2*node]
+            if left < 0:
+                first = ranges[2*node]
+                for k in range(first, first + ranges[2*node + 1]):
+                    solid = solids[k]
+                    if shared and not visible[k]:
+                        continue
+                    if type(solid) is not Quad:
+                        solid.intersect_many(origins, directions, active, hits, lower)
+                        continue
+                    if shared:
+                        self._intersect_shared(k, directions, active, hits, lower)
+                        continue
+
+                    for i in active:
+                        j = 3 * i
+                        hit = self._hit_quad(k, origins[j], origins[j+1], origins[j+2], directions[j], directions[j+1], directions[j+2],
+                                             lower[i] if lower is not None else -INF, distances[i])
+                        if hit is not None:
+                            hit_solids[i] = solid
+                            distances[i], hit_u[i], hit_v[i] = hit
+                continue
+
+            near = []
+            for child in (left, children[2*node + 1]):
+                if live is not None and not live[child]:
+                    continue
+                x0, y0, z0, x1, y1, z1 = boxes[6*child:6*child + 6]
+                child_active = []
+                child_near = INF
+
+                # slab_test inlined, this loop runs for every ray of packet at every visited node (most of traversal)
+                for i in active:
+                    j = 3 * i
+                    ox, oy, oz = origins[j], origins[j+1], origins[j+2]
+                    ix, iy, iz = inverse[j], inverse[j+1], inverse[j+2]
+
+                    t0, t1 = (x0 - ox) * ix, (x1 - ox) * ix
+                    if t0 > t1:
+                        t0, t1 = t1, t0
+                    s0, s1 = (y0 - oy) * iy, (y1 - oy) * iy
+                    if s0 > s1:
+                        s0, s1 = s1, s0
+                    if s0 > t0:
+                        t0 = s0
+                    if s1 < t1:
+                        t1 = s1
+                    s0, s1 = (z0 - oz) * iz, (z1 - oz) * iz
+                    if s0 > s1:
+                        s0, s1 = s1, s0
+                    if s0 > t0:
+                        t0 = s0
+                    if s1 < t1:
+                        t1 = s1
+
+                    if t0 < 0.0:
+                        t0 = 0.0
+                    if t0 <= t1 and t0 <= distances[i] and (lower is None or t1 >= lower[i]):
+                        child_active.append(i)
+                        if t0 < child_near:
+                            child_near = t0
+
+                if child_active:
+                    near.append((child_near, child, child_active))
+
+            # visit child closer to the packet first
+            if len(near) == 2 and near[0][0] < near[1][0]:
+                near.reverse()
+            stack.extend((child, child_active) for _, child, child_active in near)
+
+        return hits
+
+    def _intersect_shared(self, k: int, directions: Sequence[float], indices: Sequence[int], hits: Hits, lower: Optional[Sequence[float]]):
+        """Intersect k-th (quad) solid with rays starting at self.origin, using precomputed numerator."""
+        solid = self.solids[k]
+        ox, oy, oz = self.origin
+        num = self.numerators[k]
+        hit_solids, distances, hit_u, hit_v = hits
+
+        for i in indices:
+            j = 3 * i
+            hit = self._hit_quad(k, ox, oy, oz, directions[j], directions[j+1], directions[j+2], lower[i] if lower is not None else -INF, distances[i], num)
+            if hit is not None:
+                hit_solids[i] = solid
+                distances[i], hit_u[i], hit_v[i] = hit
+
+    def _hit_quad(self, k: int, ox: float, oy: float, oz: float, dx: float, dy: float, dz: float, t_lower: float, t_best: float, num: Optional[float] = None) -> Optional[Tuple[float, float, float]]:
+        """
+        Distance and barycentric coordinates s, t of hit of k-th (quad) solid by ray, if it is farther than t_lower,
+        closer than t_best and quad isn't transparent there (see Quad.intersect). Numerator of distance may be given.
+        """
+        j = QUAD_STRIDE * k
+        px, py, pz, ux, uy, uz, vx, vy, vz, nx, ny, nz, uu, uv, vv, denom = self.quads[j:j + QUAD_STRIDE]
+
+        dn = dx*nx + dy*ny + dz*nz
+        if dn == 0.0:
+            return None
+        if num is None:
+            num = nx*(px - ox) + ny*(py - oy) + nz*(pz - oz)
+        ti = num / dn
+        if ti < 0 or ti <= t_lower or ti >= t_best:
+            return None
+
+        wx, wy, wz = (ox + ti*dx) - px, (oy + ti*dy) - py, (oz + ti*dz) - pz
+        wv = wx*vx + wy*vy + wz*vz
+        wu = wx*ux + wy*uy + wz*uz
+        s = (uv*wv-vv*wu)/denom
+        t = (uv*wu-uu*wv)/denom
+
+        if 0.0 <= s <= 1.0 and 0.0 <= t <= 1.0 and not self.solids[k].transparent_at(s, t):
+            return ti, s, t
+        return None
+
+
+class FrozenScene(Scene):
+    """
+    Scene compiled into flat buffers (see FrozenBVH) for cheaper intersection tests of quads.
+
+    Renders exactly like Scene. Compiled structure is rebuilt lazily after each modification.
+    """
+
+    def _build(self):
+        return FrozenBVH(self._objects)
+
+    def seen_from(self, origin: Point3f, corners: Sequence[Vector3f]) -> 'FrozenScene':
+        """Snapshot of scene specialised for rays from origin with directions inside pyramid of corners (see FrozenBVH.seen_from)."""
+        view = FrozenScene(self._objects)
+        view._version = self._version
+        hidden = self.visibility.hidden_from(origin) if self.visibility is not None else frozenset()
+        view._accelerator = self._get_accelerator().seen_from(origin, corners, hidden)
+        return view
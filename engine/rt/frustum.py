@@ -0,0 +1,52 @@
+import math
+from typing import List, Sequence
+
+from .bbox import BBox
+from .utils import Point3f, Vector3f
+
+# Boxes closer than EPS to frustum are kept, so rounding of ray directions never loses hits
+EPS = 1e-6
+
+
+class Frustum:
+    """
+    Infinite pyramid with apex in origin, spanned by corner directions (e.g. camera frame corners).
+
+    Used for conservative culling: every ray starting in origin with direction inside pyramid
+    can hit only solids whose bounds overlap it.
+    """
+
+    def __init__(self, origin: Point3f, corners: Sequence[Vector3f]):
+        self.origin = origin
+        center = Vector3f(sum(c.x for c in corners), sum(c.y for c in corners), sum(c.z for c in corners))
+
+        # order corners by angle around center direction
+        c0 = corners[0]
+        u = c0 - (Vector3f.dot(c0, center) / Vector3f.dot(center, center)) * center
+        v = Vector3f.normal(center, u)
+        corners = sorted(corners, key=lambda c: math.atan2(Vector3f.dot(c, v), Vector3f.dot(c, u)))
+
+        # inward normals of side planes
+        self.normals: List[Vector3f] = []
+        for a, b in zip(corners, corners[1:] + corners[:1]):
+            normal = Vector3f.normal(a, b)
+            if Vector3f.dot(normal, center) < 0.0:
+                normal = -normal
+            self.normals.append(normal)
+
+        # plane through apex, side planes alone don't reject boxes reaching around it from behind
+        if all(Vector3f.dot(c, center) > 0.0 for c in corners):
+            self.normals.append(center.normalized())
+
+    def overlaps(self, bbox: BBox) -> bool:
+        """Check if box may overlap frustum (box is rejected only if it lies fully outside one of side planes)."""
+        ox, oy, oz = self.origin
+        lo, hi = bbox
+        for nx, ny, nz in self.normals:
+            # box corner farthest along plane normal
+            x = hi.x if nx > 0.0 else lo.x
+            y = hi.y if ny > 0.0 else lo.y
+            z = hi.z if nz > 0.0 else lo.z
+            if nx*(x - ox) + ny*(y - oy) + nz*(z - oz) < -EPS:
+                return False
+        return True
@@ -0,0 +1,191 @@
+from typing import Iterable, Optional, Sequence, Tuple
+
+from .bbox import INF
+from .scene import Scene
+from .solids.solid import Solid
+from .utils import Ray, Point3f, Vector3f
+from .intersection import Intersection, Hits
+
+# Objects touching cell boundaries are registered in both neighbouring cells
+EPS = 1e-6
+
+
+class UniformGrid:
+    """
+    Uniform voxel grid over solids, traversed with 3D-DDA (Amanatides & Woo).
+
+    Traversal stops in the first cell which confirms the closest hit, so for evenly spread scenes
+    (e.g. mazes) the cost per ray doesn't depend on scene size. Objects much bigger than typical one
+    (sky, ground planes) are kept outside of the grid and tested for every ray.
+    """
+    DENSITY = 2.0  # average number of cells per object
+    LARGE_OBJECT = 16.0  # objects bigger than LARGE_OBJECT * median object size are kept outside grid
+    MAX_RESOLUTION = 256
+
+    def __init__(self, objects: Sequence[Solid], resolution: Optional[Tuple[int, int, int]] = None):
+        items = [(obj, obj.bounds()) for obj in objects]
+
+        def size(bbox):
+            return max(bbox.max.x - bbox.min.x, bbox.max.y - bbox.min.y, bbox.max.z - bbox.min.z)
+
+        sizes = sorted(size(bbox) for _, bbox in items)
+        limit = self.LARGE_OBJECT * sizes[len(sizes) // 2] if sizes else INF
+
+        self._large = [obj for obj, bbox in items if size(bbox) > limit]
+        items = [(obj, bbox) for obj, bbox in items if size(bbox) <= limit]
+
+        if not items:
+            self._grid = []
+            self._bbox = None
+            return
+
+        bbox = items[0][1]
+        for _, b in items[1:]:
+            bbox = bbox.extend(b)
+        bbox = bbox.padded(EPS)
+        self._bbox = bbox
+
+        extent = (bbox.max.x - bbox.min.x, bbox.max.y - bbox.min.y, bbox.max.z - bbox.min.z)
+        if resolution is None:
+            volume = extent[0] * extent[1] * extent[2]
+            scale = (self.DENSITY * len(items) / volume) ** (1/3)
+            resolution = tuple(max(1, min(self.MAX_RESOLUTION, round(e * scale))) for e in extent)
+
+        self._size = resolution
+        self._cell = tuple(e / n for e, n in zip(extent, resolution))
+
+        nx, ny, nz = resolution
+        grid = [None] * (nx * ny * nz)
+        for obj, b in items:
+            x0, y0, z0 = self._cell_of(Point3f(b.min.x - EPS, b.min.y - EPS, b.min.z - EPS))
+            x1, y1, z1 = self._cell_of(Point3f(b.max.x + EPS, b.max.y + EPS, b.max.z + EPS))
+            for z in range(z0, z1 + 1):
+                for y in range(y0, y1 + 1):
+                    for x in range(x0, x1 + 1):
+                        idx = (z * ny + y) * nx + x
+                        if grid[idx] is None:
+                            grid[idx] = []
+                        grid[idx].append(obj)
+        self._grid = grid
+
+    def _cell_of(self, point: Point3f) -> Tuple[int, int, int]:
+        return tuple(
+            min(n - 1, max(0, int((p - lo) / c)))
+            for p, lo, c, n in zip(point, self._bbox.min, self._cell, self._size)
+        )
+
+    def intersect(self, r: Ray, previous_best: Optional[Intersection] = None, lower_bound: Optional[Intersection] = None, tmax: float = INF) -> Optional[Intersection]:
+        best = previous_best
+        t_best = best.distance if best is not None else tmax
+        t_lower = lower_bound.distance if lower_bound is not None else -INF
+
+        for obj in self._large:
+            intersection = obj.intersect(r, best)
+            if intersection is not None and t_lower < intersection.distance < t_best:
+                best = intersection
+                t_best = intersection.distance
+
+        if self._bbox is None:
+            return best
+
+        span = self._bbox.intersect(r, 0.0, t_best)
+        if span is None:
+            return best
+        t_enter, _ = span
+
+        grid = self._grid
+        nx, ny, nz = self._size
+        cell = [0, 0, 0]
+        step = [0, 0, 0]
+        t_max = [INF, INF, INF]
+        t_delta = [INF, INF, INF]
+
+        entry = r(t_enter)
+        index = self._cell_of(entry)
+        for axis in range(3):
+            d = r.d[axis]
+            cell[axis] = index[axis]
+            if d != 0.0:
+                size = self._cell[axis]
+                lo = self._bbox.min[axis]
+                if d > 0.0:
+                    step[axis] = 1
+                    t_max[axis] = (lo + (index[axis] + 1) * size - r.o[axis]) / d
+                else:
+                    step[axis] = -1
+                    t_max[axis] = (lo + index[axis] * size - r.o[axis]) / d
+                t_delta[axis] = size / abs(d)
+
+        x, y, z = cell
+        sx, sy, sz = step
+        tx, ty, tz = t_max
+        dtx, dty, dtz = t_delta
+        tested = set()
+
+        while True:
+            objects = grid[(z * ny + y) * nx + x]
+            if objects is not None:
+                for obj in objects:
+                    if id(obj) in tested:
+                        continue
+                    tested.add(id(obj))
+                    intersection = obj.intersect(r, best)
+                    if intersection is not None and t_lower < intersection.distance < t_best:
+                        best = intersection
+                        t_best = intersection.distance
+
+            # Step to the next cell, unless closest hit is already confirmed inside current one
+            if tx < ty:
+                if tx < tz:
+                    if t_best <= tx + EPS:
+                        break
+                    x += sx
+                    if not 0 <= x < nx:
+                        break
+                    tx += dtx
+                    continue
+            elif ty < tz:
+                if t_best <= ty + EPS:
+                    break
+                y += sy
+                if not 0 <= y < ny:
+                    break
+                ty += dty
+                continue
+
+            if t_best <= tz + EPS:
+                break
+            z += sz
+            if not 0 <= z < nz:
+                break
+            tz += dtz
+
+        return best
+
+    def intersect_many(self, origins: Sequence[float], directions: Sequence[float], lower: Optional[Sequence[float]] = None, tmax: float = INF) -> Hits:
+        # rays in packet take different paths through grid cells, so they are traversed one by one
+        hits = Hits.empty(len(directions) // 3, tmax)
+        for i in range(len(hits.solids)):
+            j = 3 * i
+            ray = Ray(Point3f(origins[j], origins[j+1], origins[j+2]), Vector3f(directions[j], directions[j+1], directions[j+2]))
+            bound = None
+            if lower is not None:
+                bound = Intersection(None, ray, lower[i], None, None)
+            intersection = self.intersect(ray, lower_bound=bound, tmax=tmax)
+            if intersection is not None:
+                hits.set(i, intersection)
+        return hits
+
+
+class GridScene(Scene):
+    """Solids collection organised in uniform voxel grid (see UniformGrid), alternative to BVH based Scene."""
+
+    def __init__(self, objects: Iterable[Solid] = (), *, resolution: Optional[Tuple[int, int, int]] = None):
+        self._resolution = resolution
+        super().__init__(objects)
+
+    def _subset(self, objects: Iterable[Solid]) -> 'GridScene':
+        return GridScene(objects, resolution=self._resolution)
+
+    def _build(self):
+        return UniformGrid(self._objects, self._resolution)
@@ -261,6 +261,11 @@ class Image(ImageLoader):
 
         return self._data[y * self._width + x]
 
+    def copy(self) -> 'Image':
+        out = Image(width=self.width, height=self.height)
+        out._data = list(self._data)
+        return out
+
     def crop(self, crop_to: Rect) -> 'Image':
         """
         Crop texture to given rectangle.
@@ -1,3 +1,3 @@
 from .integrator import Integrator
 from .casting import RayCastingIntegrator
-from .raytracer import RayTracingIntegrator
\ No newline at end of file
+from .raytracer import RayTracingIntegrator, Fog
\ No newline at end of file
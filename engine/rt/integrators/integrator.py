@@ -1,9 +1,14 @@
 from abc import ABC, abstractmethod
 from ..utils import Ray
+from ..intersection import INF
 
 class Integrator(ABC):
-    def __init__(self, world):
+    # Render distance, hits not closer than tmax (in ray parameter units) are ignored
+    tmax = INF
+
+    def __init__(self, world, *, tmax: float = INF):
         self.world = world
+        self.tmax = tmax
     
     @abstractmethod
     def get_radiance(self, ray: Ray):
@@ -1,20 +1,63 @@
 import math
-from typing import Optional
+from typing import NamedTuple, Optional
 
 from .integrator import Integrator
 from ..utils import Ray, Vector3f
 from ..image import Color4f
 from ..world import World
 from ..lights import Light, LightHit
-from ..intersection import Intersection
+from ..intersection import INF, Intersection
 
 EPS = 0.001
 MAX_DEPTH = 16
 
+
+class Fog(NamedTuple):
+    """Distance fog, colors of hits farther than start fade linearly into color, reached at tmax of integrator."""
+    color: Color4f
+    start: float = 0.0
+
+
 class RayTracingIntegrator(Integrator):
+    """
+    Integrator shading hits with emission of their materials, seeing through transparent texels.
+
+    With finite tmax, farther geometry is skipped by scene traversal and rays reaching tmax see background: black,
+    or color of fog (if given).
+    """
+
+    def __init__(self, world, *, tmax: float = INF, fog: Optional[Fog] = None):
+        super().__init__(world, tmax=tmax)
+        self.fog = fog
+
+    @property
+    def background(self) -> Color4f:
+        """Color of rays which don't hit anything closer than tmax."""
+        return self.fog.color if self.fog is not None else Color4f(0.0, 0.0, 0.0, 1.0)
+
     def get_radiance(self, ray: Ray, depth: int = 0, lower_bound: Optional[Intersection] = None) -> Color4f:
-        intersection = self.world.scene.intersect(ray, lower_bound=lower_bound)
+        intersection = self.world.scene.intersect(ray, lower_bound=lower_bound, tmax=self.tmax)
+        return self.get_hit_radiance(ray, intersection, depth)
+
+    def get_hit_radiance(self, ray: Ray, intersection: Optional[Intersection], depth: int = 0) -> Color4f:
+        """Compute radiance of ray with already found closest intersection (e.g. by packet tracing)."""
+        # colours of transparent layers, hits behind the first one are found in single scene traversal
+        layers = []
+        hits = None
+        while True:
+            color = self._get_emission(intersection, depth + len(layers))
+            if color.a >= 1.0:  # opaque texel, miss or too many layers
+                break
+            layers.append(color)
+            if hits is None:
+                hits = self.world.scene.iter_hits(ray, lower_bound=intersection, tmax=self.tmax)
+            intersection = next(hits, None)
+
+        for layer in reversed(layers):
+            color = layer.a*layer + (1.0 - layer.a)*color
+        return color
 
+    def _get_emission(self, intersection: Optional[Intersection], depth: int) -> Color4f:
         if intersection:
             if depth >= MAX_DEPTH:
                 return Color4f(1.0, 0.0, 0.0, 1.0)
@@ -24,12 +67,8 @@ class RayTracingIntegrator(Integrator):
                 texture_point = intersection.hit_point
 
             color = intersection.solid.material.get_emission(texture_point, intersection.normal, intersection.ray.d)
-            if color.a < 1.0:
-                # ray2 = Ray(ray(intersection.distance), ray.d)
-                # intersection2 = Intersection(intersection.solid, intersection.ray, 0, intersection.normal, intersection.local) 
-                other = self.get_radiance(ray, depth+1, lower_bound=intersection)
-                color = color.a*color + (1.0 - color.a)*other
-                # color = 0.8*color + 0.2*Color4f(0,0,0,1)
+            if self.fog is not None:
+                color = self.fogged(color, intersection.distance)
 
             # for light in self.world.lights:
             #     light_hit: LightHit = light.get_light_hit(intersection.hit_point)
@@ -49,4 +88,17 @@ class RayTracingIntegrator(Integrator):
 
             return color
         else:
-            return Color4f(0.0, 0.0, 0.0, 1.0)
+            return self.background
+
+    def fogged(self, color: Color4f, distance: float) -> Color4f:
+        """Color seen through fog from given distance (alpha is kept, so transparent layers stay transparent)."""
+        fog = self.fog
+        if distance <= fog.start:
+            return color
+        f = min(1.0, (distance - fog.start) / (self.tmax - fog.start))
+        return Color4f(
+            color.r + f * (fog.color.r - color.r),
+            color.g + f * (fog.color.g - color.g),
+            color.b + f * (fog.color.b - color.b),
+            color.a,
+        )
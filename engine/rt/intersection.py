@@ -1,10 +1,15 @@
-from typing import NamedTuple
-from .solids import Solid
+from array import array
+from typing import Iterable, Iterator, List, NamedTuple, Optional, TYPE_CHECKING
 from .utils import Ray, Vector3f, Point3f
 
+INF = float('inf')
+
+if TYPE_CHECKING:  # solids import Intersection themselves
+    from .solids import Solid
+
 
 class Intersection(NamedTuple):
-    solid: Solid
+    solid: 'Solid'
     ray: Ray
 
     # ray depended distance to intersection point
@@ -24,3 +29,45 @@ class Intersection(NamedTuple):
         if self.ray.d != other.ray.d or self.ray.o != other.ray.o:
             raise RuntimeError("Can't compare intersections of different rays")
         return self.distance < other.distance
+
+
+class Hits(NamedTuple):
+    """
+    Closest intersections of packet of rays, stored in flat arrays.
+
+    Missed rays have no solid and distance equal to tmax of the search (infinite by default). Local coordinates of i-th hit are (1 - u[i] - v[i], u[i], v[i]).
+    """
+    solids: List[Optional['Solid']]
+    distances: array
+    u: array
+    v: array
+
+    @classmethod
+    def empty(cls, count: int, tmax: float = INF) -> 'Hits':
+        return Hits([None] * count, array('d', [tmax]) * count, array('d', [0.0]) * count, array('d', [0.0]) * count)
+
+    def set(self, i: int, intersection: Intersection):
+        self.solids[i] = intersection.solid
+        self.distances[i] = intersection.distance
+        self.u[i] = intersection.local.y
+        self.v[i] = intersection.local.z
+
+    def intersection(self, i: int, ray: Ray) -> Optional[Intersection]:
+        """Build Intersection of i-th ray (given again as Ray instance)."""
+        solid = self.solids[i]
+        if solid is None:
+            return None
+        u, v = self.u[i], self.v[i]
+        return Intersection(solid, ray, self.distances[i], solid.normal, Point3f(1 - u - v, u, v))
+
+
+def distinct_hits(hits: Iterable[Intersection]) -> Iterator[Intersection]:
+    """
+    Skip intersections at the same distance as the previous one, like lower bound of Scene.intersect does
+    (hits have to be ordered front to back, the first one from equally distant is kept).
+    """
+    last = -INF
+    for intersection in hits:
+        if intersection.distance > last:
+            last = intersection.distance
+            yield intersection
@@ -7,8 +7,12 @@ class FlatMaterial(Material):
     def __init__(self, texture: Image):
         self.texture = texture
 
+    @property
+    def coverage(self):
+        return self.texture.coverage
+
     def get_reflectance(self, point: Point3f, normal: Vector3f, out_dir: Vector3f, in_dir: Vector3f) -> Color4f:
         return Color4f(0.0, 0.0, 0.0, 0.0)
 
     def get_emission(self, point: Point3f, normal: Vector3f, out_dir: Vector3f) -> Color4f:
-        return self.texture.get_color(point)
\ No newline at end of file
+        return self.texture.get_color(point)
@@ -12,3 +12,7 @@ class Material(ABC):
     def get_emission(self, point: Point3f, normal: Vector3f, out_dir: Vector3f) -> Color4f:
         pass
 
+    @property
+    def coverage(self):
+        """Fully transparent texels of material's texture (see Texture.coverage), None if there are none."""
+        return None
@@ -0,0 +1,186 @@
+import multiprocessing
+import os
+import sys
+import traceback
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Optional
+
+from .image import Image, Color4f
+from .cameras import Camera
+from .renderer import Renderer
+
+# Framebuffer layout: 4 doubles (r, g, b, a) per pixel, row major
+CHANNELS = 4
+
+
+def _worker(conn, index: int, count: int, integrator):
+    """Render every count-th scanline (starting from index) of requested frames into shared framebuffer."""
+    framebuffer = None
+
+    while True:
+        message = conn.recv()
+        command = message[0]
+
+        if command == 'stop':
+            break
+
+        try:
+            if command == 'scene':
+                integrator = message[1]
+            elif command == 'frame':
+                _, camera, width, height, name = message
+                if framebuffer is None or framebuffer.name != name:
+                    if framebuffer is not None:
+                        framebuffer.close()
+                    framebuffer = SharedMemory(name=name)
+                pixels = framebuffer.buf.cast('d')
+
+                renderer = Renderer(camera, integrator)
+                for y in range(index, height, count):
+                    row = array('d')
+                    for color in renderer.render_row(y, width, height):
+                        row.extend(color)
+                    pixels[CHANNELS * y * width: CHANNELS * (y+1) * width] = row
+                pixels.release()
+            conn.send(('done',))
+        except Exception:
+            conn.send(('error', traceback.format_exc()))
+
+    if framebuffer is not None:
+        framebuffer.close()
+    conn.close()
+
+
+class ParallelRenderer:
+    """
+    Renderer spreading frame scanlines across pool of persistent worker processes.
+
+    Workers receive integrator (with whole world) once at startup, and again only when scene version changes.
+    For every frame just the camera is send and workers write pixels directly into shared memory framebuffer.
+    Scanlines are interleaved between workers, so expensive parts of frame are evenly distributed.
+    """
+
+    def __init__(self, camera: Optional[Camera], integrator, *, workers: Optional[int] = None):
+        self.camera = camera
+        self.integrator = integrator
+        self._version = integrator.world.scene.version
+        self._framebuffer = None
+
+        # Workers have to share tracker with main process, otherwise their own trackers
+        # would unlink framebuffer (owned by main process) when they exit
+        resource_tracker.ensure_running()
+
+        count = workers or os.cpu_count() or 1
+        self._connections = []
+        self._processes = []
+        for index in range(count):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_worker, args=(child, index, count, integrator), daemon=True)
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _broadcast(self, message):
+        for conn in self._connections:
+            conn.send(message)
+
+        errors = []
+        for conn in self._connections:
+            response = conn.recv()
+            if response[0] == 'error':
+                errors.append(response[1])
+        if errors:
+            raise RuntimeError("Rendering worker failed:\n" + errors[0])
+
+    def render(self, texture: Image) -> None:
+        width, height = texture.width, texture.height
+        size = CHANNELS * 8 * width * height
+
+        if self._framebuffer is None or self._framebuffer.size < size:
+            self._release_framebuffer()
+            self._framebuffer = SharedMemory(create=True, size=size)
+
+        version = self.integrator.world.scene.version
+        if version != self._version:
+            self._broadcast(('scene', self.integrator))
+            self._version = version
+
+        self._broadcast(('frame', self.camera, width, height, self._framebuffer.name))
+
+        pixels = self._framebuffer.buf.cast('d')
+        offset = 0
+        for y in range(height):
+            for x in range(width):
+                texture[x, y] = Color4f(*pixels[offset:offset+CHANNELS])
+                offset += CHANNELS
+        pixels.release()
+
+    def _release_framebuffer(self):
+        if self._framebuffer is not None:
+            self._framebuffer.close()
+            self._framebuffer.unlink()
+            self._framebuffer = None
+
+    def close(self):
+        for conn in self._connections:
+            conn.send(('stop',))
+            conn.close()
+        for process in self._processes:
+            process.join()
+        self._connections, self._processes = [], []
+        self._release_framebuffer()
+
+
+def gil_enabled() -> bool:
+    """Check if interpreter runs with GIL (always true before free-threaded CPython 3.13t)."""
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return is_gil_enabled() if is_gil_enabled else True
+
+
+class ThreadedRenderer(Renderer):
+    """
+    Renderer spreading frame rows across pool of threads, sharing world with main thread.
+
+    It pays off only on free-threaded CPython, with GIL enabled frames are rendered serially.
+    Scenes are safe to read concurrently: solids list and acceleration structures are replaced as a whole on change.
+    """
+
+    def __init__(self, camera: Optional[Camera], integrator, *, threads: Optional[int] = None):
+        super().__init__(camera, integrator)
+        self.threads = threads or os.cpu_count() or 1
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def render(self, texture: Image) -> None:
+        if self.threads == 1 or gil_enabled():
+            return super().render(texture)
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix='renderer')
+
+        self.prepare()
+        width, height = texture.width, texture.height
+        rows = self._executor.map(lambda y: self.render_row(y, width, height), range(height))
+        for y, row in enumerate(rows):
+            for x, color in enumerate(row):
+                texture[x, y] = color
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
@@ -0,0 +1,185 @@
+import math
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from .solids.solid import Solid
+from .solids.quad import Quad
+from .utils import Point3f
+
+# Portals are clipped with this margin, so rounding never hides solids
+EPS = 1e-6
+
+Point2f = Tuple[float, float]
+Cell = Tuple[int, int]
+Segment = Tuple[Point2f, Point2f]
+
+
+def _cross(a: Point2f, b: Point2f, p: Point2f) -> float:
+    """Positive if p lies on the left of line from a to b."""
+    return (b[0] - a[0]) * (p[1] - a[1]) - (b[1] - a[1]) * (p[0] - a[0])
+
+
+def _clip(segment: Segment, a: Point2f, b: Point2f, sign: float) -> Optional[Segment]:
+    """Part of segment lying on the side of line from a to b given by sign (or None if there is no such part)."""
+    c, d = segment
+    fc, fd = sign * _cross(a, b, c) + EPS, sign * _cross(a, b, d) + EPS
+    if fc >= 0.0 and fd >= 0.0:
+        return segment
+    if fc < 0.0 and fd < 0.0:
+        return None
+    t = fc / (fc - fd)
+    p = (c[0] + t * (d[0] - c[0]), c[1] + t * (d[1] - c[1]))
+    return (c, p) if fc >= 0.0 else (p, d)
+
+
+def _separators(source: List[Point2f], portal: Segment) -> List[Tuple[Point2f, Point2f, float]]:
+    """
+    Half-planes bounding region seen from convex polygon source through portal (anti-penumbra).
+
+    Each separating line passes through a source vertex and a portal endpoint, with source and the other
+    endpoint on its opposite sides.
+    """
+    a, b = portal
+    center = (sum(v[0] for v in source) / len(source), sum(v[1] for v in source) / len(source))
+    planes = [(a, b, -1.0 if _cross(a, b, center) > 0.0 else 1.0)]  # beyond portal
+
+    for p, q in ((a, b), (b, a)):
+        for v in source:
+            if abs(v[0] - p[0]) + abs(v[1] - p[1]) < EPS:
+                continue
+            side = _cross(v, p, q)
+            sides = [_cross(v, p, w) for w in source]
+            if side > EPS and max(sides) <= EPS:
+                planes.append((v, p, 1.0))
+                break
+            if side < -EPS and min(sides) >= -EPS:
+                planes.append((v, p, -1.0))
+                break
+    return planes
+
+
+class PotentiallyVisibleSets:
+    """
+    Precomputed visibility of level built on unit grid (e.g. maze), which maps every grid cell to solids
+    potentially visible from any point inside of it.
+
+    Occluders have to be vertical quads covering whole edges of cells, sharing the same vertical range,
+    and level has to be closed from above and below (floor, ceiling) over that range - then visibility
+    between cells reduces to 2D. It is found by traversal of open edges (portals), each clipped to region
+    visible from source cell through previous portal, which is conservative: solid is hidden only if no
+    line from the source cell can reach it.
+
+    Only given occluders block sight, so solids whose look may change at runtime (e.g. doors, swapped
+    textures) shouldn't be passed as ones. Solids unknown during precompute (added later) are always visible.
+    """
+
+    def __init__(self, objects: Iterable[Solid], occluders: Iterable[Solid]):
+        objects = tuple(objects)
+        self._blocked: Set[Tuple[Cell, Cell]] = set()
+
+        x0 = z0 = math.inf
+        x1 = z1 = -math.inf
+        heights = set()
+        for solid in occluders:
+            (ax, ay, az), (bx, by, bz) = solid.bounds()
+            ix, iz = round(ax), round(az)
+            if not (isinstance(solid, Quad) and abs(ax - ix) < EPS and abs(az - iz) < EPS
+                    and ((abs(bx - ax) < EPS and abs(bz - az - 1.0) < EPS) or (abs(bz - az) < EPS and abs(bx - ax - 1.0) < EPS))):
+                raise ValueError('Occluder has to be vertical quad covering unit cell edge')
+
+            if abs(bx - ax) < EPS:  # wall along z axis, between cells (ix-1, iz) and (ix, iz)
+                self._blocked.add(((ix - 1, iz), (ix, iz)))
+                x0, x1, z0, z1 = min(x0, ix), max(x1, ix), min(z0, iz), max(z1, iz + 1)
+            else:
+                self._blocked.add(((ix, iz - 1), (ix, iz)))
+                x0, x1, z0, z1 = min(x0, ix), max(x1, ix + 1), min(z0, iz), max(z1, iz)
+            heights.add((round(ay, 6), round(by, 6)))
+
+        if len(heights) > 1:
+            raise ValueError('Occluders have to share the same vertical range')
+
+        if not self._blocked:
+            self.bounds = None
+            self._hidden: Dict[Cell, FrozenSet[Solid]] = {}
+            return
+
+        self.bounds = ((x0, z0), (x1, z1))
+        self.height = heights.pop()
+
+        # cells overlapped by solids' footprints, solids reaching out of grid are seen also through its exits
+        footprints = []
+        for solid in objects:
+            lo, hi = solid.bounds()
+            cells = [
+                (x, z)
+                for x in range(max(x0, math.floor(lo.x - EPS)), min(x1, math.floor(hi.x + EPS) + 1))
+                for z in range(max(z0, math.floor(lo.z - EPS)), min(z1, math.floor(hi.z + EPS) + 1))
+            ]
+            outside = lo.x < x0 - EPS or lo.z < z0 - EPS or hi.x > x1 + EPS or hi.z > z1 + EPS
+            footprints.append((solid, cells, outside))
+
+        self._hidden = {}
+        for x in range(x0, x1):
+            for z in range(z0, z1):
+                reached, exits = self._flow((x, z))
+                self._hidden[x, z] = frozenset(
+                    solid for solid, cells, outside in footprints
+                    if not (outside and exits) and not any(cell in reached for cell in cells)
+                )
+
+    def _is_open(self, cell: Cell, neighbour: Cell) -> bool:
+        return (cell, neighbour) not in self._blocked and (neighbour, cell) not in self._blocked
+
+    def _flow(self, source: Cell) -> Tuple[Set[Cell], bool]:
+        """Cells visible from source cell, and whether sight leaves the grid."""
+        (x0, z0), (x1, z1) = self.bounds
+        sx, sz = source
+        polygon = [(sx, sz), (sx + 1, sz), (sx + 1, sz + 1), (sx, sz + 1)]
+        reached = {source}
+        exits = False
+        visited = set()
+
+        stack = [(source, None, frozenset([source]))]
+        while stack:
+            cell, portal, path = stack.pop()
+            planes = _separators(polygon, portal) if portal is not None else []
+            x, z = cell
+            for neighbour, edge in (
+                ((x - 1, z), ((x, z), (x, z + 1))),
+                ((x + 1, z), ((x + 1, z), (x + 1, z + 1))),
+                ((x, z - 1), ((x, z), (x + 1, z))),
+                ((x, z + 1), ((x, z + 1), (x + 1, z + 1))),
+            ):
+                if neighbour in path or not self._is_open(cell, neighbour):
+                    continue
+
+                for a, b, sign in planes:
+                    edge = _clip(edge, a, b, sign)
+                    if edge is None:
+                        break
+                if edge is None:
+                    continue
+
+                nx, nz = neighbour
+                if not (x0 <= nx < x1 and z0 <= nz < z1):
+                    exits = True
+                    continue
+                reached.add(neighbour)
+
+                key = (neighbour, tuple(round(c, 6) for p in edge for c in p))
+                if key not in visited:
+                    visited.add(key)
+                    stack.append((neighbour, edge, path | {neighbour}))
+
+        return reached, exits
+
+    def hidden_from(self, point: Point3f) -> FrozenSet[Solid]:
+        """Solids which can't be seen from point (empty if point lies outside of grid cells)."""
+        if self.bounds is None:
+            return frozenset()
+        (x0, z0), (x1, z1) = self.bounds
+        if not (x0 <= point.x <= x1 and z0 <= point.z <= z1 and self.height[0] < point.y < self.height[1]):
+            return frozenset()
+
+        # point on boundary of cells is seen from both of them, cells are closed regions
+        cell = (min(x1 - 1, math.floor(point.x)), min(z1 - 1, math.floor(point.z)))
+        return self._hidden[cell]
@@ -0,0 +1,207 @@
+import math
+from array import array
+from typing import List, Optional, Tuple
+
+from .bbox import INF
+from .cameras import PerspectiveCamera
+from .coordmappers import TriangleMapper
+from .image import Image, Color4f
+from .integrators import RayTracingIntegrator
+from .integrators.raytracer import MAX_DEPTH
+from .intersection import Intersection
+from .renderer import Renderer
+from .solids import Quad, Sprite
+from .utils import Ray, Point3f, Vector3f
+
+Span = Tuple[int, int, int]  # row, first and last column
+
+
+class ScanlineRenderer(Renderer):
+    """
+    Renderer finding primary visibility by rasterisation of quads into depth and solid-ID buffers.
+
+    Quads are projected through PerspectiveCamera and drawn span by span. Inside of spans, depth and barycentric
+    coordinates of every pixel are computed from its primary ray exactly like in ray-quad test, which gives
+    perspective correct texture coordinates and frames identical to ray traced ones. Texels which aren't opaque
+    are handled with depth layers: next layer is drawn only for pixels still waiting for colour, behind previous one.
+
+    Pixels in which two solids are hit at exactly equal distance are traced with integrator, because such ties
+    are resolved by scene. Sprites are drawn as quads facing camera. Other cameras, solids and integrators fall back
+    to ray tracing.
+    """
+    MARGIN = 0.5  # pixels added around projected quads, covers rounding of ray directions
+    NEAR = 1e-6  # quads are clipped to this distance from camera plane, relative to forward vector
+
+    def render(self, texture: Image) -> None:
+        integrator = self.prepare()
+        camera = self.camera
+        scene = integrator.world.scene
+        if not isinstance(camera, PerspectiveCamera):
+            return super().render(texture)
+        # sprites are drawn as quads facing camera, the same ones rays hit
+        quads = [obj.facing(camera.center) if type(obj) is Sprite else obj for obj in scene.objects]
+        if not (type(integrator) is RayTracingIntegrator and all(type(obj) is Quad for obj in quads)):
+            return super().render(texture)
+
+        width, height = texture.width, texture.height
+        count = width * height
+        origins, directions = camera.get_primary_rays(width, height)
+        spans = [self._spans(quad, width, height) for quad in quads]
+
+        # colours of transparent layers in front of every pixel, pending pixels wait for the next layer
+        layers: List[List[Color4f]] = [[] for _ in range(count)]
+        pending = bytearray(b'\x01') * count
+        lower = None
+
+        for layer in range(MAX_DEPTH + 1):
+            depth, ids, tie, hit_u, hit_v = self._draw(quads, spans, directions, pending, lower, width, integrator.tmax)
+
+            for i in range(count):
+                if not pending[i]:
+                    continue
+                x, y = i % width, i // width
+                k = ids[i]
+
+                if tie[i]:
+                    pending[i] = 0
+                    j = 3 * i
+                    ray = Ray(Point3f(*origins[j:j+3]), Vector3f(*directions[j:j+3]))
+                    texture[x, y] = integrator.get_radiance(ray).trim()
+                    continue
+
+                if k < 0:
+                    color = integrator.background
+                elif layer >= MAX_DEPTH:
+                    color = Color4f(1.0, 0.0, 0.0, 1.0)
+                else:
+                    color = self._shade(quads[k], origins, directions, i, depth[i], hit_u[i], hit_v[i])
+                    if integrator.fog is not None:
+                        color = integrator.fogged(color, depth[i])
+                    if color.a < 1.0:
+                        layers[i].append(color)
+                        continue
+
+                pending[i] = 0
+                for front in reversed(layers[i]):
+                    color = front.a*front + (1.0 - front.a)*color
+                texture[x, y] = color.trim()
+
+            if not any(pending):
+                break
+            lower = depth
+
+    def _draw(self, quads, spans, directions, pending: bytearray, lower: Optional[array], width: int, tmax: float):
+        """Draw nearest hits of pending pixels farther than lower and closer than tmax into depth and solid-ID buffers."""
+        count = len(pending)
+        depth = array('d', [INF]) * count
+        ids = array('l', [-1]) * count
+        tie = bytearray(count)
+        hit_u, hit_v = array('d', [0.0]) * count, array('d', [0.0]) * count
+        ox, oy, oz = self.camera.center
+
+        for k, quad in enumerate(quads):
+            px, py, pz = quad.p0
+            ux, uy, uz = quad.v0
+            vx, vy, vz = quad.v1
+            nx, ny, nz = quad.normal
+            uu, uv, vv, denom = quad.uu, quad.uv, quad.vv, quad.denom
+            num = nx*(px - ox) + ny*(py - oy) + nz*(pz - oz)
+
+            for y, x0, x1 in spans[k]:
+                for i in range(y * width + x0, y * width + x1 + 1):
+                    if not pending[i]:
+                        continue
+                    # same arithmetic as ray-quad tests of scenes
+                    j = 3 * i
+                    dx, dy, dz = directions[j], directions[j+1], directions[j+2]
+                    dn = dx*nx + dy*ny + dz*nz
+                    if dn == 0.0:
+                        continue
+                    ti = num / dn
+                    if ti < 0 or ti >= tmax or ti > depth[i] or (lower is not None and ti <= lower[i]):
+                        continue
+
+                    wx, wy, wz = (ox + ti*dx) - px, (oy + ti*dy) - py, (oz + ti*dz) - pz
+                    wv = wx*vx + wy*vy + wz*vz
+                    wu = wx*ux + wy*uy + wz*uz
+                    s = (uv*wv-vv*wu)/denom
+                    t = (uv*wu-uu*wv)/denom
+
+                    if 0.0 <= s <= 1.0 and 0.0 <= t <= 1.0 and not quad.transparent_at(s, t):
+                        if ti == depth[i]:
+                            tie[i] = 1
+                            continue
+                        depth[i] = ti
+                        ids[i] = k
+                        tie[i] = 0
+                        hit_u[i] = s
+                        hit_v[i] = t
+
+        return depth, ids, tie, hit_u, hit_v
+
+    def _shade(self, quad: Quad, origins, directions, i: int, distance: float, s: float, t: float) -> Color4f:
+        j = 3 * i
+        d = Vector3f(*directions[j:j+3])
+        mapper = quad.coord_mapper
+        if type(mapper) is TriangleMapper:
+            # texture coordinates interpolated from barycentric ones, like in TriangleMapper.get_coords
+            a, p0, p1, p2 = 1 - s - t, mapper.p0, mapper.p1, mapper.p2
+            point = Point3f(
+                (p0.x * a + p1.x * s + p2.x * t),
+                (p0.y * a + p1.y * s + p2.y * t),
+                (p0.z * a + p1.z * s + p2.z * t),
+            )
+        else:
+            intersection = Intersection(quad, Ray(Point3f(*origins[j:j+3]), d), distance, quad.normal, Point3f(1 - s - t, s, t))
+            point = mapper.get_coords(intersection) if mapper else intersection.hit_point
+        return quad.material.get_emission(point, quad.normal, d)
+
+    def _spans(self, quad: Quad, width: int, height: int) -> List[Span]:
+        """Rows and columns of pixels which primary rays may hit quad."""
+        camera = self.camera
+        forward, fx, fy, center = camera.forward, camera.fx, camera.fy, camera.center
+        ff, xx, yy = Vector3f.dot(forward, forward), Vector3f.dot(fx, fx), Vector3f.dot(fy, fy)
+        sx, sy = 0.5 * (width - 1), 0.5 * (height - 1)
+        full = [(y, 0, width - 1) for y in range(height)]
+
+        p0, v0, v1 = quad.p0, quad.v0, quad.v1
+        corners = [p0 - center, (p0 + v0) - center, (p0 + v0 + v1) - center, (p0 + v1) - center]
+        depths = [Vector3f.dot(c, forward) / ff for c in corners]
+
+        if min(depths) < self.NEAR:
+            # part in front of NEAR is projected below, part behind it could be seen only if quad passes close to camera
+            if abs(Vector3f.dot(quad.normal, corners[0])) < 2.0 * self.NEAR * math.sqrt(ff + xx + yy):
+                return full
+            clipped = []
+            for (a, da), (b, db) in zip(zip(corners, depths), zip(corners[1:] + corners[:1], depths[1:] + depths[:1])):
+                if da >= self.NEAR:
+                    clipped.append((a, da))
+                if (da >= self.NEAR) != (db >= self.NEAR):
+                    f = (self.NEAR - da) / (db - da)
+                    clipped.append((a + f * (b - a), self.NEAR))
+            if not clipped:
+                return []
+        else:
+            clipped = list(zip(corners, depths))
+
+        points = [
+            ((Vector3f.dot(c, fx) / (xx * d) + 1.0) * sx, (Vector3f.dot(c, fy) / (yy * d) + 1.0) * sy)
+            for c, d in clipped
+        ]
+        margin = self.MARGIN
+        ys = [p[1] for p in points]
+        spans = []
+        for y in range(max(0, math.ceil(min(ys) - margin)), min(height - 1, math.floor(max(ys) + margin)) + 1):
+            # horizontal extent of polygon inside of band around row
+            lo, hi = y - margin, y + margin
+            xs = [px for px, py in points if lo <= py <= hi]
+            for (ax, ay), (bx, by) in zip(points, points[1:] + points[:1]):
+                for band in (lo, hi):
+                    if (ay - band) * (by - band) < 0.0:
+                        xs.append(ax + (band - ay) / (by - ay) * (bx - ax))
+            if not xs:
+                continue
+            x0, x1 = max(0, math.ceil(min(xs) - margin)), min(width - 1, math.floor(max(xs) + margin))
+            if x0 <= x1:
+                spans.append((y, x0, x1))
+        return spans
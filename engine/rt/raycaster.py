@@ -0,0 +1,424 @@
+import math
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .image import Image, Color4f
+from .cameras import PerspectiveCamera
+from .coordmappers import TriangleMapper
+from .materials import FlatMaterial
+from .solids import Quad, Sprite
+from .textures import ImageTexture
+from .utils import Point3f, Ray, Vector3f
+from .intersection import Intersection
+from .integrators.raytracer import MAX_DEPTH
+
+INF = float('inf')
+
+
+class Segment(NamedTuple):
+    """
+    Vertical quad seen from above: horizontal edge a + u*h raised from y0 by vy, with barycentric invariants (see
+    Quad.intersect, its edges are perpendicular).
+    """
+    quad: Quad
+    ax: float
+    az: float
+    hx: float
+    hz: float
+    y0: float
+    vy: float
+    swapped: bool  # vertical edge is quad.v1 (not quad.v0)
+    hh: float
+    denom: float
+
+
+class Plane(NamedTuple):
+    """Horizontal quad with precomputed barycentric invariants (see Quad.intersect)."""
+    quad: Quad
+    y: float
+    uu: float
+    uv: float
+    vv: float
+    denom: float
+
+
+class Texels(NamedTuple):
+    """
+    Image sampled by quad with nearest interpolation: texel at barycentric coordinates s, t of quad is the one nearest
+    to x0 + xs*s + xt*t, y0 + ys*s + yt*t (texture coordinates of TriangleMapper scaled to image size).
+    """
+    data: list
+    width: int
+    height: int
+    repeat: bool
+    x0: float
+    xs: float
+    xt: float
+    y0: float
+    ys: float
+    yt: float
+
+    @classmethod
+    def of(cls, quad: Quad) -> Optional['Texels']:
+        """Texels of quad with FlatMaterial of nearest sampled ImageTexture and TriangleMapper, None for other quads."""
+        material, mapper = quad.material, quad.coord_mapper
+        texture = material.texture if type(material) is FlatMaterial else None
+        if (type(texture) is not ImageTexture or type(mapper) is not TriangleMapper
+                or texture.interpolation != ImageTexture.INTERPOLATION_NEAREST
+                or texture.border_handling not in (ImageTexture.BORDER_CLAMP, ImageTexture.BORDER_REPEAT)):
+            return None
+        image = texture.image
+        w, h = image.width, image.height
+        p0, p1, p2 = mapper.p0, mapper.p1, mapper.p2
+        return cls(
+            image._data, w, h, texture.border_handling == ImageTexture.BORDER_REPEAT,
+            p0.x * w, (p1.x - p0.x) * w, (p2.x - p0.x) * w,
+            p0.y * h, (p1.y - p0.y) * h, (p2.y - p0.y) * h,
+        )
+
+    def get_color(self, x: float, y: float) -> Color4f:
+        """Texel nearest to texture coordinates x, y (in texels), with border handling of ImageTexture."""
+        x, y, w, h = round(x), round(y), self.width, self.height
+        if self.repeat:
+            x %= w
+            y %= h
+        else:
+            x = 0 if x < 0 else (w-1 if x >= w else x)
+            y = 0 if y < 0 else (h-1 if y >= h else y)
+        return self.data[y * w + x]
+
+
+class Span(NamedTuple):
+    """
+    Vertical quad crossed by 2D ray of screen column at distance t and barycentric coordinate u along its horizontal
+    edge: rays of the column hitting it at coordinate s along vertical edge see texel nearest to x0 + s*xs, y0 + s*ys
+    (if texels are known).
+    """
+    t: float
+    u: float
+    segment: Segment
+    texels: Optional[Texels]
+    x0: float
+    xs: float
+    y0: float
+    ys: float
+
+
+class ColumnRenderer:
+    """
+    Wolfenstein-style 2.5D renderer for scenes build from vertical and horizontal quads (e.g. dungeon levels).
+
+    Camera can't pitch, so every screen column corresponds to single 2D ray. Walls lying on unit grid
+    edges are found with 2D grid DDA, other vertical quads (and sprites) are intersected once per column
+    and horizontal quads (floor, ceiling, sky) once per pixel. Texture coordinates of vertical quad are linear
+    in height of hit along column, so texels of quads with FlatMaterial of nearest sampled ImageTexture are read
+    directly, other materials are shaded through their get_emission.
+
+    Render distance (tmax) and fog of RayTracingIntegrator are honoured like in `Renderer`, barycentric coordinates
+    of hits are computed like in Quad.intersect and pixels in which two quads are hit at exactly equal distance are
+    traced with integrator (such ties are resolved in order of scene traversal), so frames match `Renderer`, except
+    for rare texels whose coordinates fall at texel edge and are rounded the other way than in TriangleMapper.
+    """
+
+    def __init__(self, camera: PerspectiveCamera, integrator):
+        self.camera = camera
+        self.integrator = integrator
+        self._scene_key = None  # scene and its version, whose solids are classified
+
+    def _classify(self, scene):
+        """Sort solids of scene into grid walls, other vertical quads and horizontal planes, once per scene version."""
+        if self._scene_key == (scene, scene.version):
+            return
+        walls: Dict[tuple, List[Segment]] = {}
+        segments: List[Segment] = []
+        planes: List[Plane] = []
+        sprites: List[Sprite] = []
+
+        for obj in scene.objects:
+            if type(obj) is Sprite:
+                sprites.append(obj)  # faced towards camera in every frame
+                continue
+            if not isinstance(obj, Quad):
+                raise ValueError(f"ColumnRenderer doesn't support {type(obj).__name__} solids")
+            v0, v1 = obj.v0, obj.v1
+
+            if v0.y == 0.0 and v1.y == 0.0:
+                uu, uv, vv = Vector3f.dot(v0, v0), Vector3f.dot(v0, v1), Vector3f.dot(v1, v1)
+                planes.append(Plane(obj, obj.p0.y, uu, uv, vv, uv*uv-uu*vv))
+                continue
+
+            segment = self._segment(obj)
+            # Unit walls lying on grid edges are reached with DDA, the rest is tested in every column
+            x0, z0 = min(obj.p0.x, obj.p0.x + segment.hx), min(obj.p0.z, obj.p0.z + segment.hz)
+            if x0 == int(x0) and z0 == int(z0) and (abs(segment.hx), abs(segment.hz)) in {(1.0, 0.0), (0.0, 1.0)}:
+                key = ('x' if segment.hx else 'z', int(x0), int(z0))
+                walls.setdefault(key, []).append(segment)
+            else:
+                segments.append(segment)
+
+        self._scene_key = (scene, scene.version)
+        self.walls, self.segments, self.planes, self.sprites = walls, segments, planes, sprites
+        if walls:
+            self.walls_x = (min(x for _, x, _ in walls), max(x for _, x, _ in walls))
+            self.walls_z = (min(z for _, _, z in walls), max(z for _, _, z in walls))
+            self.walls_y = (
+                min(min(s.y0, s.y0 + s.vy) for edge in walls.values() for s in edge),
+                max(max(s.y0, s.y0 + s.vy) for edge in walls.values() for s in edge),
+            )
+
+    @staticmethod
+    def _segment(quad: Quad) -> Segment:
+        v0, v1 = quad.v0, quad.v1
+        if v0.x == 0.0 and v0.z == 0.0 and v1.y == 0.0:
+            vertical, horizontal, swapped = v0, v1, False
+        elif v1.x == 0.0 and v1.z == 0.0 and v0.y == 0.0:
+            vertical, horizontal, swapped = v1, v0, True
+        else:
+            raise ValueError(f"ColumnRenderer supports only vertical and horizontal quads, got {v0}, {v1}")
+        hh = Vector3f.dot(horizontal, horizontal)
+        return Segment(quad, quad.p0.x, quad.p0.z, horizontal.x, horizontal.z, quad.p0.y, vertical.y, swapped, hh, quad.denom)
+
+    @staticmethod
+    def _hit_segment(segment: Segment, ox: float, oz: float, dx: float, dz: float):
+        denom = dx * segment.hz - dz * segment.hx
+        if denom == 0.0:
+            return None
+        wx, wz = segment.ax - ox, segment.az - oz
+        t = (wx * segment.hz - wz * segment.hx) / denom
+        if t < 0.0:
+            return None
+        # coordinate along horizontal edge computed like in Quad.intersect, so quads meeting at edge are both hit
+        w = (ox + t * dx - segment.ax) * segment.hx + (oz + t * dz - segment.az) * segment.hz
+        u = -(segment.vy * segment.vy * w) / segment.denom
+        if not 0.0 <= u <= 1.0:
+            return None
+        return (t, u, segment)
+
+    def _walk_walls(self, ox: float, oz: float, dx: float, dz: float):
+        """Yield (distance, u, segment) of grid walls crossed by 2D ray, front to back."""
+        walls = self.walls
+        if not walls:
+            return
+        (min_x, max_x), (min_z, max_z) = self.walls_x, self.walls_z
+
+        cx, cz = math.floor(ox), math.floor(oz)
+        sx = 1 if dx > 0 else -1
+        sz = 1 if dz > 0 else -1
+        tx = ((cx + (sx > 0)) - ox) / dx if dx != 0.0 else INF
+        tz = ((cz + (sz > 0)) - oz) / dz if dz != 0.0 else INF
+        dtx = abs(1.0 / dx) if dx != 0.0 else INF
+        dtz = abs(1.0 / dz) if dz != 0.0 else INF
+
+        # All edges of cells on the way are tested (not just crossed ones), so walls meeting at corner passed by ray
+        # are found even if rounding of steps takes it through cell diagonal to theirs
+        tested = set()
+        while True:
+            edges = [key for key in (('x', cx, cz), ('x', cx, cz + 1), ('z', cx, cz), ('z', cx + 1, cz)) if key in walls and key not in tested]
+            if edges:
+                tested.update(edges)
+                hits = [self._hit_segment(segment, ox, oz, dx, dz) for key in edges for segment in walls[key]]
+                yield from sorted((hit for hit in hits if hit is not None), key=lambda hit: hit[0])
+
+            if tx < tz:
+                cx += sx
+                tx += dtx
+            else:
+                cz += sz
+                tz += dtz
+
+            # cells left of (or above) walls still have them on their right (or bottom) edge
+            if (sx < 0 and cx < min_x - 1) or (sx > 0 and cx > max_x) or (sz < 0 and cz < min_z - 1) or (sz > 0 and cz > max_z):
+                return
+
+    def render(self, texture: Image) -> None:
+        camera = self.camera
+        forward, fx, fy = camera.forward, camera.fx, camera.fy
+        if forward.y != 0.0 or fx.y != 0.0 or fy.x != 0.0 or fy.z != 0.0:
+            raise ValueError("ColumnRenderer requires camera without pitch and roll")
+
+        integrator = self.integrator
+        tmax, background = integrator.tmax, integrator.background
+        fogged = integrator.fogged if getattr(integrator, 'fog', None) is not None else None
+
+        self._classify(integrator.world.scene)
+        o = camera.center
+        segments = self.segments + [self._segment(sprite.facing(o)) for sprite in self.sprites]
+        ox, oy, oz = o
+        y_min, y_max = self.walls_y if self.walls else (INF, -INF)
+        # texels of quads, materials may be swapped without changing scene version, so they are read every frame
+        texels: Dict[Quad, Optional[Texels]] = {}
+
+        rows = []
+        for y in range(texture.height):
+            dy = (2.0 * y / (texture.height-1) - 1.0) * fy.y
+            planes = []
+            if dy != 0.0:
+                for plane in self.planes:
+                    t = (plane.y - oy) / dy
+                    if 0.0 <= t < tmax:
+                        planes.append((t, plane))
+                planes.sort(key=lambda item: item[0])
+            rows.append((dy, planes))
+
+        for x in range(texture.width):
+            rx = 2.0 * x / (texture.width-1) - 1.0
+            dx, dz = forward.x + rx * fx.x, forward.z + rx * fx.z
+
+            hits = [self._hit_segment(segment, ox, oz, dx, dz) for segment in segments]
+            hits = sorted((hit for hit in hits if hit is not None and hit[0] < tmax), key=lambda hit: hit[0])
+            spans = [self._span(hit, texels) for hit in hits]
+            walls: List[Span] = []
+            walker = (self._span(hit, texels) for hit in self._walk_walls(ox, oz, dx, dz))
+
+            for y, (dy, planes) in enumerate(rows):
+                layers = []
+                t_lower = -INF
+                while len(layers) <= MAX_DEPTH:
+                    hit = self._nearest(o, dx, dy, dz, t_lower, tmax, planes, spans, walls, walker, y_min, y_max, texels)
+                    if hit is None:
+                        layers.append(background)
+                        break
+                    if len(layers) == MAX_DEPTH:
+                        layers.append(Color4f(1.0, 0.0, 0.0, 1.0))
+                        break
+
+                    t, color = hit
+                    if color is None:
+                        # quads hit at exactly equal distance are ordered by scene traversal, so pixel is traced
+                        layers = [integrator.get_radiance(Ray(o, Vector3f(dx, dy, dz)))]
+                        break
+                    if fogged is not None:
+                        color = fogged(color, t)
+                    layers.append(color)
+                    if color.a >= 1.0:
+                        break
+                    t_lower = t
+
+                color = layers[-1]
+                for layer in reversed(layers[:-1]):
+                    color = layer.a*layer + (1.0 - layer.a)*color
+
+                texture[x, y] = color.trim()
+
+    @staticmethod
+    def _span(hit: Tuple[float, float, Segment], texels: Dict[Quad, Optional[Texels]]) -> Span:
+        """Span of vertical quad hit by 2D ray of column, with texture coordinates of the column."""
+        t, u, segment = hit
+        quad = segment.quad
+        if quad not in texels:
+            texels[quad] = Texels.of(quad)
+        tex = texels[quad]
+        if tex is None:
+            return Span(t, u, segment, None, 0.0, 0.0, 0.0, 0.0)
+        # texture coordinates at barycentric coordinates (s, u), or (u, s) if vertical edge is v1
+        xv, xh, yv, yh = (tex.xt, tex.xs, tex.yt, tex.ys) if segment.swapped else (tex.xs, tex.xt, tex.ys, tex.yt)
+        return Span(t, u, segment, tex, tex.x0 + xh*u, xv, tex.y0 + yh*u, yv)
+
+    def _nearest(self, o: Point3f, dx: float, dy: float, dz: float, t_lower: float, tmax: float, planes, spans, walls, walker, y_min, y_max, texels) -> Optional[Tuple[float, Optional[Color4f]]]:
+        """
+        Find distance and color of closest hit with distance greater than t_lower (and less than tmax). Color is None
+        if two quads are hit at exactly that distance (tie, resolved by scene).
+        """
+        oy = o.y
+        best, t_best, tied = None, tmax, False
+
+        for t, plane in planes:
+            if t <= t_lower:
+                continue
+            if t > t_best or (t == t_best and best is None):
+                break
+            color = self._hit_plane(o, dx, dy, dz, t, plane, texels)
+            if color is not None:
+                if t == t_best:
+                    tied = True
+                    break
+                best, t_best = color, t
+
+        for span in spans:
+            t = span.t
+            if t > t_best or (t == t_best and best is None):
+                break
+            if t > t_lower:
+                color = self._hit_vertical(o, dx, dy, dz, span)
+                if color is not None:
+                    if t == t_best:
+                        tied = True
+                        break
+                    best, t_best, tied = color, t, False
+
+        i = 0
+        while True:
+            if i == len(walls):
+                wall = next(walker, None)
+                if wall is None:
+                    break
+                walls.append(wall)
+            span = walls[i]
+            i += 1
+
+            t = span.t
+            if t > t_best or (t == t_best and best is None):
+                break
+            if t <= t_lower:
+                continue
+            h = oy + t * dy
+            if (dy > 0.0 and h > y_max) or (dy < 0.0 and h < y_min) or (dy == 0.0 and not y_min <= h <= y_max):
+                break
+            color = self._hit_vertical(o, dx, dy, dz, span)
+            if color is not None:
+                if t == t_best:
+                    tied = True
+                    break
+                best, t_best, tied = color, t, False
+
+        if best is None:
+            return None
+        return (t_best, None if tied else best)
+
+    def _hit_plane(self, o: Point3f, dx: float, dy: float, dz: float, t: float, plane: Plane, texels) -> Optional[Color4f]:
+        """Color of horizontal quad seen by ray at distance t of its plane, None if it passes beside quad or through hole."""
+        quad = plane.quad
+        wx, wy, wz = o.x + t * dx - quad.p0.x, o.y + t * dy - quad.p0.y, o.z + t * dz - quad.p0.z
+        u, v = quad.v0, quad.v1
+        wv = wx * v.x + wy * v.y + wz * v.z
+        wu = wx * u.x + wy * u.y + wz * u.z
+        s = (plane.uv*wv - plane.vv*wu) / plane.denom
+        r = (plane.uv*wu - plane.uu*wv) / plane.denom
+        if not (0.0 <= s <= 1.0 and 0.0 <= r <= 1.0):
+            return None
+        if quad not in texels:
+            texels[quad] = Texels.of(quad)
+        tex = texels[quad]
+        if tex is not None:
+            color = tex.get_color(tex.x0 + tex.xs*s + tex.xt*r, tex.y0 + tex.ys*s + tex.yt*r)
+            return color if color.a != 0.0 else None  # fully transparent texels are holes (see Quad.transparent_at)
+        if quad.transparent_at(s, r):
+            return None
+        return self._shade(Intersection(quad, Ray(o, Vector3f(dx, dy, dz)), t, quad.normal, Point3f(1 - s - r, s, r)))
+
+    def _hit_vertical(self, o: Point3f, dx: float, dy: float, dz: float, span: Span) -> Optional[Color4f]:
+        """Color of vertical quad of span seen by ray, None if its ray passes above, below or through hole."""
+        segment = span.segment
+        # coordinate along vertical edge computed like in Quad.intersect
+        s = -(segment.hh * ((o.y + span.t * dy - segment.y0) * segment.vy)) / segment.denom
+        if not 0.0 <= s <= 1.0:
+            return None
+        tex = span.texels
+        if tex is not None:
+            color = tex.get_color(span.x0 + s * span.xs, span.y0 + s * span.ys)
+            return color if color.a != 0.0 else None  # fully transparent texels are holes (see Quad.transparent_at)
+
+        u, quad = span.u, segment.quad
+        if segment.swapped:
+            s, u = u, s
+        if quad.transparent_at(s, u):
+            return None
+        return self._shade(Intersection(quad, Ray(o, Vector3f(dx, dy, dz)), span.t, quad.normal, Point3f(1 - s - u, s, u)))
+
+    @staticmethod
+    def _shade(intersection: Intersection) -> Color4f:
+        solid = intersection.solid
+        if solid.coord_mapper:
+            texture_point = solid.coord_mapper.get_coords(intersection)
+        else:
+            texture_point = intersection.hit_point
+        return solid.material.get_emission(texture_point, intersection.normal, intersection.ray.d)
@@ -1,16 +1,377 @@
-from .image import Image
-from .cameras import Camera
+import bisect
+import copy
+import math
+import threading
+from array import array
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+from .image import Image, Color4f
+from .cameras import Camera, PerspectiveCamera
+from .frustum import Frustum
+from .intersection import INF, Hits
+from .scene import Scene
+from .solids import Quad, Solid, Sprite
+from .utils import Ray, Point3f, Vector3f
+from .world import World
+
+def camera_key(camera: Camera, digits: int = 9) -> Tuple[float, ...]:
+    """
+    Hashable representation of camera: origins and directions of rays through three frame corners, rounded to given
+    decimal digits (so cameras of the same state reached through different float operations are equal).
+    """
+    rays = [camera.get_primary_ray(x, y) for x, y in [(-1.0, -1.0), (1.0, -1.0), (-1.0, 1.0)]]
+    return tuple(round(c, digits) for ray in rays for c in (*ray.o, *ray.d))
+
 
 class Renderer:
-    def __init__(self, camera: Camera, integrator):
+    """
+    Renders frame ray by ray with given integrator.
+
+    If integrator can shade already found hits (has get_hit_radiance), primary rays of every row are traced as single
+    packet with Scene.intersect_many, which lets scene reject whole groups of coherent rays at once.
+
+    Before each frame of PerspectiveCamera, scene is reduced to solids inside view frustum and specialised for camera
+    origin (see Scene.seen_from). Primary and transparency rays are traced against that view.
+    """
+
+    def __init__(self, camera: Camera, integrator, *, packets: bool = True):
         self.camera = camera
         self.integrator = integrator
+        self.packets = packets
+        self._frame = None
+
+    def close(self):
+        """Release resources held by renderer (worker pools, caches)."""
+
+    def _frame_key(self):
+        world = getattr(self.integrator, 'world', None)
+        return (self.camera, world and world.scene, world and world.scene.version)
+
+    def prepare(self):
+        """Per-frame setup, done by render() and by render_row() after change of camera or scene."""
+        integrator, camera = self.integrator, self.camera
+        world = getattr(integrator, 'world', None)
+
+        if isinstance(camera, PerspectiveCamera) and world is not None:
+            corners = [camera.get_primary_ray(x, y).d for x, y in [(-1.0, -1.0), (1.0, -1.0), (1.0, 1.0), (-1.0, 1.0)]]
+            integrator = copy.copy(integrator)
+            integrator.world = World(world.scene.seen_from(camera.center, corners), world.lights)
+
+        self._frame = (self._frame_key(), integrator)
+        return integrator
+
+    def _frame_integrator(self):
+        if self._frame is None or self._frame[0] != self._frame_key():
+            return self.prepare()
+        return self._frame[1]
 
     def render(self, texture: Image) -> None:
+        self.prepare()
         for y in range(texture.height):
-            for x in range(texture.width):
-                rx, ry = 2.0 * x / (texture.width-1) - 1.0, 2.0 * y / (texture.height-1) - 1.0
+            for x, color in enumerate(self.render_row(y, texture.width, texture.height)):
+                texture[x, y] = color
+
+    def render_row(self, y: int, width: int, height: int) -> List[Color4f]:
+        integrator = self._frame_integrator()
+        if self.packets and hasattr(integrator, 'get_hit_radiance'):
+            return self._render_packet(integrator, y, width, height)
+
+        row = []
+        for x in range(width):
+            rx, ry = 2.0 * x / (width-1) - 1.0, 2.0 * y / (height-1) - 1.0
+
+            ray = self.camera.get_primary_ray(rx, ry)
+            row.append(integrator.get_radiance(ray).trim())
+        return row
+
+    def _render_packet(self, integrator, y: int, width: int, height: int) -> List[Color4f]:
+        origins, directions = self.camera.get_primary_rays(width, height, rows=(y, ))
+        hits = integrator.world.scene.intersect_many(origins, directions, tmax=integrator.tmax)
+
+        row = []
+        for x in range(width):
+            j = 3 * x
+            ray = Ray(Point3f(*origins[j:j+3]), Vector3f(*directions[j:j+3]))
+            row.append(integrator.get_hit_radiance(ray, hits.intersection(x, ray)).trim())
+        return row
+
+
+class TiledRenderer(Renderer):
+    """
+    Renderer tracing primary rays of every screen tile (TILE x TILE pixels) only against solids covering it.
+
+    Before each frame, corners of solids from frame view are projected through PerspectiveCamera and solids are
+    binned into tiles overlapped by their projected bounds. Solids crossing camera plane can't be projected, they are
+    binned into tiles whose frustums overlap their bounds. Primary rays of every tile are traced as single packet
+    against plain list of its solids, ordered front to back by distance of their corners from camera plane, which
+    bounds distances of their hits, so solids behind the farthest hit found so far are skipped. Found hits are shaded
+    by integrator as usual.
+
+    Rays hitting another solid at exactly the same distance as the closest one are traced through scene, which
+    resolves such ties in order of its own traversal, so frames match Renderer.
+    """
+    TILE = 8
+    MARGIN = 0.5  # pixels added around projected bounds, covers rounding of ray directions
+    NEAR = 1e-9  # minimal distance of projected corner from camera plane, relative to forward vector
+    DEPTH_EPS = 1e-9  # relative slack of bounds of hit distances, covers rounding
+
+    def __init__(self, camera: Camera, integrator, *, packets: bool = True):
+        super().__init__(camera, integrator, packets=packets)
+        self._tiles = None
+        self._band = None  # rows of the last rendered row of tiles
+
+    def _tile_solids(self, integrator, width: int, height: int) -> List[List[Tuple[List[Solid], List[float]]]]:
+        key = (self._frame, width, height)
+        if self._tiles is None or self._tiles[0] != key:
+            self._tiles = (key, self._bin(integrator.world.scene, width, height))
+        return self._tiles[1]
+
+    def _bin(self, scene, width: int, height: int) -> List[List[Tuple[List[Solid], List[float]]]]:
+        """Solids of every tile, ordered front to back, and lower bounds of distances of their hits."""
+        camera, tile = self.camera, self.TILE
+        columns, rows = (width + tile - 1) // tile, (height + tile - 1) // tile
+        bins = [[[] for _ in range(columns)] for _ in range(rows)]
+        frustums = {}
+        near = {}  # distance of the nearest corner from camera plane, the same as distance along rays through it
+
+        forward, fx, fy, (cx, cy, cz) = camera.forward, camera.fx, camera.fy, camera.center
+        ff, xx, yy = Vector3f.dot(forward, forward), Vector3f.dot(fx, fx), Vector3f.dot(fy, fy)
+        sx, sy = 0.5 * (width - 1), 0.5 * (height - 1)
+
+        # solids hidden from camera (see Scene.visibility) may be kept in frame view, e.g. by FrozenScene
+        visibility = self.integrator.world.scene.visibility
+        hidden = visibility.hidden_from(camera.center) if visibility is not None else ()
+
+        for obj in scene.objects:
+            if obj in hidden:
+                continue
+            if type(obj) is Sprite:
+                obj = obj.facing(camera.center)  # the same quad primary rays hit
+            if isinstance(obj, Quad):
+                p0, v0, v1 = obj.p0, obj.v0, obj.v1
+                points = (p0, p0 + v0, p0 + v1, p0 + v0 + v1)
+            else:
+                lo, hi = obj.bounds()
+                points = [Point3f(x, y, z) for x in (lo.x, hi.x) for y in (lo.y, hi.y) for z in (lo.z, hi.z)]
+
+            xs, ys, depths = [], [], []
+            for x, y, z in points:
+                rx, ry, rz = x - cx, y - cy, z - cz
+                depth = (rx*forward.x + ry*forward.y + rz*forward.z) / ff
+                depths.append(depth)
+                if depth > self.NEAR:
+                    # pixel coordinates of ray direction forward + u*fx + v*fy through the point
+                    xs.append(((rx*fx.x + ry*fx.y + rz*fx.z) / (xx * depth) + 1.0) * sx)
+                    ys.append(((rx*fy.x + ry*fy.y + rz*fy.z) / (yy * depth) + 1.0) * sy)
+
+            if max(depths) < 0.0:
+                continue  # behind camera
+            near[obj] = max(0.0, min(depths)) * (1.0 - self.DEPTH_EPS)
+
+            if len(xs) == len(points):
+                x0, x1 = math.floor(min(xs) - self.MARGIN) // tile, math.floor(max(xs) + self.MARGIN) // tile
+                y0, y1 = math.floor(min(ys) - self.MARGIN) // tile, math.floor(max(ys) + self.MARGIN) // tile
+                for ty in range(max(0, y0), min(rows - 1, y1) + 1):
+                    for tx in range(max(0, x0), min(columns - 1, x1) + 1):
+                        bins[ty][tx].append(obj)
+                continue
+
+            bounds = obj.bounds()
+            for ty in range(rows):
+                for tx in range(columns):
+                    frustum = frustums.get((tx, ty))
+                    if frustum is None:
+                        frustum = frustums[tx, ty] = self._tile_frustum(tx, ty, width, height)
+                    if frustum.overlaps(bounds):
+                        bins[ty][tx].append(obj)
+
+        for row in bins:
+            for tx, solids in enumerate(row):
+                solids.sort(key=near.__getitem__)
+                row[tx] = (solids, [near[obj] for obj in solids])
+        return bins
+
+    def _tile_frustum(self, tx: int, ty: int, width: int, height: int) -> Frustum:
+        tile = self.TILE
+        xs = (tx * tile - self.MARGIN, min(width - 1, (tx + 1) * tile - 1) + self.MARGIN)
+        ys = (ty * tile - self.MARGIN, min(height - 1, (ty + 1) * tile - 1) + self.MARGIN)
+        corners = [
+            self.camera.get_primary_ray(2.0 * x / (width - 1) - 1.0, 2.0 * y / (height - 1) - 1.0).d
+            for x, y in ((xs[0], ys[0]), (xs[1], ys[0]), (xs[1], ys[1]), (xs[0], ys[1]))
+        ]
+        return Frustum(self.camera.center, corners)
+
+    def render_row(self, y: int, width: int, height: int) -> List[Color4f]:
+        integrator = self._frame_integrator()
+        if not (self.packets and hasattr(integrator, 'get_hit_radiance') and isinstance(self.camera, PerspectiveCamera)):
+            return super().render_row(y, width, height)
+
+        band = y // self.TILE
+        key = (self._frame, width, height, band)
+        if self._band is None or self._band[0] != key:
+            self._band = (key, self._render_band(integrator, band, width, height))
+        return self._band[1][y - band * self.TILE]
+
+    def _render_band(self, integrator, band: int, width: int, height: int) -> List[List[Color4f]]:
+        """Render rows of single row of tiles, primary rays of every tile are traced as single packet."""
+        tile = self.TILE
+        ys = range(band * tile, min(height, (band + 1) * tile))
+        origins, directions = self.camera.get_primary_rays(width, height, rows=ys)
+        rows = [[] for _ in ys]
+
+        for tx, (solids, nears) in enumerate(self._tile_solids(integrator, width, height)[band]):
+            x0, x1 = tx * tile, min(width, (tx + 1) * tile)
+            block = array('d')
+            for k in range(len(ys)):
+                block.extend(directions[3*(k*width + x0):3*(k*width + x1)])
+            count = len(block) // 3
+            hits = Hits.empty(count, integrator.tmax)
+            farthest = integrator.tmax
+            for obj, near in zip(solids, nears):
+                if near > farthest:
+                    break  # this and following solids are behind hits of all rays
+                obj.intersect_many(origins, block, range(count), hits)
+                farthest = max(hits.distances)
+            tied = self._ties(solids, nears, origins, block, hits)
+
+            for i in range(count):
+                j = 3 * i
+                ray = Ray(Point3f(*origins[j:j+3]), Vector3f(*block[j:j+3]))
+                if tied[i]:
+                    color = integrator.get_radiance(ray)
+                else:
+                    color = integrator.get_hit_radiance(ray, hits.intersection(i, ray))
+                rows[i // (x1 - x0)].append(color.trim())
+        return rows
+
+    @staticmethod
+    def _ties(solids: List[Solid], nears: List[float], origins: Sequence[float], directions: Sequence[float], hits: Hits) -> List[bool]:
+        """Check which rays hit another of solids at exactly the distance of their closest hit (found first)."""
+        count = len(hits.solids)
+        indices = [i for i in range(count) if hits.solids[i] is not None]
+        if not indices:
+            return [False] * count
+
+        # window accepting only hits at exactly that distance, found by other solid than the closest hit
+        window = Hits.empty(count)
+        lower = array('d', [INF]) * count
+        for i in indices:
+            distance = hits.distances[i]
+            window.distances[i] = math.nextafter(distance, INF)
+            lower[i] = math.nextafter(distance, -INF)
+        farthest = max(hits.distances[i] for i in indices)
+        hit_solids = hits.solids
+        for k in range(bisect.bisect_right(nears, farthest)):
+            solid = solids[k]
+            solid.intersect_many(origins, directions, [i for i in indices if hit_solids[i] is not solid], window, lower)
+        return [solid is not None for solid in window.solids]
+
+
+class CachingRenderer:
+    """
+    Wrapper of other renderer serving repeated frames from bounded LRU cache, without tracing any ray.
+
+    Frames are keyed by camera (see camera_key, rounded to QUANTUM digits) and frame size, and dropped after every
+    scene modification (Scene.add, remove or touch).
+
+    Frames of cameras likely needed soon can be rendered into cache in background thread (see prefetch), while
+    caller waits for input. Background rendering is stopped before every access to cache from caller's thread,
+    and checks for it between rows, so it delays frames requested meanwhile at most by single row.
+    """
+    QUANTUM = 9
+
+    def __init__(self, renderer, capacity: int = 64):
+        self.renderer = renderer
+        self.capacity = capacity
+        self._frames: 'OrderedDict[tuple, Image]' = OrderedDict()
+        self._scene_key = None
+        self._prefetching: Optional[Tuple[threading.Thread, threading.Event]] = None
+
+    @property
+    def camera(self) -> Camera:
+        return self.renderer.camera
+
+    @camera.setter
+    def camera(self, camera: Camera):
+        self.renderer.camera = camera
+
+    def close(self):
+        self.cancel()
+        self._frames.clear()
+        close = getattr(self.renderer, 'close', None)
+        if close is not None:
+            close()
+
+    def _key(self, camera: Camera, size: Tuple[int, int]) -> tuple:
+        return (camera_key(camera, self.QUANTUM), size)
+
+    @property
+    def scene(self) -> Scene:
+        renderer = self.renderer
+        return renderer.scene if hasattr(renderer, 'scene') else renderer.integrator.world.scene
+
+    def _check_scene(self):
+        scene = self.scene
+        if self._scene_key != (scene, scene.version):
+            self._frames.clear()
+            self._scene_key = (scene, scene.version)
+
+    def _store(self, key: tuple, frame: Image):
+        self._frames[key] = frame
+        if len(self._frames) > self.capacity:
+            self._frames.popitem(last=False)
+
+    def render(self, texture: Image) -> None:
+        self.cancel()
+        self._check_scene()
+
+        key = self._key(self.renderer.camera, texture.size)
+        frame = self._frames.get(key)
+        if frame is not None:
+            self._frames.move_to_end(key)
+            texture._data[:] = frame._data
+            return
+
+        self.renderer.render(texture)
+        self._store(key, texture.copy())
+
+    def prefetch(self, cameras: Sequence[Camera], width: int, height: int):
+        """
+        Start rendering frames of given cameras (in that order, skipping cached ones) in background thread.
+
+        Frames are rendered row by row with copy of wrapped renderer, so only renderers with render_row are supported
+        (others are ignored). Previous prefetch is cancelled.
+        """
+        self.cancel()
+        if not hasattr(self.renderer, 'render_row'):
+            return
+        self._check_scene()
+
+        cancelled = threading.Event()
+        thread = threading.Thread(target=self._prefetch, args=(list(cameras), width, height, cancelled), name='prefetch', daemon=True)
+        self._prefetching = (thread, cancelled)
+        thread.start()
+
+    def cancel(self):
+        """Stop background rendering started by prefetch (frames finished so far stay in cache)."""
+        if self._prefetching is not None:
+            thread, cancelled = self._prefetching
+            cancelled.set()
+            thread.join()
+            self._prefetching = None
+
+    def _prefetch(self, cameras: List[Camera], width: int, height: int, cancelled: threading.Event):
+        renderer = copy.copy(self.renderer)
+        for camera in cameras:
+            key = self._key(camera, (width, height))
+            if key in self._frames:
+                continue
 
-                ray = self.camera.get_primary_ray(rx, ry)
-                texture[x, y] = self.integrator.get_radiance(ray).trim()
-            
\ No newline at end of file
+            renderer.camera = camera
+            frame = Image(width=width, height=height)
+            for y in range(height):
+                if cancelled.is_set():
+                    return
+                for x, color in enumerate(renderer.render_row(y, width, height)):
+                    frame[x, y] = color
+            self._store(key, frame)
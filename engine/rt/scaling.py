@@ -0,0 +1,90 @@
+import time
+from typing import Optional, Sequence, Tuple
+
+from .cameras import Camera
+from .image import Image
+
+
+class ScalingRenderer:
+    """
+    Wrapper of other renderer holding render time of frames within budget by rendering them at lower resolution,
+    upscaled to requested size with nearest neighbour filtering.
+
+    Frames are rendered at full resolution, unless lower one is allowed for the next frame (dynamic, e.g. in the middle
+    of animation, so resolution is raised again when animation stops). Then the highest resolution whose predicted
+    render time fits in budget is used. Prediction is based on render time per pixel of recent frames (the slowest
+    one, decaying with every frame), so slow frames lower resolution at once and fast ones (e.g. served from cache)
+    raise it gradually. With fixed scale, all frames are rendered at that scale.
+
+    At scale s, frame of width w has (w-1)//s+1 columns, so for w-1 divisible by s their rays are every s-th ray of
+    full frame (e.g. 32x32 for 63x63).
+    """
+    SCALES = (1, 2, 3, 4)
+    DECAY = 0.8  # change of measured time per pixel between frames, if not exceeded
+
+    def __init__(self, renderer, budget: float, scale: Optional[int] = None):
+        self.renderer = renderer
+        self.budget = budget
+        self.scale = scale
+        self.dynamic = False  # whether next frame may be rendered at lower resolution
+        self.last_scale = 1  # scale of the last frame
+        self._cost = 0.0  # seconds per pixel
+
+    @property
+    def camera(self) -> Camera:
+        return self.renderer.camera
+
+    @camera.setter
+    def camera(self, camera: Camera):
+        self.renderer.camera = camera
+
+    def close(self):
+        close = getattr(self.renderer, 'close', None)
+        if close is not None:
+            close()
+
+    def prefetch(self, cameras: Sequence[Camera], width: int, height: int):
+        prefetch = getattr(self.renderer, 'prefetch', None)
+        if prefetch is not None:
+            prefetch(cameras, width, height)
+
+    def cancel(self):
+        cancel = getattr(self.renderer, 'cancel', None)
+        if cancel is not None:
+            cancel()
+
+    @staticmethod
+    def scaled_size(width: int, height: int, scale: int) -> Tuple[int, int]:
+        return ((width - 1) // scale + 1, (height - 1) // scale + 1)
+
+    def _choose_scale(self, width: int, height: int) -> int:
+        if self.scale is not None:
+            return self.scale
+        if not self.dynamic:
+            return 1
+        for scale in self.SCALES:
+            w, h = self.scaled_size(width, height, scale)
+            if self._cost * w * h <= self.budget:
+                return scale
+        return self.SCALES[-1]
+
+    def render(self, texture: Image) -> None:
+        width, height = texture.width, texture.height
+        scale = self.last_scale = self._choose_scale(width, height)
+        if scale == 1:
+            frame = texture
+        else:
+            w, h = self.scaled_size(width, height, scale)
+            frame = Image(width=w, height=h)
+
+        start = time.perf_counter()
+        self.renderer.render(frame)
+        self._cost = max((time.perf_counter() - start) / (frame.width * frame.height), self.DECAY * self._cost)
+
+        if frame is not texture:
+            fw, fh = frame.width, frame.height
+            # nearest pixels, ties are rounded up (round() would alternate)
+            xs = [int(x * (fw - 1) / (width - 1) + 0.5) if width > 1 else 0 for x in range(width)]
+            ys = [int(y * (fh - 1) / (height - 1) + 0.5) if height > 1 else 0 for y in range(height)]
+            data = frame._data
+            texture._data[:] = [data[fy * fw + fx] for fy in ys for fx in xs]
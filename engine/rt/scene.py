@@ -1,26 +1,182 @@
-from typing import Tuple, Optional
+import threading
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Optional, Sequence
 from .solids.solid import Solid
-from .utils import Ray
-from .intersection import Intersection
+from .utils import Ray, Point3f, Vector3f
+from .intersection import INF, Intersection, Hits, distinct_hits
+from .bvh import BVH
+from .frustum import Frustum
 
+if TYPE_CHECKING:
+    from .pvs import PotentiallyVisibleSets
 
 
-class Scene:
-    def __init__(self):
-        self._objects = []
+class LinearScene:
+    """
+    Simple solids collection, every ray is tested against every object.
+
+    Objects are stored in copy-on-write tuple, so scene can be modified while other threads are rendering it.
+    """
+
+    def __init__(self, objects: Iterable[Solid] = ()):
+        self._objects = tuple(objects)
+        self._version = 0
+        self._lock = threading.Lock()
+        # Precomputed visibility used to skip solids hidden from camera (see seen_from)
+        self.visibility: Optional['PotentiallyVisibleSets'] = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def objects(self):
+        return self._objects
+
+    @property
+    def version(self) -> int:
+        """Counter increased on every scene modification."""
+        return self._version
 
     def add(self, obj: Solid):
-        self._objects.append(obj)
+        with self._lock:
+            self._objects += (obj, )
+            self._version += 1
+            self._objects_changed()
+
+    def remove(self, obj: Solid):
+        with self._lock:
+            objects = list(self._objects)
+            objects.remove(obj)
+            self._objects = tuple(objects)
+            self._version += 1
+            self._objects_changed()
+
+    def _objects_changed(self):
+        pass
 
-    def intersect(self, r: Ray, previous_best: Optional[Intersection] = None, lower_bound: Optional[Intersection] = None) -> Optional[Intersection]:
+    def touch(self):
+        """Mark scene as modified after in-place change of its objects (e.g. swapped material texture)."""
+        with self._lock:
+            self._version += 1
+
+    def seen_from(self, origin: Point3f, corners: Sequence[Vector3f]) -> 'LinearScene':
+        """
+        Scene to use for rays starting at origin, with directions inside pyramid spanned by corners
+        (e.g. camera frame corners).
+
+        Returned snapshot contains only solids overlapping the pyramid (view frustum) and not hidden from origin
+        according to visibility.
+        """
+        frustum = Frustum(origin, corners)
+        hidden = self.visibility.hidden_from(origin) if self.visibility is not None else ()
+        return self._subset([obj for obj in self._objects if obj not in hidden and frustum.overlaps(obj.bounds())])
+
+    def _subset(self, objects: Iterable[Solid]) -> 'LinearScene':
+        return type(self)(objects)
+
+    def intersect(self, r: Ray, previous_best: Optional[Intersection] = None, lower_bound: Optional[Intersection] = None, tmax: float = INF) -> Optional[Intersection]:
+        """Closest intersection farther than lower_bound, closer than previous_best (if given) and tmax."""
         best = previous_best
 
         for obj in self._objects:
-            intersection = obj.intersect(r, best)
+            intersection = obj.intersect(r, best, tmax)
             if intersection and (lower_bound is None or lower_bound < intersection) and (best is None or intersection < best):
                 best = intersection
 
         return best
 
+    def iter_hits(self, r: Ray, lower_bound: Optional[Intersection] = None, tmax: float = INF) -> Iterator[Intersection]:
+        """
+        Intersections farther than lower_bound and closer than tmax ordered front to back, found in single pass over scene.
+
+        Yields the same hits as repeated intersect calls, each with previous hit as lower bound (so from equally
+        distant hits only the one intersect prefers is reported). Consumers may stop at any hit, e.g. opaque one.
+        """
+        hits = []
+        for obj in self._objects:
+            intersection = obj.intersect(r, None, tmax)
+            if intersection and (lower_bound is None or lower_bound < intersection):
+                hits.append(intersection)
+        hits.sort(key=lambda intersection: intersection.distance)  # stable, earlier objects win ties
+        return distinct_hits(hits)
+
+    def intersect_all(self, r: Ray, lower_bound: Optional[Intersection] = None, tmax: float = INF) -> List[Intersection]:
+        """All intersections farther than lower_bound and closer than tmax, front to back (see iter_hits)."""
+        return list(self.iter_hits(r, lower_bound, tmax))
+
+    def intersect_many(self, origins: Sequence[float], directions: Sequence[float], lower: Optional[Sequence[float]] = None, tmax: float = INF) -> Hits:
+        """
+        Find closest hits of packet of rays given as flat xyz arrays of origins and directions.
+
+        If lower is given, only hits farther than lower[i] are reported for i-th ray. Hits not closer than tmax
+        are ignored.
+        """
+        hits = Hits.empty(len(directions) // 3, tmax)
+        indices = range(len(hits.solids))
+        for obj in self._objects:
+            obj.intersect_many(origins, directions, indices, hits, lower)
+        return hits
+
+
+class Scene(LinearScene):
+    """
+    Solids collection accelerated with bounding volume hierarchy, rebuild lazily after each modification.
+
+    Built structure is immutable and replaced as a whole, so concurrent readers always see consistent snapshot.
+    """
+
+    def __init__(self, objects: Iterable[Solid] = ()):
+        super().__init__(objects)
+        self._accelerator = None
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state['_accelerator'] = None  # cheaper to rebuild than to transfer
+        return state
+
+    def _build(self):
+        return BVH(self._objects)
+
+    def _objects_changed(self):
+        self._accelerator = None
+
+    def seen_from(self, origin: Point3f, corners: Sequence[Vector3f]) -> 'Scene':
+        # Hierarchy already skips solids far from rays, rebuilding it for every frame pays off only if
+        # precomputed visibility leaves small part of scene
+        if self.visibility is not None and self.visibility.hidden_from(origin):
+            return super().seen_from(origin, corners)
+        return self
+
+    def _get_accelerator(self):
+        accelerator = self._accelerator
+        if accelerator is None:
+            with self._lock:
+                if self._accelerator is None:
+                    self._accelerator = self._build()
+                accelerator = self._accelerator
+        return accelerator
+
+    def intersect(self, r: Ray, previous_best: Optional[Intersection] = None, lower_bound: Optional[Intersection] = None, tmax: float = INF) -> Optional[Intersection]:
+        return self._get_accelerator().intersect(r, previous_best, lower_bound, tmax)
+
+    def iter_hits(self, r: Ray, lower_bound: Optional[Intersection] = None, tmax: float = INF) -> Iterator[Intersection]:
+        accelerator = self._get_accelerator()
+        if hasattr(accelerator, 'iter_hits'):
+            return accelerator.iter_hits(r, lower_bound, tmax)
+        return self._iter_intersect(accelerator, r, lower_bound, tmax)
 
+    @staticmethod
+    def _iter_intersect(accelerator, r: Ray, lower_bound: Optional[Intersection], tmax: float) -> Iterator[Intersection]:
+        # accelerators without ordered traversal are restarted after every hit
+        intersection = accelerator.intersect(r, lower_bound=lower_bound, tmax=tmax)
+        while intersection is not None:
+            yield intersection
+            intersection = accelerator.intersect(r, lower_bound=intersection, tmax=tmax)
 
+    def intersect_many(self, origins: Sequence[float], directions: Sequence[float], lower: Optional[Sequence[float]] = None, tmax: float = INF) -> Hits:
+        return self._get_accelerator().intersect_many(origins, directions, lower, tmax)
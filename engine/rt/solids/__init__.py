@@ -1,3 +1,4 @@
 from .solid import Solid
 from .triangle import Triangle
-from .quad import Quad
\ No newline at end of file
+from .quad import Quad
+from .sprite import Sprite
\ No newline at end of file
@@ -2,9 +2,10 @@ from typing import NamedTuple, Optional
 
 from .solid import Solid
 from ..utils import Vector3f, Point3f, Ray
-from ..intersection import Intersection
+from ..intersection import INF, Intersection
+from ..bbox import BBox
 from ..materials import Material
-from ..coordmappers import CoordMapper
+from ..coordmappers import CoordMapper, TriangleMapper
 # from ..coordmappers import CoordMapper
 
 
@@ -14,32 +15,53 @@ class Quad(Solid):
         self.v0 = v0
         self.v1 = v1
         self.normal = Vector3f.normal(v0, v1)
+
+        # barycentric coordinates invariants, independent of ray
+        self.uu = Vector3f.dot(v0, v0)
+        self.uv = Vector3f.dot(v0, v1)
+        self.vv = Vector3f.dot(v1, v1)
+        self.denom = self.uv*self.uv - self.uu*self.vv
         self.material = material
         self.coord_mapper = coord_mapper
 
+    def bounds(self) -> BBox:
+        return BBox.from_points(self.p0, self.p0 + self.v0, self.p0 + self.v1, self.p0 + self.v0 + self.v1)
+
+    def transparent_at(self, s: float, t: float) -> bool:
+        """
+        Check if quad is fully transparent at point with barycentric coordinates s, t (see Texture.coverage).
+
+        Hits at such points are skipped by intersection tests, as if there was a hole in quad. Material is read
+        on every call, so swapped textures are respected.
+        """
+        coverage = self.material.coverage if self.material is not None else None
+        mapper = self.coord_mapper
+        if coverage is None or type(mapper) is not TriangleMapper:
+            return False
+        # texture coordinates interpolated like in TriangleMapper.get_coords
+        a, p0, p1, p2 = 1 - s - t, mapper.p0, mapper.p1, mapper.p2
+        return coverage.transparent_at(p0.x * a + p1.x * s + p2.x * t, p0.y * a + p1.y * s + p2.y * t)
 
-    def intersect(self, ray: Ray, previous_best: Optional[Intersection] = None) -> Optional[Intersection]:
+    def intersect(self, ray: Ray, previous_best: Optional[Intersection] = None, tmax: float = INF) -> Optional[Intersection]:
         try:
             ti = Vector3f.dot(self.normal, self.p0 - ray.o) / Vector3f.dot(ray.d, self.normal)
         except ZeroDivisionError:
             return None
 
-        if ti < 0 or (previous_best is not None and (ti > previous_best.distance or (ti == previous_best.distance and id(previous_best.solid) >= id(self)))):
+        if ti < 0 or ti >= tmax or (previous_best is not None and (ti > previous_best.distance or (ti == previous_best.distance and id(previous_best.solid) >= id(self)))):
             return None
 
         # compute barycentric coordinates
         u, v, w = self.v0, self.v1, ray(ti) - self.p0
 
-        uv = Vector3f.dot(u, v)
+        uv, vv, uu, denom = self.uv, self.vv, self.uu, self.denom
         wv = Vector3f.dot(w, v)
-        vv = Vector3f.dot(v, v)
         wu = Vector3f.dot(w, u)
-        uu = Vector3f.dot(u, u)
 
-        s = (uv*wv-vv*wu)/(uv*uv-uu*vv)
-        t = (uv*wu-uu*wv)/(uv*uv-uu*vv)
+        s = (uv*wv-vv*wu)/denom
+        t = (uv*wu-uu*wv)/denom
 
-        if 0.0 <= s <= 1.0 and 0.0 <= t <= 1.0:
+        if 0.0 <= s <= 1.0 and 0.0 <= t <= 1.0 and not self.transparent_at(s, t):
             return Intersection(
                 solid=self,
                 ray=ray,
@@ -49,3 +71,38 @@ class Quad(Solid):
             )
 
         return None
+
+    def intersect_many(self, origins, directions, indices, hits, lower=None):
+        # Same arithmetic as in intersect(), but without allocating vectors and intersections for every ray
+        nx, ny, nz = self.normal
+        px, py, pz = self.p0
+        ux, uy, uz = self.v0
+        vx, vy, vz = self.v1
+
+        uv, vv, uu, denom = self.uv, self.vv, self.uu, self.denom
+
+        distances, solids = hits.distances, hits.solids
+        for i in indices:
+            j = 3 * i
+            dx, dy, dz = directions[j], directions[j+1], directions[j+2]
+            dn = dx*nx + dy*ny + dz*nz
+            if dn == 0.0:
+                continue
+            ox, oy, oz = origins[j], origins[j+1], origins[j+2]
+            ti = (nx*(px - ox) + ny*(py - oy) + nz*(pz - oz)) / dn
+
+            if ti < 0 or ti >= distances[i] or (lower is not None and ti <= lower[i]):
+                continue
+
+            wx, wy, wz = (ox + ti*dx) - px, (oy + ti*dy) - py, (oz + ti*dz) - pz
+            wv = wx*vx + wy*vy + wz*vz
+            wu = wx*ux + wy*uy + wz*uz
+
+            s = (uv*wv-vv*wu)/denom
+            t = (uv*wu-uu*wv)/denom
+
+            if 0.0 <= s <= 1.0 and 0.0 <= t <= 1.0 and not self.transparent_at(s, t):
+                solids[i] = self
+                distances[i] = ti
+                hits.u[i] = s
+                hits.v[i] = t
@@ -1,9 +1,28 @@
-from typing import Optional
+from typing import Optional, Sequence
 from abc import abstractmethod, ABC
-from ..utils import Ray
+from ..utils import Ray, Point3f, Vector3f
+from ..bbox import BBox, INF
 
 
 class Solid(ABC):
     @abstractmethod
-    def intersect(self, ray: Ray, previous_best: Optional[float] = None) -> Optional[float]:
-        pass
\ No newline at end of file
+    def intersect(self, ray: Ray, previous_best: Optional[float] = None, tmax: float = INF) -> Optional[float]:
+        """Intersection closer than previous_best (if given), hits not closer than tmax are ignored."""
+        pass
+
+    @abstractmethod
+    def bounds(self) -> BBox:
+        pass
+
+    def intersect_many(self, origins: Sequence[float], directions: Sequence[float], indices: Sequence[int], hits, lower: Optional[Sequence[float]] = None):
+        """
+        Intersect packet of rays (given as flat xyz arrays) with solid, updating closest hits of selected rays.
+
+        Only hits farther than lower[i] (if given) and closer than hits.distances[i] are accepted.
+        """
+        for i in indices:
+            j = 3 * i
+            ray = Ray(Point3f(origins[j], origins[j+1], origins[j+2]), Vector3f(directions[j], directions[j+1], directions[j+2]))
+            intersection = self.intersect(ray)
+            if intersection is not None and intersection.distance < hits.distances[i] and (lower is None or lower[i] < intersection.distance):
+                hits.set(i, intersection)
@@ -0,0 +1,79 @@
+import math
+from typing import Optional, Sequence
+
+from .solid import Solid
+from .quad import Quad
+from ..utils import Vector3f, Point3f, Ray
+from ..intersection import INF, Intersection
+from ..bbox import BBox
+from ..materials import Material
+from ..coordmappers import CoordMapper
+
+
+class Sprite(Solid):
+    """
+    Billboard rotating around its axis (from p0 along v0) to always face origin of rays (e.g. camera center).
+
+    Seen from given point, sprite is the quad of given width centered on the axis and perpendicular to direction
+    towards it, with v0 as its first edge (see facing). Intersection costs single ray-quad test and reports
+    that quad (sharing material and coordinate mapper of sprite) as intersected solid, so hits are shaded
+    and skipped at transparent texels exactly like hits of quads.
+    """
+
+    def __init__(self, p0: Point3f, v0: Vector3f, width: float, *, material: Optional[Material] = None, coord_mapper: Optional[CoordMapper] = None):
+        self.p0 = p0
+        self.v0 = v0
+        self.width = width
+        self.material = material
+        self.coord_mapper = coord_mapper
+        self._facing = None  # (origin, quad) seen last, rays of frame share origin
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_facing'] = None
+        return state
+
+    def bounds(self) -> BBox:
+        # cylinder of sprite's half-width around the axis
+        v0, r = self.v0, 0.5 * self.width
+        length = v0.length
+        extent = Vector3f(*(r * math.sqrt(max(0.0, 1.0 - (c / length) ** 2)) for c in v0))
+        p1 = self.p0 + v0
+        return BBox.from_points(self.p0 + (-extent), self.p0 + extent, p1 + (-extent), p1 + extent)
+
+    def facing(self, origin: Point3f) -> Quad:
+        """Quad of sprite seen from origin."""
+        facing = self._facing
+        if facing is not None and facing[0] == origin:
+            return facing[1]
+
+        v0 = self.v0
+        d = self.p0 - origin
+        # component of direction towards axis perpendicular to it
+        h = d - (Vector3f.dot(d, v0) / Vector3f.dot(v0, v0)) * v0
+        tangent = Vector3f(v0.y * h.z - v0.z * h.y, v0.z * h.x - v0.x * h.z, v0.x * h.y - v0.y * h.x)
+        if tangent.length == 0.0:
+            # origin lies on the axis, any orientation is as good as other
+            tangent = Vector3f(v0.y, -v0.x, 0.0) if v0.x or v0.y else Vector3f(1.0, 0.0, 0.0)
+        v1 = (self.width / tangent.length) * tangent
+
+        quad = Quad(self.p0 + (-0.5 * v1), v0, v1, material=self.material, coord_mapper=self.coord_mapper)
+        self._facing = (origin, quad)
+        return quad
+
+    def intersect(self, ray: Ray, previous_best: Optional[Intersection] = None, tmax: float = INF) -> Optional[Intersection]:
+        return self.facing(ray.o).intersect(ray, previous_best, tmax)
+
+    def intersect_many(self, origins: Sequence[float], directions: Sequence[float], indices: Sequence[int], hits, lower: Optional[Sequence[float]] = None):
+        # consecutive rays with the same origin (e.g. whole packet of primary rays) are intersected with quad at once
+        quad, origin, run = None, None, []
+        for i in indices:
+            j = 3 * i
+            if quad is None or origins[j] != origin.x or origins[j+1] != origin.y or origins[j+2] != origin.z:
+                if run:
+                    quad.intersect_many(origins, directions, run, hits, lower)
+                origin = Point3f(origins[j], origins[j+1], origins[j+2])
+                quad, run = self.facing(origin), []
+            run.append(i)
+        if run:
+            quad.intersect_many(origins, directions, run, hits, lower)
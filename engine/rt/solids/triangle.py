@@ -1,5 +1,6 @@
 from .solid import Solid
 from ..utils import Vector3f, Point3f, Ray
+from ..bbox import BBox, INF
 from typing import NamedTuple, Optional
 
 
@@ -14,7 +15,10 @@ class Triangle(Solid):
     def from_points(self, p0: Point3f, p1: Point3f, p2: Point3f) -> 'Triangle':
         return Triangle(p0, p1 - p0, p2 - p0)
 
-    def intersect(self, ray: Ray, previous_best: Optional[float] = None) -> Optional[float]:
+    def bounds(self) -> BBox:
+        return BBox.from_points(self.p0, self.p0 + self.v0, self.p0 + self.v1)
+
+    def intersect(self, ray: Ray, previous_best: Optional[float] = None, tmax: float = INF) -> Optional[float]:
         raise NotImplementedError()
         ti = Vector3f.dot(self.normal, self.p0 - ray.o) / Vector3f.dot(ray.d, self.normal)
 
@@ -1,3 +1,3 @@
-from .texture import Texture
+from .texture import Texture, AlphaCoverage
 from .constant import ConstantTexture
 from .image import ImageTexture
\ No newline at end of file
@@ -1,6 +1,7 @@
 import math
+from typing import Optional
 
-from .texture import Texture
+from .texture import Texture, AlphaCoverage
 from ..image import Image, Color4f
 from ..utils import Point3f
 
@@ -27,6 +28,7 @@ class ImageTexture(Texture):
         self.image = image
         self.interpolation = interpolation
         self.border_handling = border_handling
+        self._coverage = None
 
 
     def _get_color(self, x: int, y: int) -> Color4f:
@@ -73,4 +75,21 @@ class ImageTexture(Texture):
         else:
             raise NotImplementedError()
 
-    
\ No newline at end of file
+    @property
+    def coverage(self) -> Optional[AlphaCoverage]:
+        """
+        Coverage of image sampled with nearest interpolation, None for images without fully transparent texels and
+        for other interpolations (their Color4f blends are always opaque).
+
+        Built on first use and after change of image or sampling, images are assumed not to change in place.
+        """
+        image, interpolation, border_handling = self.image, self.interpolation, self.border_handling
+        cached = self._coverage
+        if cached is None or cached[0] is not image or cached[1] != interpolation or cached[2] != border_handling:
+            coverage = None
+            if interpolation == self.INTERPOLATION_NEAREST and border_handling in (self.BORDER_CLAMP, self.BORDER_REPEAT):
+                opaque = bytearray(color.a != 0.0 for color in image._data)
+                if not all(opaque):
+                    coverage = AlphaCoverage(opaque, image.width, image.height, border_handling == self.BORDER_REPEAT)
+            cached = self._coverage = (image, interpolation, border_handling, coverage)
+        return cached[3]
@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from typing import Optional
 from ..utils import Point3f
 from ..image import Color4f
 
@@ -6,4 +7,36 @@ from ..image import Color4f
 class Texture(ABC):
     @abstractmethod
     def get_color(self, point: Point3f) -> Color4f:
-        pass
\ No newline at end of file
+        pass
+
+    @property
+    def coverage(self) -> Optional['AlphaCoverage']:
+        """Fully transparent texels of texture (None if get_color never returns such colors)."""
+        return None
+
+
+class AlphaCoverage:
+    """
+    Per-texel opaque bitmask of image sampled with nearest interpolation, which lets intersection tests skip
+    hits at fully transparent (alpha = 0) texels before any shading.
+
+    Texel is chosen exactly like ImageTexture.get_color does, outside of image it's clamped or repeated.
+    """
+
+    def __init__(self, opaque: bytearray, width: int, height: int, repeat: bool):
+        self.opaque = opaque
+        self.width = width
+        self.height = height
+        self.repeat = repeat
+
+    def transparent_at(self, x: float, y: float) -> bool:
+        """Check if texel at texture coordinates x, y is fully transparent."""
+        w, h = self.width, self.height
+        x, y = round(x * w), round(y * h)
+        if self.repeat:
+            x %= w
+            y %= h
+        else:
+            x = 0 if x < 0 else (w-1 if x >= w else x)
+            y = 0 if y < 0 else (h-1 if y >= h else y)
+        return not self.opaque[y*w + x]
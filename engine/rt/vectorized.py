@@ -0,0 +1,353 @@
+from typing import Dict, List, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, NumpyRenderer falls back to pure python Renderer without it
+    np = None
+
+from .image import Image, Color4f
+from .cameras import Camera, PerspectiveCamera
+from .frustum import Frustum
+from .renderer import Renderer
+from .solids import Quad, Sprite
+from .utils import Point3f, Ray, Vector3f
+from .intersection import Intersection
+from .coordmappers import TriangleMapper
+from .materials import FlatMaterial
+from .textures import ConstantTexture, ImageTexture
+from .integrators.raytracer import MAX_DEPTH
+
+INF = float('inf')
+
+# Maximal number of ray-quad pairs tested at once (bounds size of temporary arrays)
+CHUNK = 1 << 18
+
+
+class NumpyRenderer(Renderer):
+    """
+    Renderer tracing all rays of frame at once with NumPy array operations.
+
+    Quads are kept in structure-of-arrays layout, every ray is tested against every quad with broadcasting
+    and closest hits are resolved with argmin. Hits with flat materials are shaded in bulk, per texture.
+    Rays hitting two quads at exactly equal distance (e.g. floor at the bottom edge of wall) are traced
+    through scene afterwards, because such ties are resolved by order of scene traversal, not of objects.
+    Frames match `Renderer` with `RayTracingIntegrator`, which is used instead when NumPy is missing
+    or scene contains solids other than quads (and sprites, traced as quads facing camera).
+    """
+
+    def __init__(self, camera: Camera, integrator):
+        super().__init__(camera, integrator)
+        self._geometry_key = None
+        self._images: Dict[int, Tuple[Image, 'np.ndarray']] = {}
+
+    def render(self, texture: Image) -> None:
+        scene = self.integrator.world.scene
+        camera = self.camera
+        # sprites are traced as quads facing camera, the same ones rays hit
+        center = camera.center if isinstance(camera, PerspectiveCamera) else None
+        quads = tuple(obj.facing(center) if type(obj) is Sprite and center is not None else obj for obj in scene.objects)
+        if np is None or not all(isinstance(obj, Quad) for obj in quads):
+            return super().render(texture)
+
+        self._prepare(scene, quads)
+
+        width, height = texture.width, texture.height
+        origins, directions = self.camera.get_primary_rays(width, height)
+        self.origins = np.frombuffer(origins, dtype=np.float64).reshape(-1, 3)
+        self.directions = np.frombuffer(directions, dtype=np.float64).reshape(-1, 3)
+        self.shared_origin = bool((self.origins == self.origins[0]).all())
+
+        # view frustum and visibility culling, remaining quads can't be hit by any ray of frame
+        if isinstance(camera, PerspectiveCamera):
+            frustum = Frustum(camera.center, [camera.get_primary_ray(x, y).d for x, y in [(-1.0, -1.0), (1.0, -1.0), (1.0, 1.0), (-1.0, 1.0)]])
+            hidden = scene.visibility.hidden_from(camera.center) if scene.visibility is not None else ()
+            self.candidates = np.array([
+                k for k, (obj, bbox) in enumerate(zip(scene.objects, self.bounds))
+                if obj not in hidden and frustum.overlaps(bbox)
+            ], dtype=np.int64)
+        else:
+            self.candidates = np.arange(len(self.quads))
+
+        colors, tied = self._trace()
+        colors = colors.tolist()
+        if tied.any():
+            integrator = self.prepare()
+            for i in np.nonzero(tied)[0].tolist():
+                ray = Ray(Point3f(*self.origins[i].tolist()), Vector3f(*self.directions[i].tolist()))
+                colors[i] = integrator.get_radiance(ray).trim()
+        for y in range(height):
+            for x in range(width):
+                texture[x, y] = Color4f(*colors[y * width + x])
+
+    def _prepare(self, scene, quads):
+        """Convert scene quads into arrays, geometry is converted again only after scene modification (or turn of sprites)."""
+        if self._geometry_key != (scene.version, quads):
+            self._geometry_key = (scene.version, quads)
+            self.quads = quads
+
+            p0 = np.array([quad.p0 for quad in quads], dtype=np.float64).reshape(-1, 3)
+            v0 = np.array([quad.v0 for quad in quads], dtype=np.float64).reshape(-1, 3)
+            v1 = np.array([quad.v1 for quad in quads], dtype=np.float64).reshape(-1, 3)
+            normal = np.array([quad.normal for quad in quads], dtype=np.float64).reshape(-1, 3)
+
+            self.px, self.py, self.pz = p0.T
+            self.ux, self.uy, self.uz = v0.T
+            self.vx, self.vy, self.vz = v1.T
+            self.nx, self.ny, self.nz = normal.T
+            self.bounds = [quad.bounds() for quad in quads]
+
+            # barycentric invariants, computed like in Quad.intersect
+            self.uv = self.ux*self.vx + self.uy*self.vy + self.uz*self.vz
+            self.vv = self.vx*self.vx + self.vy*self.vy + self.vz*self.vz
+            self.uu = self.ux*self.ux + self.uy*self.uy + self.uz*self.uz
+            self.denom = self.uv*self.uv - self.uu*self.vv
+
+            # texture coordinates: x = mapper[:, 0:3] . local, y = mapper[:, 3:6] . local
+            self.mapper = np.array([
+                (m.p0.x, m.p1.x, m.p2.x, m.p0.y, m.p1.y, m.p2.y) if isinstance(m, TriangleMapper) else (0.0, ) * 6
+                for m in (quad.coord_mapper for quad in quads)
+            ], dtype=np.float64).reshape(-1, 6)
+
+        # Materials (and their textures) may be swapped without changing scene version, so they are read every frame
+        # Quads sharing texture (and kind of texture coordinates) are shaded together
+        self.textures: List[Tuple[object, bool]] = []
+        groups = {}
+        slots = []
+        for quad in self.quads:
+            material, mapper = quad.material, quad.coord_mapper
+            texture = material.texture if isinstance(material, FlatMaterial) else None
+            if not isinstance(texture, (ConstantTexture, ImageTexture)) or not (mapper is None or isinstance(mapper, TriangleMapper)):
+                slots.append(-1)  # shaded by python code
+                continue
+            key = (id(texture), mapper is None)
+            if key not in groups:
+                groups[key] = len(self.textures)
+                self.textures.append((texture, mapper is None))
+            slots.append(groups[key])
+        self.slots = np.array(slots, dtype=np.int64)
+
+        # quads with holes at fully transparent texels (see Quad.transparent_at), hits there are skipped
+        self.holed = np.array([
+            quad.material is not None and quad.material.coverage is not None and type(quad.coord_mapper) is TriangleMapper
+            for quad in self.quads
+        ], dtype=bool)
+
+    def _trace(self) -> Tuple['np.ndarray', 'np.ndarray']:
+        """Trace all primary rays, returning (count, 4) array of trimmed colors and mask of rays with ties (left to scene)."""
+        count = len(self.directions)
+        lower = np.full(count, -INF)
+        tied = np.zeros(count, dtype=bool)
+        remaining = np.arange(count)
+        # render distance and fog of integrator (see RayTracingIntegrator)
+        tmax, fog = self.integrator.tmax, getattr(self.integrator, 'fog', None)
+
+        # Every level of transparency is traced for all rays at once, then composited back to front
+        depths = np.zeros(count, dtype=np.int64)
+        layers = []
+        while remaining.size:
+            quads, distances, s, t, ties = self._closest(remaining, lower[remaining], tmax)
+            tied[remaining[ties]] = True
+            hit = quads >= 0
+            colors = np.empty((remaining.size, 4))
+            colors[~hit] = fog.color if fog is not None else (0.0, 0.0, 0.0, 1.0)
+            colors[hit] = self._shade(remaining[hit], quads[hit], distances[hit], s[hit], t[hit])
+            if fog is not None:
+                far = hit & (distances > fog.start)
+                f = np.minimum(1.0, (distances[far] - fog.start) / (tmax - fog.start))[:, None]
+                colors[far, :3] = colors[far, :3] + f * (np.array(fog.color[:3]) - colors[far, :3])
+
+            # hits at fully transparent texels aren't layers, tracing continues behind them
+            holes = hit & self.holed[np.maximum(quads, 0)] & (colors[:, 3] == 0.0)
+            layer = ~holes & ~ties
+            exhausted = hit & layer & (depths[remaining] >= MAX_DEPTH)
+            colors[exhausted] = (1.0, 0.0, 0.0, 1.0)
+            transparent = hit & layer & ~exhausted & (colors[:, 3] < 1.0)
+
+            layers.append((remaining[layer], colors[layer], transparent[layer]))
+            depths[remaining[transparent]] += 1
+            followed = (holes | transparent) & ~ties
+            lower[remaining[followed]] = distances[followed]
+            remaining = remaining[followed]
+
+        result = np.empty((count, 4))
+        for rays, colors, transparent in reversed(layers):
+            result[rays[~transparent]] = colors[~transparent]
+
+            rays, colors = rays[transparent], colors[transparent]
+            alpha = colors[:, 3:4]
+            result[rays, :3] = alpha*colors[:, :3] + (1.0 - alpha)*result[rays, :3]
+            result[rays, 3] = 1.0
+
+        return np.clip(result, 0.0, 1.0), tied
+
+    def _closest(self, rays: 'np.ndarray', lower: 'np.ndarray', tmax: float = INF):
+        """
+        Find closest quad hit farther than lower (and closer than tmax) for every ray, returns (quad index or -1,
+        distance, s, t) arrays and mask of rays hitting more than one quad at the closest distance.
+        """
+        count = rays.size
+        quads = np.full(count, -1, dtype=np.int64)
+        distances = np.full(count, INF)
+        s, t = np.zeros(count), np.zeros(count)
+        ties = np.zeros(count, dtype=bool)
+
+        candidates = self.candidates
+        n = candidates.size
+        if n == 0:
+            return quads, distances, s, t, ties
+        nx, ny, nz = self.nx[candidates], self.ny[candidates], self.nz[candidates]
+        px, py, pz = self.px[candidates], self.py[candidates], self.pz[candidates]
+
+        step = max(1, CHUNK // n)
+        for start in range(0, count, step):
+            chunk = slice(start, start + step)
+            idx = rays[chunk]
+
+            dx, dy, dz = (self.directions[idx, axis][:, None] for axis in range(3))
+            dn = dx*nx + dy*ny + dz*nz
+
+            if self.shared_origin:
+                ox, oy, oz = self.origins[0]
+            else:
+                ox, oy, oz = (self.origins[idx, axis][:, None] for axis in range(3))
+            num = nx*(px - ox) + ny*(py - oy) + nz*(pz - oz)
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ti = num / dn
+                valid = (dn != 0.0) & (ti >= 0.0) & (ti < tmax) & (ti > lower[chunk][:, None])
+
+                # quads which can't be hit by any ray of chunk (e.g. behind camera) are skipped
+                columns = np.nonzero(valid.any(axis=0))[0]
+                if columns.size == 0:
+                    continue
+                ti, valid = ti[:, columns], valid[:, columns]
+                columns = candidates[columns]
+                u, v = self._barycentric((ox, oy, oz), (dx, dy, dz), ti, columns)
+                valid &= (u >= 0.0) & (u <= 1.0) & (v >= 0.0) & (v <= 1.0)
+
+            best = np.where(valid, ti, INF)
+            closest = np.argmin(best, axis=1)
+            found = best[np.arange(idx.size), closest]
+            hit = found < INF
+            ties[chunk] = hit & ((best == found[:, None]).sum(axis=1) > 1)
+            closest = columns[closest]
+
+            quads[chunk] = np.where(hit, closest, -1)
+            distances[chunk] = found
+            o = self.origins[0] if self.shared_origin else self.origins[idx[hit]].T
+            s[chunk][hit], t[chunk][hit] = self._barycentric(o, self.directions[idx[hit]].T, found[hit], closest[hit])
+
+        return quads, distances, s, t, ties
+
+    def _barycentric(self, o, d, ti: 'np.ndarray', quads=slice(None)):
+        """Local coordinates of points o + ti*d on (selected) quads, with arithmetic of Quad.intersect."""
+        px, py, pz = self.px[quads], self.py[quads], self.pz[quads]
+        ux, uy, uz = self.ux[quads], self.uy[quads], self.uz[quads]
+        vx, vy, vz = self.vx[quads], self.vy[quads], self.vz[quads]
+
+        wx, wy, wz = ti*d[0], ti*d[1], ti*d[2]
+        wx += o[0]
+        wx -= px
+        wy += o[1]
+        wy -= py
+        wz += o[2]
+        wz -= pz
+        wv = wx*vx + wy*vy + wz*vz
+        wu = wx*ux + wy*uy + wz*uz
+
+        uv, vv, uu, denom = self.uv[quads], self.vv[quads], self.uu[quads], self.denom[quads]
+        s, t = uv*wv, uv*wu
+        s -= vv*wu
+        t -= uu*wv
+        s /= denom
+        t /= denom
+        return s, t
+
+    def _shade(self, rays: 'np.ndarray', quads: 'np.ndarray', distances: 'np.ndarray', s: 'np.ndarray', t: 'np.ndarray') -> 'np.ndarray':
+        """Emission of hit points, hits are grouped by texture and sampled at once."""
+        colors = np.empty((rays.size, 4))
+        slots = self.slots[quads]
+
+        for slot in np.unique(slots).tolist():
+            group = np.nonzero(slots == slot)[0]
+            if slot < 0:
+                for i in group.tolist():
+                    colors[i] = self._shade_python(int(rays[i]), int(quads[i]), float(distances[i]), float(s[i]), float(t[i]))
+                continue
+
+            texture, hit_point = self.textures[slot]
+            if isinstance(texture, ConstantTexture):
+                colors[group] = texture.color
+                continue
+
+            q, ss, tt = quads[group], s[group], t[group]
+            if hit_point:
+                # texture point is hit point
+                r = rays[group]
+                o = self.origins[0] if self.shared_origin else self.origins[r].T
+                d = self.directions[r].T
+                x, y = o[0] + distances[group]*d[0], o[1] + distances[group]*d[1]
+            else:
+                m = self.mapper[q].T
+                ll = 1 - ss - tt
+                x = m[0]*ll + m[1]*ss + m[2]*tt
+                y = m[3]*ll + m[4]*ss + m[5]*tt
+
+            colors[group] = self._sample(texture, x, y)
+
+        return colors
+
+    def _shade_python(self, ray: int, quad: int, distance: float, s: float, t: float) -> Color4f:
+        solid = self.quads[quad]
+        r = Ray(Point3f(*self.origins[ray].tolist()), Vector3f(*self.directions[ray].tolist()))
+        intersection = Intersection(solid, r, distance, solid.normal, Point3f(1 - s - t, s, t))
+
+        if solid.coord_mapper:
+            texture_point = solid.coord_mapper.get_coords(intersection)
+        else:
+            texture_point = intersection.hit_point
+        return solid.material.get_emission(texture_point, intersection.normal, intersection.ray.d)
+
+    def _pixels(self, image: Image) -> 'np.ndarray':
+        """Image pixels as (width * height, 4) array, images are assumed not to change after first use."""
+        cached = self._images.get(id(image))
+        if cached is None or cached[0] is not image:
+            cached = self._images[id(image)] = (image, np.array(image._data, dtype=np.float64).reshape(-1, 4))
+        return cached[1]
+
+    def _sample(self, texture: ImageTexture, x: 'np.ndarray', y: 'np.ndarray') -> 'np.ndarray':
+        """Vectorised ImageTexture.get_color."""
+        image = texture.image
+        w, h = image.size
+        pixels = self._pixels(image)
+        x, y = x * w, y * h
+
+        def lookup(xi, yi):
+            if texture.border_handling == ImageTexture.BORDER_CLAMP:
+                xi, yi = np.clip(xi, 0, w-1), np.clip(yi, 0, h-1)
+            elif texture.border_handling == ImageTexture.BORDER_REPEAT:
+                xi, yi = np.mod(xi, w), np.mod(yi, h)
+            else:
+                raise NotImplementedError()
+            return pixels[yi * w + xi]
+
+        if texture.interpolation == ImageTexture.INTERPOLATION_NEAREST:
+            return lookup(np.round(x).astype(np.int64), np.round(y).astype(np.int64))
+
+        fx, fy = np.floor(x), np.floor(y)
+        xi, yi = fx.astype(np.int64), fy.astype(np.int64)
+        c00, c10, c01, c11 = (lookup(xi + i, yi + j)[:, :3] for i, j in [(0, 0), (1, 0), (0, 1), (1, 1)])
+
+        colors = np.empty((x.size, 4))
+        colors[:, 3] = 1.0  # colors blended with Color4f arithmetic are opaque
+        if texture.interpolation == ImageTexture.INTERPOLATION_LINEAR:
+            sx, sy = (x - fx)[:, None], (y - fy)[:, None]
+            colors[:, :3] = (1.0 - sx)*(1.0 - sy)*c00 + sx*(1.0 - sy)*c10 + (1.0 - sx)*sy*c01 + sx*sy*c11
+        elif texture.interpolation == ImageTexture.INTERPOLATION_BILINEAR:
+            x, y, fx, fy = x[:, None], y[:, None], fx[:, None], fy[:, None]
+            v0 = (fx+1 - x)*c00 + (x - fx)*c10
+            v1 = (fx+1 - x)*c01 + (x - fx)*c11
+            colors[:, :3] = (fy+1 - y)*v0 + (y - fy)*v1
+        else:
+            raise NotImplementedError()
+        return colors
@@ -0,0 +1,345 @@
+import itertools
+import math
+
+import pytest
+
+from engine.rt.cameras import PerspectiveCamera
+from engine.rt.coordmappers import TriangleMapper
+from engine.rt.image import Image, Color4f
+from engine.rt.integrators import RayTracingIntegrator, Fog
+from engine.rt.materials import FlatMaterial
+from engine.rt import parallel, vectorized
+from engine.rt.parallel import ParallelRenderer, ThreadedRenderer
+from engine.rt.raycaster import ColumnRenderer
+from engine.rt.rasterizer import ScanlineRenderer
+from engine.rt.renderer import Renderer, TiledRenderer, CachingRenderer, camera_key
+from engine.rt.atlas import AtlasRenderer, FrameAtlas
+from engine.rt.adaptive import AdaptiveRenderer
+from engine.rt.scaling import ScalingRenderer
+from engine.rt.frozen import FrozenScene
+from engine.rt.scene import LinearScene, Scene
+from engine.rt.vectorized import NumpyRenderer
+from engine.rt.solids import Quad, Sprite
+from engine.rt.textures import ConstantTexture, ImageTexture
+from engine.rt.utils import Point3f, Vector3f
+from engine.rt.world import World
+
+LEVEL = """\
+#########
+#   d   #
+# ### # #
+#     # #
+#########\
+""".split("\n")
+
+
+def checker(width, height, transparent=False):
+    image = Image(width=width, height=height)
+    for y in range(height):
+        for x in range(width):
+            alpha = 0.0 if transparent and (x + y) % 2 else 1.0
+            image[x, y] = Color4f(x / width, y / height, 0.5, alpha)
+    return image
+
+
+def build_scene():
+    width, height = len(LEVEL[0])//2, len(LEVEL)//2
+    mapper = TriangleMapper(Point3f(1.0, 0.0, 0.0), Point3f(1.0, 1.0, 0.0), Point3f(0.0, 0.0, 0.0))
+    wall = FlatMaterial(ImageTexture(checker(4, 4)))
+    grate = FlatMaterial(ImageTexture(checker(4, 4, transparent=True)))
+
+    scene = Scene()
+    scene.add(Quad(Point3f(-50, -20, -50), Vector3f(100, 0, 0), Vector3f(0, 0, 100), material=FlatMaterial(ConstantTexture(Color4f(0.2, 0.3, 0.9)))))
+    scene.add(Quad(Point3f(-50, 0, -50), Vector3f(100, 0, 0), Vector3f(0, 0, 100), material=FlatMaterial(ImageTexture(checker(8, 8), border_handling=ImageTexture.BORDER_REPEAT)),
+                   coord_mapper=TriangleMapper(Point3f(0.0, 0.0, 0.0), Point3f(100, 0.0, 0.0), Point3f(0.0, 100, 0.0))))
+    scene.add(Quad(Point3f(0, -1, 0), Vector3f(width, 0, 0), Vector3f(0, 0, height), material=wall, coord_mapper=mapper))
+    scene.add(Quad(Point3f(1.2, -0.6, 1.3), Vector3f(0, 0.6, 0), Vector3f(0.4, 0, 0.3), material=grate, coord_mapper=mapper))
+    scene.add(Sprite(Point3f(2.6, -0.5, 1.8), Vector3f(0, 0.5, 0), 0.6, material=grate, coord_mapper=mapper))
+
+    for y in range(height+1):
+        for x in range(width):
+            c = LEVEL[2*y][2*x+1]
+            if c != ' ':
+                scene.add(Quad(Point3f(x, -1, y), Vector3f(0, 1, 0), Vector3f(1, 0, 0), material=grate if c == 'd' else wall, coord_mapper=mapper))
+    for y in range(height):
+        for x in range(width+1):
+            c = LEVEL[2*y+1][2*x]
+            if c != ' ':
+                scene.add(Quad(Point3f(x, -1, y), Vector3f(0, 1, 0), Vector3f(0, 0, 1), material=wall, coord_mapper=mapper))
+    return scene
+
+
+def cameras():
+    view_angle = 0.5 * math.pi
+    for x, y, z, ang in [(0.5, -0.47, 0.5, 0.5 * math.pi), (3.5, -0.53, 1.5, -0.5 * math.pi), (2.5, -0.7, 1.5, 0.3), (0.5, -0.45, 0.5, 0.0)]:
+        forward = Vector3f(math.sin(ang), 0, math.cos(ang))
+        yield PerspectiveCamera(Point3f(x, y, z) + (-0.25 * forward), forward, Vector3f(0, 1, 0), view_angle, view_angle)
+
+
+def render(renderer, size=15):
+    image = Image(width=size, height=size)
+    renderer.render(image)
+    return image
+
+
+def tie_scenes():
+    """Scenes of coplanar strips overlapping by half, every ray hits red and green one at the same distance."""
+    red, green = (FlatMaterial(ConstantTexture(color)) for color in (Color4f(1.0, 0.0, 0.0), Color4f(0.0, 1.0, 0.0)))
+    camera = PerspectiveCamera(Point3f(0.0, 0.0, 0.0), Vector3f(0, 0, 1), Vector3f(0, 1, 0), 0.5 * math.pi, 0.5 * math.pi)
+
+    for n, order, cls in itertools.product((2, 3), (1, -1), (Scene, FrozenScene)):
+        scene = Scene()
+        strips = [Quad(Point3f(-2 + (4*x + 2*offset) / n, -2, 1), Vector3f(4 / n, 0, 0), Vector3f(0, 4, 0), material=material)
+                  for offset, material in ((0, red), (1, green)) for x in range(n)]
+        for quad in strips[::order]:
+            scene.add(quad)
+        if cls is FrozenScene:
+            scene = FrozenScene(scene.objects)
+        yield camera, RayTracingIntegrator(World(scene, None))
+
+
+def test_column_renderer_matches_raytracer():
+    scene = build_scene()
+    integrator = RayTracingIntegrator(World(scene, None))
+
+    renderer = ColumnRenderer(None, integrator)
+    for camera in cameras():
+        renderer.camera = camera
+        expected = render(Renderer(camera, integrator))
+        assert render(renderer)._data == expected._data
+
+    # solids are classified again after change of scene
+    scene.add(Quad(Point3f(1, -1, 0), Vector3f(0, 1, 0), Vector3f(0, 0, 1), material=FlatMaterial(ConstantTexture(Color4f(0.9, 0.1, 0.1)))))
+    for camera in cameras():
+        renderer.camera = camera
+        expected = render(Renderer(camera, integrator))
+        assert render(renderer)._data == expected._data
+
+
+def test_frozen_scene_renders_like_scene():
+    scene = build_scene()
+    integrator = RayTracingIntegrator(World(scene, None))
+    frozen = RayTracingIntegrator(World(FrozenScene(scene.objects), None))
+
+    for camera in cameras():
+        expected = render(Renderer(camera, integrator))
+        assert render(Renderer(camera, frozen))._data == expected._data
+        assert render(Renderer(camera, frozen, packets=False))._data == expected._data
+
+
+def test_tiled_renderer_matches_renderer():
+    scene = build_scene()
+    linear = RayTracingIntegrator(World(LinearScene(scene.objects), None))
+    frozen = RayTracingIntegrator(World(FrozenScene(scene.objects), None))
+
+    for camera in cameras():
+        for integrator in (RayTracingIntegrator(World(scene, None)), linear, frozen):
+            expected = render(Renderer(camera, integrator), size=21)
+            assert render(TiledRenderer(camera, integrator), size=21)._data == expected._data
+
+    for camera, integrator in tie_scenes():
+        assert render(TiledRenderer(camera, integrator))._data == render(Renderer(camera, integrator))._data
+
+
+def test_adaptive_renderer_matches_renderer():
+    scene = build_scene()
+    # without distant planes, rays above walls hit nothing
+    for objects in (scene.objects, scene.objects[2:]):
+        integrator = RayTracingIntegrator(World(Scene(objects), None))
+        for camera in cameras():
+            renderer = AdaptiveRenderer(camera, integrator)
+            assert render(renderer, size=63)._data == render(Renderer(camera, integrator), size=63)._data
+            assert renderer.traced < 63 * 63 // 2
+
+
+def test_scanline_renderer_matches_renderer():
+    scene = build_scene()
+    frozen = FrozenScene(scene.objects)
+    # quad crossing camera plane close to camera
+    scene.add(Quad(Point3f(0.2, -0.9, 0.1), Vector3f(0, 0.3, 0), Vector3f(0.3, 0, 0.6), material=scene.objects[3].material))
+
+    for s in (scene, frozen):
+        integrator = RayTracingIntegrator(World(s, None))
+        for camera in cameras():
+            expected = render(Renderer(camera, integrator), size=21)
+            assert render(ScanlineRenderer(camera, integrator), size=21)._data == expected._data
+
+
+def test_render_distance_and_fog():
+    scene = build_scene()
+    fog = Fog(Color4f(0.7, 0.8, 0.9), start=1.0)
+    integrator = RayTracingIntegrator(World(scene, None), tmax=1.5, fog=fog)
+    frozen = RayTracingIntegrator(World(FrozenScene(scene.objects), None), tmax=1.5, fog=fog)
+
+    cutoff = False
+    for camera in cameras():
+        expected = render(Renderer(camera, integrator))
+        cutoff |= Color4f(0.7, 0.8, 0.9) in expected._data
+        assert render(Renderer(camera, integrator, packets=False))._data == expected._data
+        for renderer in (Renderer, TiledRenderer, ScanlineRenderer, NumpyRenderer):
+            assert render(renderer(camera, frozen))._data == expected._data
+        assert render(ColumnRenderer(camera, integrator))._data == expected._data
+    assert cutoff
+
+
+class CountingRenderer(Renderer):
+    frames = 0
+
+    def render(self, texture):
+        self.frames += 1
+        super().render(texture)
+
+
+def test_caching_renderer_reuses_frames():
+    scene = build_scene()
+    integrator = RayTracingIntegrator(World(scene, None))
+    first, second, *_ = cameras()
+    view_angle = 0.5 * math.pi
+    # the same view as first camera, reached after full turn
+    forward = Vector3f(math.sin(2.5 * math.pi), 0, math.cos(2.5 * math.pi))
+    turned = PerspectiveCamera(Point3f(0.5, -0.47, 0.5) + (-0.25 * forward), forward, Vector3f(0, 1, 0), view_angle, view_angle)
+
+    renderer = CachingRenderer(CountingRenderer(first, integrator), capacity=2)
+    expected = render(renderer)
+    renderer.camera = second
+    render(renderer)
+    renderer.camera = turned
+    assert render(renderer)._data == expected._data
+    assert renderer.renderer.frames == 2
+
+    scene.touch()
+    assert render(renderer)._data == expected._data
+    assert renderer.renderer.frames == 3
+
+
+def test_caching_renderer_prefetches_frames():
+    integrator = RayTracingIntegrator(World(build_scene(), None))
+    first, *others = cameras()
+
+    renderer = CachingRenderer(CountingRenderer(first, integrator))
+    render(renderer)
+    renderer.prefetch(others, 15, 15)
+    renderer._prefetching[0].join()
+    for camera in others:
+        renderer.camera = camera
+        assert render(renderer)._data == render(Renderer(camera, integrator))._data
+    assert renderer.renderer.frames == 1
+
+    # frames not finished before cancel are rendered on request
+    renderer.prefetch([first, *others], 21, 21)
+    renderer.cancel()
+    renderer.camera = first
+    assert render(renderer, size=21)._data == render(Renderer(first, integrator), size=21)._data
+
+
+def test_atlas_renderer_streams_baked_frames(tmp_path):
+    scene = build_scene()
+    integrator = RayTracingIntegrator(World(scene, None))
+    first, second, third, _ = cameras()
+
+    path = str(tmp_path / 'level.atlas')
+    FrameAtlas.write(path, 15, 15, [(camera_key(camera), FrameAtlas.encode(render(Renderer(camera, integrator)))) for camera in (first, second)], meta={'seed': 1})
+    atlas = FrameAtlas(path)
+    assert len(atlas) == 2 and atlas.size == (15, 15) and atlas.meta == {'seed': 1}
+
+    renderer = AtlasRenderer(CountingRenderer(None, integrator), atlas)
+    for camera in (first, second, third):
+        renderer.camera = camera
+        # frames are stored with 8 bits per channel, as shown on screen
+        assert [c.as_3i for c in render(renderer)._data] == [c.as_3i for c in render(Renderer(camera, integrator))._data]
+    assert renderer.renderer.frames == 1
+
+    # solids changed since baking are drawn again, but only in frames which may show them
+    changed = scene.objects[2]
+    changed.material = FlatMaterial(ConstantTexture(Color4f(1.0, 0.0, 0.0)))
+    scene.touch()
+    renderer.stale = frozenset([changed])
+    renderer.camera = first
+    assert render(renderer)._data == render(Renderer(first, integrator))._data
+    assert renderer.renderer.frames == 2
+
+    behind = next(obj for obj in scene.objects if obj.p0 == Point3f(0, -1, 0) and obj.v1 == Vector3f(0, 0, 1))
+    renderer.stale = frozenset([behind])
+    render(renderer)
+    assert renderer.renderer.frames == 2
+    renderer.close()
+
+
+def test_scaling_renderer_lowers_resolution_of_slow_frames():
+    integrator = RayTracingIntegrator(World(build_scene(), None))
+    first, second, *_ = cameras()
+    expected = render(Renderer(second, integrator), size=21)
+
+    renderer = ScalingRenderer(Renderer(first, integrator), budget=0.0)
+    assert render(renderer, size=21)._data == render(Renderer(first, integrator), size=21)._data
+    assert renderer.last_scale == 1
+
+    # frame in the middle of animation exceeds budget
+    renderer.dynamic = True
+    renderer.camera = second
+    render(renderer, size=21)
+    assert renderer.last_scale == ScalingRenderer.SCALES[-1]
+    renderer.scale = 2
+    image = render(renderer, size=21)
+    assert renderer.last_scale == 2
+    # rays of 11x11 frame are every other ray of full frame
+    for y in range(0, 21, 2):
+        for x in range(0, 21, 2):
+            assert image[x, y] == expected[x, y]
+
+    renderer.scale, renderer.budget = None, 1e3
+    assert render(renderer, size=21)._data == expected._data
+    assert renderer.last_scale == 1
+
+
+def test_parallel_renderer_matches_renderer():
+    scene = build_scene()
+    integrator = RayTracingIntegrator(World(scene, None))
+
+    with ParallelRenderer(None, integrator, workers=3) as renderer:
+        for camera in cameras():
+            renderer.camera = camera
+            assert render(renderer)._data == render(Renderer(camera, integrator))._data
+
+        # workers receive modified scene
+        scene.remove(scene.objects[-1])
+        renderer.camera = camera
+        assert render(renderer)._data == render(Renderer(camera, integrator))._data
+
+
+def test_threaded_renderer_matches_renderer(monkeypatch):
+    monkeypatch.setattr(parallel, 'gil_enabled', lambda: False)
+    scene = build_scene()
+    integrator = RayTracingIntegrator(World(scene, None))
+
+    with ThreadedRenderer(None, integrator, threads=3) as renderer:
+        for camera in cameras():
+            renderer.camera = camera
+            assert render(renderer)._data == render(Renderer(camera, integrator))._data
+
+
+def test_numpy_renderer_matches_renderer():
+    pytest.importorskip('numpy')
+    scene = build_scene()
+    integrator = RayTracingIntegrator(World(scene, None))
+
+    renderer = NumpyRenderer(None, integrator)
+    for camera in cameras():
+        renderer.camera = camera
+        assert render(renderer)._data == render(Renderer(camera, integrator))._data
+        assert render(renderer, size=8)._data == render(Renderer(camera, integrator), size=8)._data
+
+
+def test_numpy_renderer_resolves_ties_like_scene():
+    pytest.importorskip('numpy')
+    for camera, integrator in tie_scenes():
+        assert render(NumpyRenderer(camera, integrator))._data == render(Renderer(camera, integrator))._data
+
+
+def test_numpy_renderer_without_numpy(monkeypatch):
+    monkeypatch.setattr(vectorized, 'np', None)
+    scene = build_scene()
+    integrator = RayTracingIntegrator(World(scene, None))
+
+    camera = next(cameras())
+    assert render(NumpyRenderer(camera, integrator))._data == render(Renderer(camera, integrator))._data
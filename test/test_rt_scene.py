@@ -0,0 +1,287 @@
+import math
+import random
+from array import array
+
+from engine.rt.cameras import PerspectiveCamera
+from engine.rt.coordmappers import TriangleMapper
+from engine.rt.image import Image, Color4f
+from engine.rt.materials import FlatMaterial
+from engine.rt.textures import ImageTexture
+from engine.rt.scene import LinearScene, Scene
+from engine.rt.bbox import INF
+from engine.rt.grid import GridScene
+from engine.rt.frozen import FrozenScene
+from engine.rt.pvs import PotentiallyVisibleSets
+from engine.rt.solids import Quad, Sprite
+from engine.rt.utils import Point3f, Vector3f, Ray
+
+
+def random_scene(count=200, seed=0):
+    rnd = random.Random(seed)
+    quads = []
+    for _ in range(count):
+        p0 = Point3f(rnd.uniform(-10, 10), rnd.uniform(-2, 2), rnd.uniform(-10, 10))
+        if rnd.random() < 0.5:
+            v0, v1 = Vector3f(0.0, 1.0, 0.0), Vector3f(rnd.uniform(0.1, 2), 0.0, rnd.uniform(0.1, 2))
+        else:
+            v0, v1 = Vector3f(rnd.uniform(-1, 1), rnd.uniform(-1, 1), 1.0), Vector3f(1.0, rnd.uniform(-1, 1), 0.0)
+        quads.append(Quad(p0, v0, v1))
+    return quads
+
+
+def random_rays(count=500, seed=1):
+    rnd = random.Random(seed)
+    return [
+        Ray(Point3f(rnd.uniform(-12, 12), rnd.uniform(-3, 3), rnd.uniform(-12, 12)),
+            Vector3f(rnd.uniform(-1, 1), rnd.uniform(-0.3, 0.3), rnd.uniform(-1, 1)))
+        for _ in range(count)
+    ]
+
+
+def assert_same_hits(scene, reference, rays):
+    for ray in rays:
+        expected, actual = reference.intersect(ray), scene.intersect(ray)
+        assert (expected is None) == (actual is None)
+        if expected:
+            assert expected.distance == actual.distance
+
+
+def test_bvh_matches_linear_scene():
+    quads = random_scene()
+    assert_same_hits(Scene(quads), LinearScene(quads), random_rays())
+
+
+def test_grid_matches_linear_scene():
+    quads = random_scene()
+    assert_same_hits(GridScene(quads), LinearScene(quads), random_rays())
+    assert_same_hits(GridScene(quads, resolution=(7, 1, 3)), LinearScene(quads), random_rays())
+
+
+def test_frozen_scene_matches_scene():
+    quads = random_scene()
+    scene, frozen = Scene(quads), FrozenScene(quads)
+    rays = random_rays()
+
+    for ray in rays:
+        expected, actual = scene.intersect(ray), frozen.intersect(ray)
+        assert expected == actual
+        if expected:
+            assert expected.solid is actual.solid
+            assert scene.intersect(ray, lower_bound=expected) == frozen.intersect(ray, lower_bound=expected)
+
+    origins = array('d', (c for ray in rays for c in ray.o))
+    directions = array('d', (c for ray in rays for c in ray.d))
+    assert scene.intersect_many(origins, directions) == frozen.intersect_many(origins, directions)
+
+
+def test_frozen_scene_seen_from_origin():
+    quads = random_scene()
+    scene = FrozenScene(quads)
+    rnd = random.Random(2)
+
+    for _ in range(5):
+        origin = Point3f(rnd.uniform(-10, 10), rnd.uniform(-2, 2), rnd.uniform(-10, 10))
+        camera = PerspectiveCamera(origin, Vector3f(rnd.uniform(-1, 1), 0.0, rnd.uniform(-1, 1)), Vector3f(0, 1, 0), 1.0, 1.0)
+        corners = [camera.get_primary_ray(x, y).d for x in (-1.0, 1.0) for y in (-1.0, 1.0)]
+        view = scene.seen_from(origin, corners)
+        assert 0 < sum(view._accelerator.visible) < len(quads)
+
+        rays = [camera.get_primary_ray(rnd.uniform(-1, 1), rnd.uniform(-1, 1)) for _ in range(200)]
+        for ray in rays:
+            assert view.intersect(ray) == scene.intersect(ray)
+        origins = array('d', (c for ray in rays for c in ray.o))
+        directions = array('d', (c for ray in rays for c in ray.d))
+        assert view.intersect_many(origins, directions) == scene.intersect_many(origins, directions)
+
+
+def test_linear_scene_frustum_culling():
+    quads = random_scene()
+    scene = LinearScene(quads)
+    rnd = random.Random(3)
+
+    for _ in range(5):
+        origin = Point3f(rnd.uniform(-10, 10), rnd.uniform(-2, 2), rnd.uniform(-10, 10))
+        camera = PerspectiveCamera(origin, Vector3f(rnd.uniform(-1, 1), 0.0, rnd.uniform(-1, 1)), Vector3f(0, 1, 0), 1.0, 1.0)
+        view = scene.seen_from(origin, [camera.get_primary_ray(x, y).d for x in (-1.0, 1.0) for y in (-1.0, 1.0)])
+        assert 0 < len(view.objects) < len(quads)
+
+        for _ in range(200):
+            ray = camera.get_primary_ray(rnd.uniform(-1, 1), rnd.uniform(-1, 1))
+            assert view.intersect(ray) == scene.intersect(ray)
+
+
+def random_maze(size=6, seed=4):
+    rnd = random.Random(seed)
+    walls, quads = [], []
+    for i in range(size + 1):
+        for j in range(size):
+            if i in (0, size) or rnd.random() < 0.6:
+                walls.append(Quad(Point3f(i, -1, j), Vector3f(0, 1, 0), Vector3f(0, 0, 1)))
+            if i in (0, size) or rnd.random() < 0.6:
+                walls.append(Quad(Point3f(j, -1, i), Vector3f(0, 1, 0), Vector3f(1, 0, 0)))
+    for _ in range(20):
+        quads.append(Quad(Point3f(rnd.uniform(0, size - 0.5), -0.75, rnd.uniform(0, size - 0.5)), Vector3f(0, 0.5, 0), Vector3f(0.5, 0, 0)))
+    floor = Quad(Point3f(0, 0, 0), Vector3f(size, 0, 0), Vector3f(0, 0, size))
+    ceiling = Quad(Point3f(0, -1, 0), Vector3f(size, 0, 0), Vector3f(0, 0, size))
+    return walls, quads + walls + [floor, ceiling]
+
+
+def test_potentially_visible_sets():
+    walls, quads = random_maze()
+    visibility = PotentiallyVisibleSets(quads, walls)
+    rnd = random.Random(5)
+
+    for scene_type in (LinearScene, Scene, FrozenScene):
+        scene = scene_type(quads)
+        scene.visibility = visibility
+
+        for _ in range(20):
+            origin = Point3f(rnd.uniform(0, 6), rnd.uniform(-0.9, -0.1), rnd.uniform(0, 6))
+            assert visibility.hidden_from(origin)
+
+            camera = PerspectiveCamera(origin, Vector3f(rnd.uniform(-1, 1), 0.0, rnd.uniform(-1, 1)), Vector3f(0, 1, 0), 1.5, 1.5)
+            view = scene.seen_from(origin, [camera.get_primary_ray(x, y).d for x in (-1.0, 1.0) for y in (-1.0, 1.0)])
+            for _ in range(100):
+                ray = camera.get_primary_ray(rnd.uniform(-1, 1), rnd.uniform(-1, 1))
+                assert view.intersect(ray) == scene.intersect(ray)
+
+    # sight is never limited outside of level
+    assert not visibility.hidden_from(Point3f(-1.0, -0.5, 1.0))
+    assert not visibility.hidden_from(Point3f(1.0, -1.5, 1.0))
+
+
+def test_iter_hits_matches_repeated_intersect():
+    quads = random_scene()
+    # coincident copies give hits at equal distances
+    quads += [Quad(q.p0, q.v0, q.v1) for q in quads[::5]]
+    rays = random_rays(200)
+
+    for scene in (LinearScene(quads), Scene(quads), GridScene(quads), FrozenScene(quads)):
+        for ray in rays:
+            expected = []
+            intersection = scene.intersect(ray)
+            while intersection is not None:
+                expected.append(intersection)
+                intersection = scene.intersect(ray, lower_bound=intersection)
+
+            assert scene.intersect_all(ray) == expected
+            if expected:
+                assert list(scene.iter_hits(ray, lower_bound=expected[0])) == expected[1:]
+
+
+def test_fully_transparent_texels_are_skipped():
+    image = Image(width=4, height=4)
+    for y in range(4):
+        for x in range(4):
+            image[x, y] = Color4f(x / 4, y / 4, 0.5, 0.0 if (x + y) % 2 else 1.0)
+    material = FlatMaterial(ImageTexture(image, border_handling=ImageTexture.BORDER_REPEAT))
+    mapper = TriangleMapper(Point3f(1.0, 0.0, 0.0), Point3f(1.0, 1.0, 0.0), Point3f(0.0, 0.0, 0.0))
+    quad = Quad(Point3f(0.0, 0.0, 0.0), Vector3f(0.0, 1.0, 0.0), Vector3f(1.0, 0.0, 0.0), material=material, coord_mapper=mapper)
+    bare = Quad(quad.p0, quad.v0, quad.v1)
+    behind = Quad(Point3f(-1.0, -1.0, 1.0), Vector3f(0.0, 3.0, 0.0), Vector3f(3.0, 0.0, 0.0))
+    rnd = random.Random(5)
+
+    for scene in (LinearScene([quad, behind]), Scene([quad, behind]), FrozenScene([quad, behind])):
+        for _ in range(100):
+            ray = Ray(Point3f(rnd.uniform(0, 1), rnd.uniform(0, 1), -1.0), Vector3f(0.0, 0.0, 1.0))
+            hit = bare.intersect(ray)
+            transparent = material.get_emission(mapper.get_coords(hit), quad.normal, ray.d).a == 0.0
+            assert (quad.intersect(ray) is None) == transparent
+            assert scene.intersect(ray).solid is (behind if transparent else quad)
+
+    # coverage follows swapped textures
+    material.texture = ImageTexture(Image(width=1, height=1))
+    assert material.coverage is None
+    ray = Ray(Point3f(0.5, 0.5, -1.0), Vector3f(0.0, 0.0, 1.0))
+    assert FrozenScene([quad, behind]).intersect(ray).solid is quad
+
+
+def test_sprite_faces_ray_origin():
+    sprite = Sprite(Point3f(0.0, -1.0, 0.0), Vector3f(0.0, 1.0, 0.0), 0.5)
+    rnd = random.Random(6)
+
+    for _ in range(50):
+        angle = rnd.uniform(0.0, 6.3)
+        origin = Point3f(3.0 * math.sin(angle), -0.5, 3.0 * math.cos(angle))
+        quad = sprite.facing(origin)
+        assert abs(Vector3f.dot(quad.normal, origin - Point3f(0.0, -0.5, 0.0))) > 2.99
+        assert quad.v1.y == 0.0 and abs(quad.v1.length - 0.5) < 1e-9
+
+        # the whole width is seen from every side
+        for offset in (-0.24, 0.0, 0.24):
+            target = Point3f(offset * math.cos(angle), -0.5, -offset * math.sin(angle))
+            hit = sprite.intersect(Ray(origin, target - origin))
+            assert hit is not None and abs(hit.distance - 1.0) < 1e-9
+
+        bounds = sprite.bounds()
+        assert bounds.min.x <= quad.p0.x <= bounds.max.x and bounds.min.z <= quad.p0.z <= bounds.max.z
+
+    scene = FrozenScene([sprite])
+    assert scene.intersect(Ray(Point3f(0.0, -0.5, 3.0), Vector3f(0.0, 0.0, -1.0))) is not None
+    assert scene.intersect(Ray(Point3f(3.0, -0.5, 0.0), Vector3f(-1.0, 0.0, 0.0))) is not None
+
+
+def test_intersect_ignores_hits_beyond_tmax():
+    quads = random_scene()
+    rays = random_rays()
+    origins, directions = array('d'), array('d')
+    for ray in rays:
+        origins.extend(ray.o)
+        directions.extend(ray.d)
+
+    for scene in (LinearScene(quads), Scene(quads), GridScene(quads), FrozenScene(quads)):
+        hits = scene.intersect_many(origins, directions, tmax=5.0)
+        for i, ray in enumerate(rays):
+            expected = [hit for hit in scene.intersect_all(ray) if hit.distance < 5.0]
+            assert scene.intersect_all(ray, tmax=5.0) == expected
+            hit = scene.intersect(ray, tmax=5.0)
+            assert hit == (expected[0] if expected else None)
+            assert hits.solids[i] is (hit.solid if hit else None)
+
+
+def test_bvh_lower_bound():
+    quads = random_scene()
+    linear, scene = LinearScene(quads), Scene(quads)
+
+    for ray in random_rays():
+        hit = linear.intersect(ray)
+        if hit:
+            expected, actual = linear.intersect(ray, lower_bound=hit), scene.intersect(ray, lower_bound=hit)
+            assert (expected is None) == (actual is None)
+            if expected:
+                assert expected.distance == actual.distance
+
+
+def test_bvh_is_rebuild_after_modification():
+    quads = random_scene()
+    scene = Scene(quads)
+    rays = random_rays()
+    scene.intersect(rays[0])
+
+    for quad in quads[::2]:
+        scene.remove(quad)
+    assert_same_hits(scene, LinearScene(quads[1::2]), rays)
+
+
+def test_intersect_many_matches_intersect():
+    quads = random_scene()
+    rays = random_rays()
+    origins, directions = array('d'), array('d')
+    for ray in rays:
+        origins.extend(ray.o)
+        directions.extend(ray.d)
+
+    linear = LinearScene(quads)
+    lower = array('d', ((hit.distance if hit else 0.0) for hit in map(linear.intersect, rays)))
+
+    for scene in [linear, Scene(quads), GridScene(quads)]:
+        hits = scene.intersect_many(origins, directions)
+        for i, ray in enumerate(rays):
+            expected = linear.intersect(ray)
+            assert hits.distances[i] == (expected.distance if expected else INF)
+
+        # only hits behind already found ones
+        hits = scene.intersect_many(origins, directions, lower)
+        for i, ray in enumerate(rays):
+            expected = linear.intersect(ray, lower_bound=linear.intersect(ray))
+            assert hits.distances[i] == (expected.distance if expected else INF)